@@ -0,0 +1,66 @@
+from JellyDB.config import Config
+import threading
+import traceback
+
+# Vacuums every table of a database in the background (see Table.vacuum).
+#
+# Every `interval_in_seconds`, each table that isn't dropped is vacuumed in
+# turn. Vacuum is online, so queries keep running meanwhile; hold
+# `round_lock` to make sure no round is in progress (e.g. before dropping a
+# table).
+class BackgroundVacuum:
+    """
+    :param tables: dict                 # Database.tables, map from name to Table
+    :param interval_in_seconds: float   # time between the end of a round and the start of the next
+    """
+    def __init__(self, tables: dict, interval_in_seconds: float = Config.VACUUM_INTERVAL_IN_SECONDS):
+        if interval_in_seconds is None or interval_in_seconds <= 0:
+            raise Exception("Background vacuum needs a positive interval")
+        self.tables = tables
+        self.interval_in_seconds = interval_in_seconds
+        self.round_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        # counters reported by statistics()
+        self.rounds = 0
+        self.records = 0
+        self.bytes = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="background_vacuum")
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(self.interval_in_seconds):
+            self.vacuum_round()
+
+    def vacuum_round(self):
+        with self.round_lock:
+            for table in list(self.tables.values()):
+                if table is None: # dropped
+                    continue
+                try:
+                    reclaimed = table.vacuum()
+                except Exception:
+                    # Keep vacuuming the other tables
+                    traceback.print_exc()
+                    continue
+                self.records += reclaimed["records"]
+                self.bytes += reclaimed["bytes"]
+            self.rounds += 1
+
+    """
+    :returns: dict  # rounds run, and slots and bytes reclaimed by them
+    """
+    def statistics(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "records": self.records,
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,93 @@
+from JellyDB.config import Config
+import threading
+import time
+
+# Writes dirty bufferpool pages back to their range files in the background,
+# so that a foreground thread that needs a frame almost always finds a clean
+# victim and doesn't have to wait for a write.
+#
+# Every Config.BACKGROUND_WRITER_INTERVAL_IN_SECONDS, each partition hands
+# over enough dirty pages to get back to Config.BACKGROUND_WRITER_CLEAN_FRACTION
+# clean frames. The pages of all partitions are sorted by (file, offset) and
+# runs of adjacent pages go out in a single write (see PageStorage.write_pages).
+class BackgroundWriter:
+    # Longest run of adjacent pages written in one call
+    MAX_PAGES_PER_WRITE = 64
+
+    """
+    :param partitions: list     # of BufferpoolPartition
+    :param storage: PageStorage
+    """
+    def __init__(self, partitions: list, storage):
+        self.partitions = partitions
+        self.storage = storage
+        # Held for a whole round. Hold it to make sure no background write is
+        # in progress (e.g. before the files of a table are deleted).
+        self.round_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        # counters reported by Bufferpool.statistics()
+        self.pages_written = 0
+        self.writes = 0
+        self.seconds_writing = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(Config.BACKGROUND_WRITER_INTERVAL_IN_SECONDS):
+            self.write_round()
+
+    """
+    # Brings every partition back to the target fraction of clean frames
+    """
+    def write_round(self):
+        with self.round_lock:
+            taken_by_partition = []
+            pages = []
+            for partition in self.partitions:
+                taken = partition.take_dirty_pages(Config.BACKGROUND_WRITER_CLEAN_FRACTION)
+                if len(taken) > 0:
+                    taken_by_partition.append((partition, taken))
+                    pages.extend(taken)
+            if len(pages) == 0:
+                return
+
+            succeeded = False
+            try:
+                pages.sort(key=lambda page: (page[0].filename, page[0].index_within_file))
+                self._write_runs(pages)
+                succeeded = True
+            finally:
+                for partition, taken in taken_by_partition:
+                    partition.finish_background_writes(taken, succeeded)
+
+    """
+    :param pages: list  # of (PhysicalPageLocation, bytes, threading.Event), sorted by file and offset
+    """
+    def _write_runs(self, pages: list):
+        run_start = 0
+        for i in range(1, len(pages) + 1):
+            if (i < len(pages)
+                    and i - run_start < BackgroundWriter.MAX_PAGES_PER_WRITE
+                    and pages[i][0].filename == pages[i - 1][0].filename
+                    and pages[i][0].index_within_file == pages[i - 1][0].index_within_file + 1):
+                continue
+            first_location = pages[run_start][0]
+            start = time.perf_counter()
+            self.storage.write_pages(
+                first_location.filename,
+                first_location.index_within_file,
+                [data for _, data, _ in pages[run_start:i]]
+            )
+            self.seconds_writing += time.perf_counter() - start
+            self.writes += 1
+            self.pages_written += i - run_start
+            run_start = i
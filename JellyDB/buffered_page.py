@@ -1,28 +1,50 @@
 from JellyDB.config import Config
 from JellyDB.physical_page_location import PhysicalPageLocation
+from JellyDB.page_utils import PageUtils
+import threading
 import difflib
 
 class BufferedPage:
-    def __init__(self, physical_page_location: PhysicalPageLocation):
+    """
+    :param storage: PageStorage # where this frame loads pages from and flushes them to
+    """
+    def __init__(self, physical_page_location: PhysicalPageLocation, storage):
+        self.storage = storage
+        self.transactions_using = 0
+        self.loading = False
         if physical_page_location is not None:
             self.set_new_page(physical_page_location)
+            self.load()
         else:
             #self.physical_page_location = physical_page_location
             #self.data = None
-            #self.transactions_using = 0
             #self.dirty = None
             self.valid = False
 
+    """
+    # Claims this frame for a page. The page's bytes aren't here until load()
+    # has been called; until then `loading` is True and anyone else who wants
+    # the page waits on `loaded`.
+    """
     def set_new_page(self, physical_page_location: PhysicalPageLocation):
         self.physical_page_location = physical_page_location
         self.transactions_using = 0
         self.dirty = False
         self.valid = True
-        with open(physical_page_location.filename, "rb") as page_file: # TODO confirm `b` is a good mode to use
-            byte_offset_of_target_page = Config.PAGE_SIZE*physical_page_location.index_within_file
-            page_file.seek(byte_offset_of_target_page, 0)
-            self.data = bytearray(page_file.read(Config.PAGE_SIZE))
-    
+        self.data = None
+        self.loading = True
+        self.loaded = threading.Event()
+
+    """
+    # Reads the page's bytes from storage. Does I/O, so the bufferpool calls
+    # this without holding any latch.
+    """
+    def load(self):
+        # Zero-copy array view over the page's bytes (see PageUtils.view)
+        self.data = PageUtils.view(self.storage.read_page(self.physical_page_location))
+        self.loading = False
+        self.loaded.set()
+
     """
     # Flushes to disk whether dirty or not
     """
@@ -35,9 +57,13 @@ class BufferedPage:
             raise Exception("I have no data to flush to disk!")
         elif self.physical_page_location is None:
             raise Exception("I don't know where to flush my data (if I have any)!")
-        
-        with open(self.physical_page_location.filename, "r+b") as page_file: # This mode allows us to override the middle of files
-            start_of_page_in_file = self.physical_page_location.index_within_file * Config.PAGE_SIZE
-            page_file.seek(start_of_page_in_file, 0)
-            page_file.write(self.data)
-            self.dirty = False
\ No newline at end of file
+
+        self.storage.write_page(self.physical_page_location, self.data)
+        self.dirty = False
+
+    """
+    # Lets go of the page's bytes. In mmap mode this releases our view of the mapping.
+    """
+    def release(self):
+        self.valid = False
+        self.data = None
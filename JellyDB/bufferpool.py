@@ -2,6 +2,13 @@ from JellyDB.page_utils import PageUtils
 from JellyDB.config import Config
 from JellyDB.physical_page_location import PhysicalPageLocation
 from JellyDB.buffered_page import BufferedPage
+from JellyDB.bufferpool_partition import BufferpoolPartition
+from JellyDB.background_writer import BackgroundWriter
+from JellyDB.bufferpool_scan import BufferpoolScan
+from JellyDB.page_storage import FilePageStorage, MmapPageStorage
+from JellyDB.replacement_policy import REPLACEMENT_POLICIES
+import numpy as np
+import contextlib
 import threading
 import os
 
@@ -9,147 +16,366 @@ import os
 # know whether the page objects were on disk or in memory. 
 # We are lazy - only increase size of bufferpool when someone requests something.
 #
+# The frames are split into independently latched partitions (see
+# bufferpool_partition.py) so that threads touching different pages don't
+# serialize on one lock.
+#
 # You must call "open" before using this class.
 class Bufferpool:
+    # Ways the bufferpool can reach range files (see page_storage.py)
+    STORAGE_MODES = {
+        "file": FilePageStorage,
+        "mmap": MmapPageStorage,
+    }
+
     def __init__(self):
-        pass 
-
-    def _allocate_members(self):
-        self.data = []
-        # map from PhysicalPageLocation to page's location within `self.data`
-        self.where_to_find_page_in_pool = {}
-        self.lru_tracker = []
-        self.lock = threading.RLock() # Using RLock allows us to have one function that needs the lock call another that needs the lock
+        # map from range filename to number of pages allocated in it; persisted with the database
+        self.pages_in_file = {}
+        # map from range filename to pages of it that can be handed out again (see free_pages); persisted too
+        self.free_pages_in_file = {}
+
+    def _allocate_members(self, storage_mode: str, replacement_policy: str, partitions: int, size_in_bytes: int):
+        if storage_mode not in Bufferpool.STORAGE_MODES:
+            raise Exception("Unknown storage mode `{}`; expected one of {}".format(storage_mode, list(Bufferpool.STORAGE_MODES)))
+        if replacement_policy not in REPLACEMENT_POLICIES:
+            raise Exception("Unknown replacement policy `{}`; expected one of {}".format(replacement_policy, list(REPLACEMENT_POLICIES)))
+        if partitions < 1:
+            raise Exception("The bufferpool needs at least one partition")
+        self.storage = Bufferpool.STORAGE_MODES[storage_mode](self.pages_in_file, self.free_pages_in_file)
+        # Each page lives in the partition its location hashes to; frames are split evenly
+        self.partitions = []
+        partition_sizes = Bufferpool._partition_sizes(size_in_bytes, partitions)
+        for size_in_pages in partition_sizes:
+            self.partitions.append(BufferpoolPartition(self.storage, replacement_policy, size_in_pages))
+        self.size_in_bytes = size_in_bytes
+        self.pins_allowed_per_partition = Bufferpool._pins_allowed_per_partition(partition_sizes)
+        # How often read_record and write_record could pin the whole record, and
+        # how often they had to go one page at a time. Counted without a lock, so
+        # only about right while several threads read and write at once.
+        self.records_pinned_together = 0
+        self.records_pinned_page_by_page = 0
+        # Set by Database.open when the database has a memory budget
+        self.memory_budget = None
+        # Keeps frames clean so evictions rarely wait on a write (see background_writer.py)
+        self.background_writer = BackgroundWriter(self.partitions, self.storage)
+        if self.storage.NEEDS_WRITE_BACK and Config.BACKGROUND_WRITER_CLEAN_FRACTION > 0:
+            self.background_writer.start()
     
+    """
+    :returns: list  # number of frames of each partition
+    """
+    @staticmethod
+    def _partition_sizes(size_in_bytes: int, partitions: int) -> list:
+        size_in_pages = size_in_bytes // Config.PAGE_SIZE
+        if size_in_pages < partitions:
+            raise Exception("A bufferpool of {} pages can't be split into {} partitions".format(size_in_pages, partitions))
+        return [size_in_pages // partitions + (1 if i < size_in_pages % partitions else 0) for i in range(partitions)]
+
+    """
+    # How many pages of one partition read_record and write_record pin at the
+    # same time. Other threads need frames there too, so at most a quarter of
+    # the partition's frames; a record with more of its pages in one partition
+    # than that is read and written one page at a time.
+    :returns: list  # one number per partition
+    """
+    @staticmethod
+    def _pins_allowed_per_partition(partition_sizes: list) -> list:
+        return [max(1, size_in_pages // 4) for size_in_pages in partition_sizes]
+
     def _deallocate_members(self):
-        self.data = None
-        self.where_to_find_page_in_pool = None
-        self.lru_tracker = None
-        self.lock = None
+        self.memory_budget = None
+        self.background_writer.stop()
+        self.background_writer = None
+        # Frames may be views into storage (mmap mode), so let go of them before closing it
+        for partition in self.partitions:
+            partition.release_all()
+        self.partitions = None
+        self.storage.close()
+        self.storage = None
 
     """
-    # Looks at how big the file is (i.e. how many pages have been stored there
-    # already) and returns the number of pages already present. That number will
-    # index into the beginning of this page's space in the file. This method
-    # creates files if they don't exist; so NOWHERE ELSE will will we have to
-    # create files.
+    # Looks at how many pages have been handed out from the range file already
+    # and returns that number. That number will index into the beginning of
+    # this page's space in the file. This method creates files if they don't
+    # exist; so NOWHERE ELSE will will we have to create files.
 
     :returns: PhysicalPageLocation   # the unique disk location of YOUR (you being a physical page) data
     """
     def allocate_page_id(self, table: str, __range: int) -> PhysicalPageLocation:
-        page = open(PhysicalPageLocation.filename_from(self.path_to_db_files, table, __range), 'a+b')
-        number_of_pages_already_in_file = page.tell() // Config.PAGE_SIZE
-        page.write(b"\x00" * Config.PAGE_SIZE) # Guarantees there is enough space to store on disk BEFORE we start performing transactions
-        page.close()
+        filename = PhysicalPageLocation.filename_from(self.path_to_db_files, table, __range)
+        number_of_pages_already_in_file = self.storage.allocate_page(filename)
+        # The table just grew, and its indices and record locks with it
+        if self.memory_budget is not None:
+            self.memory_budget.page_allocated()
         return PhysicalPageLocation(self.path_to_db_files, table, __range, number_of_pages_already_in_file)
     
-    def pin(self, page: BufferedPage):
-        page.transactions_using += 1
-    
+    def _partition_index_of(self, physical_page_location: PhysicalPageLocation) -> int:
+        return hash(physical_page_location) % len(self.partitions)
+
+    def _partition_of(self, physical_page_location: PhysicalPageLocation) -> BufferpoolPartition:
+        return self.partitions[self._partition_index_of(physical_page_location)]
+
     def unpin(self, physical_page_location: PhysicalPageLocation): # a PhysicalPageLocation will be given upon a call to allocate_page_id()
-        with self.lock:
-            target = self._get_page(physical_page_location, False)
-            if (target.transactions_using <= 0):
-                self.lock.release()
-                raise Exception("The page {} has been unpinned more times than it has been pinned.".format(physical_page_location))
-            target.transactions_using -= 1
+        partition = self._partition_of(physical_page_location)
+        with partition.lock:
+            frame = partition.where_to_find_page_in_pool.get(physical_page_location)
+        if frame is None:
+            raise Exception("The page {} has been unpinned more times than it has been pinned.".format(physical_page_location))
+        partition.unpin_page(partition.data[frame])
 
     def write(self, physical_page_location: PhysicalPageLocation, value: int, index: int):
-        with self.lock: # Make sure page is ABSOLUTELY in the bufferpool; pin it so it can't leave
-            buffered_page = self._get_page(physical_page_location, True)
-            self.pin(buffered_page)
-        PageUtils.write(buffered_page.data, value, index)
-        buffered_page.dirty = True
-        self.unpin(physical_page_location)
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location) # Make sure page is ABSOLUTELY in the bufferpool; pin it so it can't leave
+        try:
+            PageUtils.write(buffered_page.data, value, index)
+            buffered_page.dirty = True
+        finally:
+            partition.unpin_page(buffered_page)
     
     def read(self, physical_page_location: PhysicalPageLocation, offset_within_page: int) -> int:
-        with self.lock: # make sure that the page is ABSOLUTELY in the bufferpool; pin it so it can't leave
-            buffered_page = self._get_page(physical_page_location, True)
-            self.pin(buffered_page)
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location) # make sure that the page is ABSOLUTELY in the bufferpool; pin it so it can't leave
         # now that it is pinned, it won't leave
         val = PageUtils.get_record(buffered_page.data, offset_within_page)
-        self.unpin(physical_page_location)
+        partition.unpin_page(buffered_page)
         return val
-    
-    def _get_frame_number_for_page(self, physical_page_location: PhysicalPageLocation) -> int: # must be atomic because an encapsulating function (_get_page) must be atomic
-        if physical_page_location not in self.where_to_find_page_in_pool:
-            return self._load_into_memory(physical_page_location)
-        return self.where_to_find_page_in_pool[physical_page_location]
-    
+
     """
-    # Updates the frames' LRU
+    # Writes many consecutive records of one page with a single pin.
+    :param values: list or np.ndarray   # values to write at offsets start, start + 1, ...
+    :param start: int                   # offset within the page of the first value
     """
-    def _get_page(self, physical_page_location: PhysicalPageLocation, update_LRU: bool) -> BufferedPage: # must be atomic because the loading & pinning processe is atomic
-        frame = self._get_frame_number_for_page(physical_page_location)
-        if update_LRU:
-            if frame in self.lru_tracker: # This "if" allows for the case when a frame has just been created and is not in the list
-                self.lru_tracker.remove(frame)
-            self.lru_tracker.append(frame)
-        return self.data[frame]
+    def write_slice(self, physical_page_location: PhysicalPageLocation, values, start: int = 0):
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location)
+        try:
+            PageUtils.write_slice(buffered_page.data, values, start)
+            buffered_page.dirty = True
+        finally:
+            partition.unpin_page(buffered_page)
 
     """
-    :returns:   # Frame number where the requested page has been loaded
+    # Reads many consecutive records of one page with a single pin.
+    :returns: np.ndarray    # copy of records [start, stop) of the page
     """
-    def _load_into_memory(self, physical_page_location: PhysicalPageLocation) -> int: # must be atomic
-        frame_where_new_page_belongs = self._find_a_free_frame()
-        page = self.data[frame_where_new_page_belongs]
-        page.set_new_page(physical_page_location)
-        self.where_to_find_page_in_pool[physical_page_location] = frame_where_new_page_belongs
-        return frame_where_new_page_belongs
-    
-    def _find_a_free_frame(self) -> int: # must be atomic - the index returned must be accurate
-        if len(self.data) >= Config.BUFFERPOOL_SIZE_IN_PAGES:
-            return self._evict_least_recently_used_page()
-        else:
-            index_of_new_frame = len(self.data)
-            self.data.append(BufferedPage(None))
-            return index_of_new_frame
-            
-
-    """
-    # Only call if bufferpool size is > 0.
-    """
-    def _evict_least_recently_used_page(self) -> int: # must be atomic
-        frame_of_page_to_evict = self._get_index_of_LRU_page_we_can_evict()
-        page_to_evict = self.data[frame_of_page_to_evict]
-        if page_to_evict.valid and page_to_evict.dirty:
-            page_to_evict.flush_to_disk()
-        del self.where_to_find_page_in_pool[page_to_evict.physical_page_location] # This page will no longer be able to be found in the index
-        page_to_evict.valid = False
-        
-        return frame_of_page_to_evict
-    
-    def _get_index_of_LRU_page_we_can_evict(self): # must be atomic
-        for i in self.lru_tracker:
-            if (self.data[i]).transactions_using == 0:
-                return i
-        raise Exception("All frames are pinned")
-    
-    def _flush_all_data_to_disk(self): # must be atomic
-        for buffered_page in self.data:
-            if buffered_page.valid and buffered_page.dirty:
-                buffered_page.flush_to_disk()
+    def read_slice(self, physical_page_location: PhysicalPageLocation, start: int = 0, stop: int = Config.MAX_RECORDS_PER_PAGE) -> np.ndarray:
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location)
+        values = PageUtils.read_slice(buffered_page.data, start, stop)
+        partition.unpin_page(buffered_page)
+        return values
+
+    """
+    # Pins several pages (e.g. every column of a logical page) for as long as
+    # the `with` block runs, so their frames can be used directly:
+    #
+    #     with bufferpool.pinned(locations) as buffered_pages:
+    #         value = buffered_pages[0].data[offset]
+    #
+    # Whoever writes to a frame's data must set its `dirty` flag. Every page
+    # stays pinned until the block ends, so the pages must fit in their
+    # partitions' frames together (see can_pin_together).
+    :param physical_page_locations: list    # of PhysicalPageLocation
+    """
+    @contextlib.contextmanager
+    def pinned(self, physical_page_locations: list):
+        buffered_pages = [None] * len(physical_page_locations)
+        pinned_pages = []
+        try:
+            # Pin in partition order, so a thread waiting for a frame of one
+            # partition never holds frames of a later partition that another
+            # thread is waiting for
+            order = sorted(range(len(physical_page_locations)), key=lambda i: self._partition_index_of(physical_page_locations[i]))
+            for i in order:
+                partition = self._partition_of(physical_page_locations[i])
+                buffered_pages[i] = partition.get_and_pin(physical_page_locations[i])
+                pinned_pages.append((partition, buffered_pages[i]))
+            yield buffered_pages
+        finally:
+            for partition, buffered_page in pinned_pages:
+                partition.unpin_page(buffered_page)
+
+    """
+    # Whether pinned() may hold all these pages at once: no partition gets
+    # more of them than pins_allowed_per_partition lets it.
+    """
+    def can_pin_together(self, physical_page_locations: list) -> bool:
+        pages_per_partition = [0] * len(self.partitions)
+        for physical_page_location in physical_page_locations:
+            partition_index = self._partition_index_of(physical_page_location)
+            pages_per_partition[partition_index] += 1
+            if pages_per_partition[partition_index] > self.pins_allowed_per_partition[partition_index]:
+                return False
+        return True
+
+    """
+    # Reads the same offset of several pages with one pin per page.
+    :returns: list  # one int per location
+    """
+    def read_record(self, physical_page_locations: list, offset_within_page: int) -> list:
+        if not self.can_pin_together(physical_page_locations):
+            # Too many of the pages in one partition to pin at once: one at a time
+            self.records_pinned_page_by_page += 1
+            return [self.read(physical_page_location, offset_within_page) for physical_page_location in physical_page_locations]
+        self.records_pinned_together += 1
+        with self.pinned(physical_page_locations) as buffered_pages:
+            return [PageUtils.get_record(buffered_page.data, offset_within_page) for buffered_page in buffered_pages]
+
+    """
+    # Writes values[i] at the same offset of physical_page_locations[i], with one pin per page.
+    """
+    def write_record(self, physical_page_locations: list, values: list, offset_within_page: int):
+        if not self.can_pin_together(physical_page_locations):
+            # Too many of the pages in one partition to pin at once: one at a time
+            self.records_pinned_page_by_page += 1
+            for physical_page_location, value in zip(physical_page_locations, values):
+                self.write(physical_page_location, value, offset_within_page)
+            return
+        self.records_pinned_together += 1
+        with self.pinned(physical_page_locations) as buffered_pages:
+            for buffered_page, value in zip(buffered_pages, values):
+                PageUtils.write(buffered_page.data, value, offset_within_page)
+                buffered_page.dirty = True
+
+    """
+    # Reads several offsets of one page with a single pin.
+    :returns: list  # one int per offset
+    """
+    def read_offsets(self, physical_page_location: PhysicalPageLocation, offsets: list) -> list:
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location)
+        try:
+            return buffered_page.data[offsets].tolist()
+        finally:
+            partition.unpin_page(buffered_page)
+
+    """
+    # Writes values[i] at offsets[i] of one page with a single pin.
+    """
+    def write_offsets(self, physical_page_location: PhysicalPageLocation, values: list, offsets: list):
+        partition = self._partition_of(physical_page_location)
+        buffered_page = partition.get_and_pin(physical_page_location)
+        try:
+            for value, offset in zip(values, offsets):
+                PageUtils.write(buffered_page.data, value, offset)
+            buffered_page.dirty = True
+        finally:
+            partition.unpin_page(buffered_page)
+
+    """
+    # Starts a sequential scan over the given pages that reads ahead in the
+    # background and doesn't take frames from the pool (see bufferpool_scan.py).
+    :param steps: list      # of lists of PhysicalPageLocation, in the order they will be visited
+    :returns: BufferpoolScan    # use with `with`
+    """
+    def scan(self, steps: list, readahead: int = Config.SCAN_READAHEAD_IN_STEPS) -> BufferpoolScan:
+        return BufferpoolScan(self, steps, readahead)
+
+    def read_for_scan(self, physical_page_location: PhysicalPageLocation, buffer: bytearray) -> np.ndarray:
+        return self._partition_of(physical_page_location).read_for_scan(physical_page_location, buffer)
+
+    """
+    # Grows or shrinks the bufferpool while it is in use. Shrinking evicts
+    # unpinned pages (writing them back if dirty) and waits a few seconds for
+    # pinned ones to be unpinned if it has to.
+    :param size_in_bytes: int   # rounded down to whole pages
+    :param wait: bool           # if False, partitions whose other pages are all pinned stay bigger for now
+    """
+    def resize(self, size_in_bytes: int, wait: bool = True):
+        partition_sizes = Bufferpool._partition_sizes(size_in_bytes, len(self.partitions))
+        # Background writes hold copies of pages we may be about to evict
+        with self.background_writer.round_lock:
+            # Pin fewer pages at once before any partition gets smaller
+            pins_allowed_per_partition = Bufferpool._pins_allowed_per_partition(partition_sizes)
+            self.pins_allowed_per_partition = [min(old, new) for old, new in zip(self.pins_allowed_per_partition, pins_allowed_per_partition)]
+            for partition, size_in_pages in zip(self.partitions, partition_sizes):
+                partition.resize(size_in_pages, wait)
+            self.pins_allowed_per_partition = pins_allowed_per_partition
+        self.size_in_bytes = sum(partition_sizes) * Config.PAGE_SIZE
+
+    """
+    # How well the replacement policy is doing since the bufferpool was opened
+    """
+    def statistics(self) -> dict:
+        hits = misses = evictions = dirty_evictions = scan_hits = scan_reads = 0
+        for partition in self.partitions:
+            with partition.lock:
+                hits += partition.hits
+                misses += partition.misses
+                evictions += partition.evictions
+                dirty_evictions += partition.dirty_evictions
+                scan_hits += partition.scan_hits
+                scan_reads += partition.scan_reads
+        requests = hits + misses
+        background_writer = self.background_writer
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_ratio": hits / requests if requests > 0 else 0.0,
+            # evictions that had to write their victim back first
+            "dirty_evictions": dirty_evictions,
+            # pages scans copied from frames, and read from storage
+            "scan_hits": scan_hits,
+            "scan_reads": scan_reads,
+            "background_pages_written": background_writer.pages_written,
+            "background_writes": background_writer.writes,
+            "background_pages_per_second": background_writer.pages_written / background_writer.seconds_writing if background_writer.seconds_writing > 0 else 0.0,
+            "background_seconds_per_write": background_writer.seconds_writing / background_writer.writes if background_writer.writes > 0 else 0.0,
+            # pages given back with free_pages and not handed out again yet
+            "free_pages": self.storage.number_of_free_pages(),
+            # records read_record and write_record pinned all at once, and one page at a time
+            "records_pinned_together": self.records_pinned_together,
+            "records_pinned_page_by_page": self.records_pinned_page_by_page,
+        }
 
     def close(self):
-        self._flush_all_data_to_disk()
+        self.background_writer.stop()
+        for partition in self.partitions:
+            partition.flush_all_data_to_disk()
         self._deallocate_members()
 
 
     # When db.open
-    def open(self, path: str):
-        self._allocate_members()
+    """
+    :param storage_mode: str        # "file" or "mmap", see Bufferpool.STORAGE_MODES
+    :param replacement_policy: str  # "lru", "clock" or "2q", see replacement_policy.py
+    :param partitions: int          # number of independently latched partitions to split the frames into
+    :param size_in_bytes: int       # memory for frames; can be changed later with resize()
+    """
+    def open(self, path: str, storage_mode: str = Config.DEFAULT_STORAGE_MODE, replacement_policy: str = Config.DEFAULT_REPLACEMENT_POLICY, partitions: int = Config.BUFFERPOOL_PARTITIONS, size_in_bytes: int = Config.BUFFERPOOL_SIZE_IN_BYTES):
+        if not hasattr(self, "pages_in_file"): # databases saved before page counts were tracked
+            self.pages_in_file = {}
+        if not hasattr(self, "free_pages_in_file"): # or before pages were ever freed
+            self.free_pages_in_file = {}
+        self._allocate_members(storage_mode, replacement_policy, partitions, size_in_bytes)
         self.path_to_db_files = path
 
 
     def invalidate_pages_of(self, table: str):
-        self.lock.acquire()
+        # Don't let the background writer touch the table's files after they're gone
+        with self.background_writer.round_lock:
+            for partition in self.partitions:
+                partition.invalidate_pages_of(table)
 
-        for page in self.data:
-            if page.valid and page.physical_page_location.table == table:
-                if page.transactions_using > 0:
-                    raise Exception(
-                        "cannot invalidate page {} in bufferpool; {} transactions are using it".format(str(page), str(page.transactions_using))
-                    )
-                page.valid = False
+            # The table's files are about to be deleted
+            self.storage.forget_table(table)
 
-        self.lock.release()
+    """
+    # Gives back pages no one can read anymore, e.g. base and tail pages a
+    # merge made obsolete: they are dropped from the bufferpool without being
+    # written back, and allocate_page_id hands them out again (reading as
+    # zeros) before growing their range files.
+    :param physical_page_locations: list    # of PhysicalPageLocation
+    """
+    def free_pages(self, physical_page_locations: list):
+        with self.background_writer.round_lock:
+            for physical_page_location in physical_page_locations:
+                discarded, earlier_write = self._partition_of(physical_page_location).discard_page(physical_page_location)
+                if not discarded:
+                    # Someone still has it pinned: better to lose the page than to hand it out twice
+                    continue
+                # The old bytes must not land on the page after it has been zeroed
+                if earlier_write is not None:
+                    earlier_write.wait()
+                self.storage.free_page(physical_page_location)
@@ -0,0 +1,330 @@
+from JellyDB.physical_page_location import PhysicalPageLocation
+from JellyDB.buffered_page import BufferedPage
+from JellyDB.page_utils import PageUtils
+from JellyDB.replacement_policy import REPLACEMENT_POLICIES, AllFramesPinnedException
+import threading
+import time
+
+# One independently latched slice of the Bufferpool. Every page is owned by
+# exactly one partition (chosen by hashing its PhysicalPageLocation), so
+# threads working on pages of different partitions never contend.
+#
+# The partition latch only protects the partition's bookkeeping. Disk I/O
+# (writing back a dirty victim, reading the requested page) happens after the
+# latch is released. While a page is being read its frame is marked `loading`;
+# anyone else asking for that page waits on the frame's `loaded` event and
+# nobody else is held up.
+#
+# Methods marked "must be atomic" expect the caller to hold self.lock.
+class BufferpoolPartition:
+    # How long to wait for someone to unpin a frame when all of them are pinned
+    SECONDS_TO_WAIT_FOR_A_FREE_FRAME = 5
+
+    """
+    :param storage: PageStorage         # shared by every partition
+    :param replacement_policy: str      # key of REPLACEMENT_POLICIES
+    :param size_in_pages: int           # most frames this partition will hold
+    """
+    def __init__(self, storage, replacement_policy: str, size_in_pages: int):
+        self.storage = storage
+        self.size_in_pages = size_in_pages
+        self.data = []
+        # map from PhysicalPageLocation to page's location within `self.data`
+        self.where_to_find_page_in_pool = {}
+        # decides which frame to reuse once every frame holds a page
+        self.replacement_policy = REPLACEMENT_POLICIES[replacement_policy](size_in_pages)
+        # map from PhysicalPageLocation to threading.Event, for evicted dirty
+        # pages that are still being written back
+        self.writes_in_flight = {}
+        # counters reported by Bufferpool.statistics()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # evictions that had to write the victim back before reusing its frame
+        self.dirty_evictions = 0
+        # pages handed to scans (see bufferpool_scan.py) from a frame, and from storage
+        self.scan_hits = 0
+        self.scan_reads = 0
+        self.lock = threading.Lock()
+        # notified when a frame's pin count drops to 0
+        self.frame_unpinned = threading.Condition(self.lock)
+
+    """
+    # Makes sure the page is in memory and pins it so it can't leave.
+    # Every call must be matched by a call to unpin_page.
+    """
+    def get_and_pin(self, physical_page_location: PhysicalPageLocation) -> BufferedPage:
+        while True:
+            with self.lock:
+                frame = self.where_to_find_page_in_pool.get(physical_page_location)
+                if frame is not None:
+                    buffered_page = self.data[frame]
+                    if buffered_page.loading:
+                        # Someone else is reading this page in; wait for them (below)
+                        loaded = buffered_page.loaded
+                    else:
+                        buffered_page.transactions_using += 1
+                        self.hits += 1
+                        self.replacement_policy.record_access(frame)
+                        return buffered_page
+                else:
+                    return self._load_into_memory(physical_page_location)
+            loaded.wait()
+
+    def unpin_page(self, buffered_page: BufferedPage):
+        with self.lock:
+            if buffered_page.transactions_using <= 0:
+                raise Exception("The page {} has been unpinned more times than it has been pinned.".format(buffered_page.physical_page_location))
+            buffered_page.transactions_using -= 1
+            if buffered_page.transactions_using == 0:
+                self.frame_unpinned.notify()
+
+    """
+    # For scans: gets the page's bytes without giving it a frame. If the page
+    # is in the pool it is copied out of its frame (it may be newer than the
+    # file); otherwise it is read from storage into `buffer`.
+    :param buffer: bytearray    # PAGE_SIZE bytes owned by the scan
+    :returns: np.ndarray        # view of `buffer` (or, in mmap mode, of the file) holding the page
+    """
+    def read_for_scan(self, physical_page_location: PhysicalPageLocation, buffer: bytearray):
+        if not self.storage.NEEDS_WRITE_BACK:
+            # Frames are views of the file, so the file is always up to date
+            with self.lock:
+                self.scan_reads += 1
+            return PageUtils.view(self.storage.read_page_into(physical_page_location, buffer))
+        with self.lock:
+            frame = self.where_to_find_page_in_pool.get(physical_page_location)
+            if frame is not None and not self.data[frame].loading:
+                self.scan_hits += 1
+                page = PageUtils.view(buffer)
+                page[:] = self.data[frame].data
+                return page
+            self.scan_reads += 1
+            # If the page was evicted a moment ago, its newest bytes may still be on their way to disk
+            earlier_write = self.writes_in_flight.get(physical_page_location)
+        if earlier_write is not None:
+            earlier_write.wait()
+        return PageUtils.view(self.storage.read_page_into(physical_page_location, buffer))
+
+    """
+    # Claims a frame for the page while holding the latch, then releases the
+    # latch to do the I/O. Called with self.lock held; returns with it held.
+    :returns: BufferedPage  # pinned once, for the caller
+    """
+    def _load_into_memory(self, physical_page_location: PhysicalPageLocation) -> BufferedPage: # must be atomic
+        frame, victim_location, victim_data = self._find_a_free_frame()
+        buffered_page = self.data[frame]
+        buffered_page.set_new_page(physical_page_location)
+        buffered_page.transactions_using = 1
+        self.where_to_find_page_in_pool[physical_page_location] = frame
+        self.misses += 1
+        self.replacement_policy.record_load(frame, physical_page_location)
+        # If this page was evicted a moment ago, its newest bytes may still be on their way to disk
+        earlier_write = self.writes_in_flight.get(physical_page_location)
+        if victim_data is not None:
+            # The background writer may still be writing an older copy of the victim
+            earlier_write_of_victim = self.writes_in_flight.get(victim_location)
+            victim_written = threading.Event()
+            self.writes_in_flight[victim_location] = victim_written
+
+        self.lock.release()
+        try:
+            if victim_data is not None:
+                try:
+                    if earlier_write_of_victim is not None:
+                        earlier_write_of_victim.wait()
+                    self.storage.write_page(victim_location, victim_data)
+                finally:
+                    with self.lock:
+                        self._forget_write(victim_location, victim_written)
+                    victim_written.set()
+            if earlier_write is not None:
+                earlier_write.wait()
+            buffered_page.load()
+        except:
+            with self.lock:
+                del self.where_to_find_page_in_pool[physical_page_location]
+                buffered_page.transactions_using = 0
+                buffered_page.release()
+                buffered_page.loading = False
+            buffered_page.loaded.set()
+            raise
+        finally:
+            self.lock.acquire()
+        return buffered_page
+
+    """
+    :returns: tuple     # (frame number, location of the page that was evicted
+                        #  from it, that page's bytes if they must be written back)
+    """
+    def _find_a_free_frame(self) -> tuple: # must be atomic
+        if len(self.data) < self.size_in_pages:
+            self.data.append(BufferedPage(None, self.storage))
+            return len(self.data) - 1, None, None
+        give_up_at = time.monotonic() + BufferpoolPartition.SECONDS_TO_WAIT_FOR_A_FREE_FRAME
+        while True:
+            try:
+                return self._evict_a_page()
+            except AllFramesPinnedException:
+                seconds_left = give_up_at - time.monotonic()
+                if seconds_left <= 0:
+                    raise
+                self.frame_unpinned.wait(seconds_left)
+
+    """
+    # Only call if partition size is > 0.
+    """
+    def _evict_a_page(self) -> tuple: # must be atomic
+        frame_of_page_to_evict = self.replacement_policy.choose_victim(self._can_evict)
+        self.evictions += 1
+        page_to_evict = self.data[frame_of_page_to_evict]
+        victim_location = None
+        victim_data = None
+        if page_to_evict.valid: # Pages of dropped tables have already been invalidated
+            victim_location = page_to_evict.physical_page_location
+            if page_to_evict.dirty:
+                victim_data = page_to_evict.data
+                self.dirty_evictions += 1
+            del self.where_to_find_page_in_pool[victim_location] # This page will no longer be able to be found in the index
+            page_to_evict.release()
+            self.storage.evict(victim_location)
+        return frame_of_page_to_evict, victim_location, victim_data
+
+    """
+    # Changes how many frames this partition may hold. Growing takes effect as
+    # pages are loaded. Shrinking evicts pages (through the replacement policy,
+    # so pinned pages are skipped) and moves the pages of the last frames into
+    # the freed ones until only `size_in_pages` frames are left. The caller must
+    # make sure no background write is in progress.
+    #
+    # With wait=False, if every page left to evict is pinned, it stops there:
+    # the partition keeps its extra frames until pages are loaded into it,
+    # which evict instead of taking a new frame while it's over its size.
+    """
+    def resize(self, size_in_pages: int, wait: bool = True):
+        with self.lock:
+            self.size_in_pages = size_in_pages
+            self.replacement_policy.capacity = size_in_pages
+            give_up_at = time.monotonic() + BufferpoolPartition.SECONDS_TO_WAIT_FOR_A_FREE_FRAME
+            while len(self.data) > size_in_pages:
+                try:
+                    frame, victim_location, victim_data = self._evict_a_page()
+                except AllFramesPinnedException:
+                    if not wait:
+                        return
+                    seconds_left = give_up_at - time.monotonic()
+                    if seconds_left <= 0:
+                        raise
+                    self.frame_unpinned.wait(seconds_left)
+                    continue
+                if victim_data is not None:
+                    # Resizing is rare, so write back without giving up the latch
+                    self.storage.write_page(victim_location, victim_data)
+                self._remove_frame(frame)
+
+    def _remove_frame(self, frame: int): # must be atomic
+        last_frame = len(self.data) - 1
+        self.replacement_policy.forget(frame)
+        if frame != last_frame:
+            # Users hold the BufferedPage itself, not its frame number, so it can move
+            moved_page = self.data[last_frame]
+            self.data[frame] = moved_page
+            self.replacement_policy.forget(last_frame)
+            if moved_page.valid:
+                self.where_to_find_page_in_pool[moved_page.physical_page_location] = frame
+                self.replacement_policy.record_load(frame, moved_page.physical_page_location)
+        self.data.pop()
+
+    def _forget_write(self, physical_page_location: PhysicalPageLocation, written: threading.Event): # must be atomic
+        # A newer write of the same page may have replaced ours in the map
+        if self.writes_in_flight.get(physical_page_location) is written:
+            del self.writes_in_flight[physical_page_location]
+
+    """
+    # For the background writer: picks dirty pages to write so that at least
+    # `clean_fraction` of the partition's frames are clean, marks them clean
+    # and copies their bytes. Each page is registered in writes_in_flight until
+    # finish_background_writes is called, so a page that is evicted (clean)
+    # and read back in the meantime waits for its bytes to reach the file.
+    :returns: list  # of (PhysicalPageLocation, bytes, threading.Event)
+    """
+    def take_dirty_pages(self, clean_fraction: float) -> list:
+        with self.lock:
+            dirty_pages = [
+                buffered_page for buffered_page in self.data
+                if buffered_page.valid and buffered_page.dirty and not buffered_page.loading
+            ]
+            pages_allowed_to_be_dirty = int(self.size_in_pages * (1 - clean_fraction))
+            if len(dirty_pages) <= pages_allowed_to_be_dirty:
+                return []
+            # Pinned pages are likely to be written to again right away, so take them last
+            dirty_pages.sort(key=lambda buffered_page: buffered_page.transactions_using > 0)
+            taken = []
+            for buffered_page in dirty_pages[:len(dirty_pages) - pages_allowed_to_be_dirty]:
+                # Clear the flag before copying: a write racing with the copy sets it again
+                buffered_page.dirty = False
+                written = threading.Event()
+                self.writes_in_flight[buffered_page.physical_page_location] = written
+                taken.append((buffered_page.physical_page_location, buffered_page.data.tobytes(), written))
+            return taken
+
+    """
+    :param taken: list      # returned by take_dirty_pages
+    :param succeeded: bool  # False if the bytes may not have reached the file
+    """
+    def finish_background_writes(self, taken: list, succeeded: bool):
+        with self.lock:
+            for physical_page_location, _, written in taken:
+                if not succeeded:
+                    frame = self.where_to_find_page_in_pool.get(physical_page_location)
+                    if frame is not None:
+                        self.data[frame].dirty = True
+                self._forget_write(physical_page_location, written)
+                written.set()
+
+    def _can_evict(self, frame: int) -> bool: # must be atomic
+        buffered_page = self.data[frame]
+        return buffered_page.transactions_using == 0 and not buffered_page.loading
+
+    def flush_all_data_to_disk(self):
+        with self.lock:
+            for buffered_page in self.data:
+                if buffered_page.valid and buffered_page.dirty and not buffered_page.loading:
+                    buffered_page.flush_to_disk()
+
+    def invalidate_pages_of(self, table: str):
+        with self.lock:
+            for buffered_page in self.data:
+                if buffered_page.valid and buffered_page.physical_page_location.table == table:
+                    if buffered_page.transactions_using > 0:
+                        raise Exception(
+                            "cannot invalidate page {} in bufferpool; {} transactions are using it".format(str(buffered_page), str(buffered_page.transactions_using))
+                        )
+                    del self.where_to_find_page_in_pool[buffered_page.physical_page_location]
+                    buffered_page.release()
+
+    """
+    # Drops a page from this partition if it's here, dirty or not. Frames in
+    # use are left alone.
+    :returns: tuple     # (False if the page is still in use, else True;
+                        #  threading.Event of a write of the page still on its way to the file, or None)
+    """
+    def discard_page(self, physical_page_location: PhysicalPageLocation) -> tuple:
+        with self.lock:
+            earlier_write = self.writes_in_flight.get(physical_page_location)
+            frame = self.where_to_find_page_in_pool.get(physical_page_location)
+            if frame is None:
+                return True, earlier_write
+            buffered_page = self.data[frame]
+            if buffered_page.transactions_using > 0 or buffered_page.loading:
+                return False, None
+            del self.where_to_find_page_in_pool[physical_page_location]
+            buffered_page.release()
+            self.storage.evict(physical_page_location)
+            return True, earlier_write
+
+    def release_all(self):
+        with self.lock:
+            # Frames may be views into storage (mmap mode), so let go of them before storage closes
+            for buffered_page in self.data:
+                buffered_page.release()
@@ -0,0 +1,94 @@
+from JellyDB.config import Config
+import threading
+import queue
+
+# A sequential pass over many pages (Table.sum, Table.create_index,
+# Table.merge) that stays out of the bufferpool's way.
+#
+# The scan is given, up front, the pages it will visit: a list of steps, each
+# step a list of PhysicalPageLocations (e.g. the column pages of one logical
+# page). A background thread reads up to `readahead` steps ahead of the
+# caller. Pages that are not in the bufferpool are read into a small ring of
+# frames that belongs to the scan and is reused over and over, so a scan over
+# a whole table neither evicts anybody's pages nor counts as an access for the
+# replacement policy. Pages that are in the bufferpool are copied out of their
+# frames.
+#
+# Use it as a context manager and iterate over it:
+#
+#     with bufferpool.scan(steps) as scan:
+#         for pages in scan:
+#             ...
+#
+# Each iteration yields one np.ndarray per location of the step. The arrays
+# are only valid until the next iteration, and are read-only copies: writes
+# must still go through the Bufferpool.
+class BufferpoolScan:
+    """
+    :param bufferpool: Bufferpool
+    :param steps: list      # of lists of PhysicalPageLocation
+    :param readahead: int   # how many steps the background thread may read ahead
+    """
+    def __init__(self, bufferpool, steps: list, readahead: int):
+        self.bufferpool = bufferpool
+        self.steps = steps
+        self.readahead = max(1, readahead)
+        # The caller holds 1 step, the queue up to `readahead`, and the
+        # prefetcher fills 1 more; none of them may share frames
+        pages_per_step = max((len(step) for step in steps), default=0)
+        self.ring = [
+            [bytearray(Config.PAGE_SIZE) for _ in range(pages_per_step)]
+            for _ in range(self.readahead + 2)
+        ]
+        self.ready = queue.Queue(maxsize=self.readahead)
+        self.stopped = threading.Event()
+        self.prefetcher = None
+
+    def __enter__(self):
+        self.prefetcher = threading.Thread(target=self._prefetch, daemon=True)
+        self.prefetcher.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, __traceback):
+        self.close()
+
+    def __iter__(self):
+        for _ in range(len(self.steps)):
+            pages = self.ready.get()
+            if isinstance(pages, BaseException):
+                raise pages
+            yield pages
+
+    def _prefetch(self):
+        try:
+            for i, step in enumerate(self.steps):
+                frames = self.ring[i % len(self.ring)]
+                pages = []
+                for physical_page_location, frame in zip(step, frames):
+                    if self.stopped.is_set():
+                        return
+                    pages.append(self.bufferpool.read_for_scan(physical_page_location, frame))
+                if not self._hand_over(pages):
+                    return
+        except BaseException as exception:
+            # The caller raises it on its next iteration
+            self._hand_over(exception)
+
+    """
+    :returns: bool  # False if the scan was closed before the caller took it
+    """
+    def _hand_over(self, pages) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.ready.put(pages, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        self.stopped.set()
+        if self.prefetcher is not None:
+            self.prefetcher.join()
+            self.prefetcher = None
+        self.ring = None
@@ -0,0 +1,74 @@
+"""
+Usage: python -m JellyDB.bufferpool_tester
+
+Checks when Bufferpool.read_record and write_record pin a whole record at once
+and when they go one page at a time. With the default bufferpool and a table
+of the default width, inserts, updates and selects must all pin whole records.
+A table whose records don't fit in a tiny bufferpool must still work, one page
+at a time.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.config import Config
+from random import randrange, seed
+import traceback
+import tempfile
+import shutil
+import sys
+
+def select(table, key: int, number_of_columns: int) -> list:
+    location = table.pre_select(key, 0, [1] * number_of_columns, transaction_id='select')
+    return table.select(key, 0, [1] * number_of_columns, location)[0].columns
+
+def update(table, key: int, columns: tuple):
+    location = table.pre_update(key, columns, transaction_id='update {} {}'.format(key, columns))
+    table.update(key, columns, location)
+
+"""
+# Inserts, updates and selects `number_of_records` records and checks what they read
+:returns: dict  # the bufferpool's statistics afterwards
+"""
+def insert_update_select(path: str, number_of_columns: int, number_of_records: int, **open_options) -> dict:
+    db = Database()
+    db.open(path, **open_options)
+    grades_table = db.create_table('Grades', number_of_columns, 0)
+    query = Query(grades_table)
+    records = {}
+    for key in range(number_of_records):
+        records[key] = [key] + [randrange(0, 100) for _ in range(number_of_columns - 1)]
+        query.insert(*records[key])
+    for key in range(0, number_of_records, 3):
+        records[key][1] = randrange(0, 100)
+        update(grades_table, key, (None, records[key][1]) + (None,) * (number_of_columns - 2))
+    for key, columns in records.items():
+        assert select(grades_table, key, number_of_columns) == columns, "record {}".format(key)
+    statistics = db.bufferpool.statistics()
+    db.close()
+    return statistics
+
+def default_table_pins_whole_records(path: str):
+    statistics = insert_update_select(path, 5, 5000)
+    assert statistics["records_pinned_together"] > 0, statistics
+    assert statistics["records_pinned_page_by_page"] == 0, statistics
+
+def wide_table_in_small_bufferpool(path: str):
+    statistics = insert_update_select(path, 40, 500,
+        bufferpool_partitions=1, bufferpool_size_in_bytes=16 * Config.PAGE_SIZE)
+    assert statistics["records_pinned_page_by_page"] > 0, statistics
+
+tests_failed = 0
+seed(5120)
+for test in (default_table_pins_whole_records, wide_table_in_small_bufferpool):
+    path = tempfile.mkdtemp()
+    try:
+        test(path)
+        print(test.__name__, "passed")
+    except Exception:
+        print(test.__name__, "FAILED")
+        print(traceback.format_exc())
+        tests_failed += 1
+    finally:
+        shutil.rmtree(path)
+
+if tests_failed > 0:
+    sys.exit(1)
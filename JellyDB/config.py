@@ -4,7 +4,10 @@ class Config:
     RECORD_SIZE_IN_BYTES = 8
     MAX_RECORD_VALUE = 2**(RECORD_SIZE_IN_BYTES*8) - 1
 
-    # Every page of database data allocated will have this many bytes in it
+    # Every page of database data allocated will have this many bytes in it.
+    # It is the size of a bufferpool frame and of a page on disk, for every
+    # table; a table can only choose to put fewer records in each of its pages
+    # (see Database.create_table(..., records_per_page=...)).
     PAGE_SIZE = _HARD_DISK_PAGE_SIZE // 2
     MAX_RECORDS_PER_PAGE = PAGE_SIZE // RECORD_SIZE_IN_BYTES
 
@@ -18,10 +21,13 @@ class Config:
 
     # Store the biggest bit of any data first
     INT_BYTE_ORDER = 'big'
+    # NumPy dtype of one record as it sits in a page: big-endian unsigned 64-bit integers
+    RECORD_DTYPE = ('>' if INT_BYTE_ORDER == 'big' else '<') + 'u' + str(RECORD_SIZE_IN_BYTES)
     # 1 is 512 records per page
+    # Default for tables; Database.create_table(..., base_pages_per_range=...) overrides it
     NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE = 2
 
-    # When page range is full and ready for merging
+    # When page range is full and ready for merging (in tables of the default geometry)
     TOTAL_RECORDS_FULL = MAX_RECORDS_PER_PAGE * NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE
 
     INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET = 0
@@ -30,7 +36,49 @@ class Config:
     TIMESTAMP_COLUMN_INDEX = 1
     BASE_RID_FOR_TAIL_PAGE_INDEX = 2
     URID_INDEX = 3
-    METADATA_COLUMN_COUNT = 4
+    # Bit i is set if data column i is stored in a tail record (in a base record: if column i was ever updated)
+    SCHEMA_ENCODING_COLUMN_INDEX = 4
+    METADATA_COLUMN_COUNT = 5
 
+    # Default bufferpool size; Database.open(..., bufferpool_size_in_bytes=...) overrides it
     BUFFERPOOL_SIZE_IN_BYTES = 4096*64
     BUFFERPOOL_SIZE_IN_PAGES = BUFFERPOOL_SIZE_IN_BYTES // PAGE_SIZE
+    # A memory budget never shrinks a bufferpool partition below this many frames
+    MIN_FRAMES_PER_BUFFERPOOL_PARTITION = 4
+    # A memory budget is checked once every this many page allocations
+    MEMORY_BUDGET_CHECK_INTERVAL_IN_PAGES = 16
+
+    # How the bufferpool reaches range files: "file" (read/write per page) or "mmap"
+    DEFAULT_STORAGE_MODE = "file"
+    # In "file" mode, at most this many range files are kept open at once
+    MAX_OPEN_RANGE_FILES = 64
+    # Which frame the bufferpool reuses when it is full: "lru", "clock" or "2q"
+    DEFAULT_REPLACEMENT_POLICY = "lru"
+    # How a table lays out its records in physical pages: "column" (a page per column) or "pax" (see logical_page.py)
+    DEFAULT_PAGE_LAYOUT = "column"
+    # Whether a tail record also stores the columns that earlier updates of the record changed
+    # (cumulative) or only the columns its own update changed; see Table.update
+    DEFAULT_CUMULATIVE_UPDATES = True
+    # The bufferpool's frames are split into this many independently latched partitions
+    BUFFERPOOL_PARTITIONS = 8
+    # The background writer keeps at least this fraction of each partition's frames clean (0 turns it off)
+    BACKGROUND_WRITER_CLEAN_FRACTION = 0.5
+    # How often the background writer wakes up to check
+    BACKGROUND_WRITER_INTERVAL_IN_SECONDS = 0.05
+    # How many steps (usually logical pages) a bufferpool scan reads ahead of its caller
+    SCAN_READAHEAD_IN_STEPS = 8
+    # Threads merging full tail pages into their base pages, for the whole database
+    MERGE_WORKERS = 1
+    # How long a tail page whose merge failed waits before it is merged again
+    MERGE_RETRY_DELAY_IN_SECONDS = 1
+    # How often the background vacuum (see background_vacuum.py) runs; None turns it off
+    VACUUM_INTERVAL_IN_SECONDS = None
+    # Kind of index kept on the primary key: "hash" or "ordered" (see ordered_index.py)
+    PRIMARY_KEY_INDEX_TYPE = "ordered"
+    # Kind of index Table.create_index makes unless told otherwise
+    DEFAULT_INDEX_TYPE = "hash"
+    # An ordered index keeps its sorted values in lists of at most this many
+    ORDERED_INDEX_CHUNK_SIZE = 1024
+    # Range files are grown (and, in "mmap" mode, mapped) this many pages at a time.
+    # Must be a multiple of mmap.ALLOCATIONGRANULARITY // PAGE_SIZE.
+    EXTENT_SIZE_IN_PAGES = 64
@@ -1,10 +1,14 @@
 from JellyDB.rid_allocator import RIDAllocator
 from JellyDB.physical_page_location import PhysicalPageLocation
 from JellyDB.bufferpool import Bufferpool
+from JellyDB.memory_budget import MemoryBudget
+from JellyDB.merge_scheduler import MergeScheduler
+from JellyDB.background_vacuum import BackgroundVacuum
 from JellyDB.table import Table
+from JellyDB.config import Config
+import contextlib
 import pickle
 import os
-import time
 
 class DBDataBundle():
     def __init__(self, tables: dict, bufferpool, RID_allocator):
@@ -17,7 +21,17 @@ class Database():
     def __init__(self):
         pass
 
-    def open(self, path_to_db_files: str):
+    """
+    :param path_to_db_files: str    # directory holding this database's files
+    :param storage_mode: str        # how range files are accessed: "file" (read/write per page) or "mmap"
+    :param replacement_policy: str  # which bufferpool frame to reuse when it is full: "lru", "clock" or "2q"
+    :param bufferpool_partitions: int   # number of independently latched bufferpool partitions
+    :param bufferpool_size_in_bytes: int    # memory for bufferpool frames; see also resize_bufferpool
+    :param memory_budget_in_bytes: int      # if given, the bufferpool shrinks to keep itself, the indices and the record locks under this
+    :param merge_workers: int       # threads merging tail pages, see merge_scheduler.py
+    :param vacuum_interval_in_seconds: float    # if given, every table is vacuumed this often in the background, see background_vacuum.py
+    """
+    def open(self, path_to_db_files: str, storage_mode: str = Config.DEFAULT_STORAGE_MODE, replacement_policy: str = Config.DEFAULT_REPLACEMENT_POLICY, bufferpool_partitions: int = Config.BUFFERPOOL_PARTITIONS, bufferpool_size_in_bytes: int = Config.BUFFERPOOL_SIZE_IN_BYTES, memory_budget_in_bytes: int = None, merge_workers: int = Config.MERGE_WORKERS, vacuum_interval_in_seconds: float = Config.VACUUM_INTERVAL_IN_SECONDS):
         # Get filename of backup
         self.path_to_db_files = os.path.expanduser(path_to_db_files)
         self.db_backup_filename = os.path.join(self.path_to_db_files, Database.DATABASE_FILE_NAME)
@@ -36,9 +50,26 @@ class Database():
             self.bufferpool = Bufferpool()
             self.RID_allocator = RIDAllocator(self.bufferpool)
 
-        self.bufferpool.open(self.path_to_db_files)
+        self.bufferpool.open(self.path_to_db_files, storage_mode, replacement_policy, bufferpool_partitions, bufferpool_size_in_bytes)
+        if memory_budget_in_bytes is not None:
+            self.bufferpool.memory_budget = MemoryBudget(memory_budget_in_bytes, self.bufferpool, self.tables)
+            self.bufferpool.memory_budget.enforce()
+
+        # Merges pick up where they were when the database was closed
+        self.merge_scheduler = MergeScheduler(merge_workers)
+        for table in self.tables.values():
+            if table is not None: # dropped
+                self.merge_scheduler.add_table(table)
+
+        self.background_vacuum = None
+        if vacuum_interval_in_seconds is not None:
+            self.background_vacuum = BackgroundVacuum(self.tables, vacuum_interval_in_seconds)
+            self.background_vacuum.start()
 
     def close(self, verbose=False):
+        if self.background_vacuum is not None:
+            self.background_vacuum.stop()
+        self.merge_scheduler.stop()
         self.bufferpool.close()
 
         # Pickle data bundle
@@ -49,23 +80,72 @@ class Database():
             self.db_backup_filename = None
 
     """
-    # Sends signal to table.merge_daemon() to stop merging
+    # Grows or shrinks the bufferpool of an open database. Shrinking evicts
+    # unpinned pages. With a memory budget this is the most the budget lets
+    # the bufferpool have.
+    """
+    def resize_bufferpool(self, size_in_bytes: int):
+        if self.bufferpool.memory_budget is not None:
+            self.bufferpool.memory_budget.max_bufferpool_size_in_bytes = size_in_bytes
+            self.bufferpool.memory_budget.enforce()
+        else:
+            self.bufferpool.resize(size_in_bytes)
+
+    """
+    # Estimated bytes used by the bufferpool, indices and record locks
+    """
+    def memory_usage(self) -> dict:
+        if self.bufferpool.memory_budget is not None:
+            return self.bufferpool.memory_budget.usage()
+        return MemoryBudget(None, self.bufferpool, self.tables).usage()
+
+    """
+    # Stops merging: lets running merges finish and leaves the rest queued
+    # until the database is opened again
     """
     def daemon_slayer(self):
-        for name in self.tables:
-            self.tables[name].daemon_stop = True
-        time.sleep(2)
+        self.merge_scheduler.stop()
+        if self.background_vacuum is not None:
+            self.background_vacuum.stop()
+
+    """
+    # Merges run so far, tail pages waiting to be merged, and merge timings; see MergeScheduler.statistics
+    """
+    def merge_statistics(self) -> dict:
+        return self.merge_scheduler.statistics()
+
+    """
+    # Vacuums every table now; see Table.vacuum
+    :returns: dict  # map from table name to what vacuum reclaimed in it
+    """
+    def vacuum(self) -> dict:
+        return {name: table.vacuum() for name, table in self.tables.items() if table is not None}
+
+    """
+    # Rounds run by the background vacuum and what they reclaimed; None if it is off
+    """
+    def vacuum_statistics(self):
+        if self.background_vacuum is None:
+            return None
+        return self.background_vacuum.statistics()
 
     """
     # Creates a new table
     :param name: string         #Table name
     :param num_columns: int     #Number of Columns: all columns are integer
     :param key: int             #Index of table key in columns
+    :param page_layout: str     #"column" (a physical page per column) or "pax" (all columns of a block of records in one physical page)
+    :param cumulative_updates: bool #whether a tail record carries the columns changed by earlier updates too, see Table.update
+    :param records_per_page: int    #records in each logical page, up to Config.MAX_RECORDS_PER_PAGE; pages keep taking Config.PAGE_SIZE bytes whatever this is
+    :param base_pages_per_range: int #base pages a page range fills before its tail pages can be merged
     """
-    def create_table(self, name: str, num_columns: int, key: int) -> Table:
+    def create_table(self, name: str, num_columns: int, key: int, page_layout: str = Config.DEFAULT_PAGE_LAYOUT, cumulative_updates: bool = Config.DEFAULT_CUMULATIVE_UPDATES,
+                     records_per_page: int = Config.MAX_RECORDS_PER_PAGE, base_pages_per_range: int = Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE) -> Table:
         if name in self.tables:
             raise Exception("Table `{}` already exists".format(name))
-        self.tables[name] = Table(name, num_columns, key, self.RID_allocator)
+        # The geometry is kept on the table, so it is saved with the catalog on close
+        self.tables[name] = Table(name, num_columns, key, self.RID_allocator, page_layout, cumulative_updates, records_per_page, base_pages_per_range)
+        self.merge_scheduler.add_table(self.tables[name])
         return self.tables[name]
 
     """
@@ -74,10 +154,14 @@ class Database():
     def drop_table(self, table: str):
         if table not in self.tables:
             raise Exception("Table `{}` does not exist".format(table))
-        self.bufferpool.invalidate_pages_of(table)
-        self.tables[table].drop(self.path_to_db_files)
-        self.tables[table].delete_all_files_owned_in(self.path_to_db_files)
-        self.tables[table] = None
+        self.merge_scheduler.remove_table(self.tables[table])
+        # A background vacuum round must not touch the table while it goes away
+        vacuum_round = self.background_vacuum.round_lock if self.background_vacuum is not None else contextlib.nullcontext()
+        with vacuum_round:
+            self.bufferpool.invalidate_pages_of(table)
+            self.tables[table].drop(self.path_to_db_files)
+            self.tables[table].delete_all_files_owned_in(self.path_to_db_files)
+            self.tables[table] = None
 
     """
     # Returns table with the passed name
@@ -0,0 +1,84 @@
+import threading
+import collections
+
+# Epoch-based reclamation: frees something only once nobody can still be
+# using it, without making readers take a lock that writers wait on.
+#
+# Readers wrap their reads in `with epochs.protect():`, which counts them in
+# the current epoch. A writer that has unpublished something (e.g. merge,
+# after swapping in new base pages) hands a callback that frees it to
+# retire(). The callback waits for every reader that entered at or before the
+# epoch it was retired in, since they may still hold a reference to it, and
+# then runs on whichever thread lets the last of them go. Readers that enter
+# later can only find what was published, so they don't hold it up.
+class EpochManager:
+    def __init__(self):
+        # Guards everything below; only held for a few operations at a time
+        self.lock = threading.Lock()
+        self.epoch = 0
+        # epoch -> number of readers that entered in it and haven't left
+        self.readers = collections.Counter()
+        # (epoch retired in, callback), oldest first
+        self.retired = collections.deque()
+
+    """
+    # Counts the calling thread as a reader for the duration of a `with` block
+    """
+    def protect(self):
+        return _Protected(self)
+
+    def _enter(self) -> int:
+        with self.lock:
+            epoch = self.epoch
+            self.readers[epoch] += 1
+            return epoch
+
+    def _exit(self, epoch: int):
+        with self.lock:
+            self.readers[epoch] -= 1
+            if self.readers[epoch] == 0:
+                del self.readers[epoch]
+            callbacks = self._reclaimable()
+        for callback in callbacks:
+            callback()
+
+    """
+    # Runs `callback` once every reader that may still see what it frees has left
+    """
+    def retire(self, callback):
+        with self.lock:
+            self.retired.append((self.epoch, callback))
+            self.epoch += 1
+            callbacks = self._reclaimable()
+        for callback in callbacks:
+            callback()
+
+    """
+    # Takes the retired callbacks that no reader is holding up. Caller holds self.lock.
+    """
+    def _reclaimable(self) -> list:
+        oldest_reader = min(self.readers) if len(self.readers) > 0 else self.epoch
+        callbacks = []
+        while len(self.retired) > 0 and self.retired[0][0] < oldest_reader:
+            callbacks.append(self.retired.popleft()[1])
+        return callbacks
+
+    """
+    :returns: int   # callbacks still waiting for readers
+    """
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.retired)
+
+
+class _Protected:
+    def __init__(self, epochs: EpochManager):
+        self.epochs = epochs
+
+    def __enter__(self):
+        self.epoch = self.epochs._enter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.epochs._exit(self.epoch)
+        return False
@@ -1,5 +1,7 @@
 from JellyDB.xs_lock import XSLock
 from JellyDB.intent_xs_lock import IntentXSLock
+from JellyDB.ordered_index import INDEX_TYPES, OrderedIndex, hash_index_range
+from JellyDB.config import Config
 
 """
 # Indexes the specified column of the specified table to speed up select queries
@@ -20,16 +22,20 @@ class Indices:
     # It might be useful to keep track of which column in Table that this class
     """
     def __init__(self):
-        self.data = {} # map from column numbers to dictionaries.
+        self.data = {} # map from column numbers to dictionaries (or OrderedIndex, see ordered_index.py).
         self.lock = IntentXSLock()
         self.col_locks = {} # dictionary mapping int to XSLock
 
+    """
+    # Takes an intent lock: looking an index up doesn't conflict with writers
+    # of single indices (IX), e.g. an insert_many holding one for a while
+    """
     def has_index(self, column: int) -> bool:
-        self.lock.acquire_S()
+        self.lock.acquire_IS()
         try:
             return column in self.data
         finally:
-            self.lock.release_S()
+            self.lock.release_IS()
 
     """
     # returns list of RIDs, also known as: the location of all records with the given value in the given column
@@ -59,6 +65,65 @@ class Indices:
         finally:
             self.lock.release_IS()
 
+    """
+    # contains for many values, taking the locks once
+    :returns: list  # of bool, one per value
+    """
+    def contains_many(self, column: int, values: list) -> list:
+        self.lock.acquire_IS()
+        try:
+            if column not in self.data:
+                raise Exception("No index exists for column {}".format(str(column)))
+            with self.col_locks[column].acquire_S():
+                index = self.data[column]
+                return [index.get(value) is not None for value in values]
+        finally:
+            self.lock.release_IS()
+
+    """
+    # (value, RID) pairs of every record whose value in the given column is
+    # within [lo, hi], in order of value. On an ordered index this costs about
+    # as much as the number of pairs returned.
+    :returns: iterator
+    """
+    def range(self, column: int, lo: int, hi: int):
+        self.lock.acquire_IS()
+        try:
+            if column not in self.data or self.data[column] is None:
+                raise Exception("No index exists for column {}".format(str(column)))
+            with self.col_locks[column].acquire_S():
+                if isinstance(self.data[column], OrderedIndex):
+                    pairs = self.data[column].range(lo, hi)
+                else:
+                    pairs = hash_index_range(self.data[column], lo, hi)
+        finally:
+            self.lock.release_IS()
+        return iter(pairs)
+
+    """
+    # How many distinct values of an ordered index are within [lo, hi]
+    """
+    def count(self, column: int, lo: int, hi: int) -> int:
+        self.lock.acquire_IS()
+        try:
+            if not isinstance(self.data.get(column), OrderedIndex):
+                raise Exception("No ordered index exists for column {}".format(str(column)))
+            with self.col_locks[column].acquire_S():
+                return self.data[column].count(lo, hi)
+        finally:
+            self.lock.release_IS()
+
+    """
+    # Whether the given column has an index that Indices.range can use without
+    # looking at every value
+    """
+    def is_ordered(self, column: int) -> bool:
+        self.lock.acquire_IS()
+        try:
+            return isinstance(self.data.get(column), OrderedIndex)
+        finally:
+            self.lock.release_IS()
+
     """
     # After this call, self.locate(column, value) should return a list containing RID.
     """
@@ -80,6 +145,27 @@ class Indices:
         finally:
             self.lock.release_IX()
 
+    """
+    # insert for many records, taking the locks once
+    :param pairs: list  # of (value, RID)
+    """
+    def insert_many(self, column: int, pairs: list):
+        self.lock.acquire_IX()
+        try:
+            if column not in self.data:
+                raise Exception("No index exists for given column")
+
+            with self.col_locks[column].acquire_X():
+                index = self.data[column]
+                if isinstance(index, OrderedIndex):
+                    # Appends a batch of increasing keys chunk by chunk
+                    index.insert_many(pairs)
+                else:
+                    for value, RID in pairs:
+                        index.setdefault(value, []).append(RID)
+        finally:
+            self.lock.release_IX()
+
     """
     # After this call, self.locate(column, value) should return a list that does not contain RID.
     """
@@ -107,6 +193,10 @@ class Indices:
 
                 # Remove RID from index on this value
                 list_of_RIDs_for_this_value.remove(RID)
+                # Forget values no record has anymore, so they don't show up in
+                # count and range, or pile up as keys change
+                if len(list_of_RIDs_for_this_value) == 0:
+                    del self.data[column][value]
                 if verbose:
                     print("indices delete says here is self.data after delete:")
                     print(self.data)
@@ -115,14 +205,17 @@ class Indices:
 
     """
     # Create index on specific column. Should raise Exception if index already exists.
+    :param index_type: str  # "hash" or "ordered", see INDEX_TYPES in ordered_index.py
     """
-    def create_index(self, column: int):
+    def create_index(self, column: int, index_type: str = Config.DEFAULT_INDEX_TYPE):
+        if index_type not in INDEX_TYPES:
+            raise Exception("Unknown index type `{}`; expected one of {}".format(index_type, list(INDEX_TYPES)))
         self.lock.acquire_X()
         try:
             if column in self.data and self.data[column] is not None:
                 raise Exception("Index already exists")
 
-            self.data[column] = {}
+            self.data[column] = INDEX_TYPES[index_type]()
             self.col_locks[column] = XSLock()
         finally:
             self.lock.release_X()
@@ -1,6 +1,8 @@
 from JellyDB.config import Config
 from JellyDB.bufferpool import Bufferpool
 from JellyDB.page import Page
+import numpy as np
+import copy
 
 # This logical page has one physical page for every column.
 # If a base bage: INDIRECTION, RID, TIMESTAMP, and SCHEMA_ENCODING + all data columns, e.g. USER_ID
@@ -8,6 +10,11 @@ from JellyDB.page import Page
 # However, this class will be oblivious to whether a column is data or
 # metadata... it just knows it holds several physical pages
 class LogicalPage:
+    # Base pages only: lowest RID of the last tail page merged into this page,
+    # or None if nothing has been merged yet. Tail RIDs count down, so the
+    # tail records with RIDs in [TPS, START_TAIL_RID] are already in here.
+    TPS = None
+
     def __init__(self, table: str, __range: int, num_columns: int, base_RID: int, bound_RID: int, bufferpool: Bufferpool):
         self.num_columns = num_columns
         self.base_RID = base_RID
@@ -19,26 +26,86 @@ class LogicalPage:
 
         # Create new array of Page objects, one per col
         self.pages = []
-        for i in range(self.num_columns):
+        for i in range(self._number_of_physical_pages()):
             self.pages.append(Page(table, __range, bufferpool))
 
+    def _number_of_physical_pages(self) -> int:
+        return self.num_columns
+
     """
     # Read one piece of data from one column in this page
     """
     def get(self, column: int, offset: int):
         return self.pages[column].get_record(offset)
 
+    """
+    # Write one piece of data to one column in this page
+    """
+    def set(self, column: int, offset: int, value: int):
+        self.pages[column].write(value, offset)
+
+    """
+    # Where the given columns of this page live
+    :param columns: list    # column numbers
+    """
+    def page_locations(self, columns: list) -> list:
+        return [self.pages[column].physical_page_location for column in columns]
+
+    """
+    # The physical pages to scan (see Bufferpool.scan) to read the given
+    # columns of every record; pass what the scan yields to columns_from_scan.
+    """
+    def scan_locations(self, columns: list) -> list:
+        return self.page_locations(columns)
+
+    """
+    :param pages: list      # np.ndarray per location returned by scan_locations(columns)
+    :returns: list          # np.ndarray per column, holding the column's value for every offset
+    """
+    def columns_from_scan(self, pages: list, columns: list) -> list:
+        # A page smaller than a frame only uses the start of it
+        return [page[:self.capacity] for page in pages]
+
+    """
+    # Pins the physical pages of the given columns (all of them by default) for
+    # the duration of a `with` block; see Bufferpool.pinned.
+    """
+    def pinned(self, columns: list = None):
+        if columns is None:
+            columns = range(self.num_columns)
+        return self.bufferpool_.pinned(self.page_locations(columns))
+
     # Lisa added this function
     # Read all columns of a record
     def read(self, id):
-        # Create empty list of values
-        values = []
+        return self.read_record(id)
 
-        # Read values from all columns
-        for i in range(self.num_columns):
-            values.append(self.pages[i].get_record(id))
+    """
+    # Reads one record, pinning each column's page once
+    :param columns: list    # column numbers to read; all of them by default
+    :returns: list          # one value per column read
+    """
+    def read_record(self, offset: int, columns: list = None) -> list:
+        if columns is None:
+            columns = range(self.num_columns)
+        return self.bufferpool_.read_record(self.page_locations(columns), offset)
 
-        return values
+    """
+    # Reads some columns of several records, pinning each column's page once
+    :param columns: list    # column numbers to read
+    :param offsets: list    # offsets of the records
+    :returns: list          # one list per column, holding the column's value at each offset
+    """
+    def read_columns(self, columns: list, offsets: list) -> list:
+        return [self.bufferpool_.read_offsets(location, offsets) for location in self.page_locations(columns)]
+
+    """
+    # Reads the given columns of every record of this page, pinning each
+    # column's page once
+    :returns: list          # np.ndarray per column, holding the column's value for every offset
+    """
+    def read_column_arrays(self, columns: list) -> list:
+        return [self.bufferpool_.read_slice(location, 0, self.capacity) for location in self.page_locations(columns)]
 
     """
     # Write a record somewhere in this page (one value per column).
@@ -51,24 +118,59 @@ class LogicalPage:
             self.bound_RID, "index", str(index), "self.capacity", self.capacity)
             raise Exception("Index out of bounds")
 
-        # Loop through columns in record
-        # Write each value to the corresponding page
         if verbose: print(str(self.base_RID) + " " + str(self.bound_RID))
-        for i in range(len(record)):
-            self.pages[i].write(record[i], index)
+        self.write_record(record, index)
+
+    """
+    # Writes one value per column at `offset`, pinning each column's page once.
+    # Columns outside [first_column, first_column + len(record)) are left alone.
+    """
+    def write_record(self, record: list, offset: int, first_column: int = 0):
+        self.write_columns(record, offset, range(first_column, first_column + len(record)))
+
+    """
+    # Writes values[i] to column columns[i] at `offset`, pinning each column's page once.
+    # Other columns are left alone.
+    """
+    def write_columns(self, values: list, offset: int, columns: list):
+        self.bufferpool_.write_record(self.page_locations(columns), values, offset)
+
+    """
+    # Writes len(columns[0]) consecutive records starting at `offset`, each
+    # column as one slice, pinning each column's page once
+    :param columns: list    # np.ndarray per column, holding that column of every record
+    """
+    def write_records(self, columns: list, offset: int):
+        for location, values in zip(self.page_locations(range(self.num_columns)), columns):
+            self.bufferpool_.write_slice(location, values, offset)
+
+    """
+    # The page to publish after merging tail records into this base page. A
+    # merge never writes to a base page readers can see: the merged data
+    # columns go to new physical pages, and the new logical page shares the
+    # metadata pages with this one (updates keep writing indirection and
+    # schema encoding there). Readers that still hold this page keep reading
+    # consistent values from its old physical pages.
+    :param data_columns: list   # np.ndarray per data column, with the merged value of every record
+    :param TPS: int             # lowest RID of the tail page merged
+    :param __range: int         # page range this page belongs to
+    :returns: tuple             # (LogicalPage to publish, PhysicalPageLocations it no longer uses)
+    """
+    def merged(self, data_columns: list, TPS: int, __range: int) -> tuple:
+        merged_page = copy.copy(self)
+        merged_page.pages = self.pages[:Config.METADATA_COLUMN_COUNT]
+        for values in data_columns:
+            page = Page(self.tablename, __range, self.bufferpool_)
+            self.bufferpool_.write_slice(page.physical_page_location, values)
+            merged_page.pages.append(page)
+        merged_page.TPS = TPS
+        return merged_page, [page.physical_page_location for page in self.pages[Config.METADATA_COLUMN_COUNT:]]
 
-    def merge_write(self, pages_, columns, range__):
-        '''this line decide whether to discard the old records, if want to keep old records
-        delete this line 74'''
-        pages_ = pages_[:Config.METADATA_COLUMN_COUNT]
-        for i in range(columns): #PAGES FOR MERGED BASE RECORDS, insert into the original Pages() (column store)
-            #pages_.insert(i+Config.METADATA_COLUMN_COUNT, Page(self.tablename, range__, self.bufferpool_))
-            pages_.append(Page(self.tablename, range__, self.bufferpool_))
     """
     # Indirection column is the only in-place update that happens in L-store.
     """
     def update_indirection_column(self, offset: int, value: int):
-        self.pages[Config.INDIRECTION_COLUMN_INDEX].write(value, offset)
+        self.set(Config.INDIRECTION_COLUMN_INDEX, offset, value)
     
     """
     :returns: int   # if all RIDs in this page have been given to records, this value is 0. Otherwise, it is the RID of the next available RID in this page.
@@ -82,4 +184,138 @@ class LogicalPage:
         return self.record_count < self.capacity 
 
     def update_uRID(self, offset:int, boolcheck):
-        self.pages[Config.URID_INDEX].write(boolcheck, offset)
+        self.set(Config.URID_INDEX, offset, boolcheck)
+
+
+# PAX (partition attributes across) layout: instead of one physical page per
+# column, every physical page holds all the columns of a block of
+# RECORDS_PER_PHYSICAL_PAGE consecutive records, each column in its own
+# "mini page":
+#
+#     physical page b: [column 0 of records b*R .. b*R+R-1][column 1 of the same records]...
+#
+# Reading or writing a whole record touches one frame instead of num_columns
+# frames. A column is still contiguous within a frame, so scans stay cheap,
+# but a scan has to read every frame even if it only wants some columns.
+class PaxLogicalPage(LogicalPage):
+    def _number_of_physical_pages(self) -> int:
+        self.records_per_physical_page = Config.MAX_RECORDS_PER_PAGE // self.num_columns
+        if self.records_per_physical_page == 0:
+            raise Exception("A PAX page can't hold a record of {} columns".format(self.num_columns))
+        return -(-self.capacity // self.records_per_physical_page)
+
+    """
+    :returns: tuple     # (physical page holding the record at `offset`, offset of its first column within that page)
+    """
+    def _find(self, offset: int) -> tuple:
+        block, offset_within_block = divmod(offset, self.records_per_physical_page)
+        return self.pages[block], offset_within_block
+
+    def get(self, column: int, offset: int):
+        page, offset_within_block = self._find(offset)
+        return page.get_record(column * self.records_per_physical_page + offset_within_block)
+
+    def set(self, column: int, offset: int, value: int):
+        page, offset_within_block = self._find(offset)
+        page.write(value, column * self.records_per_physical_page + offset_within_block)
+
+    def page_locations(self, columns: list) -> list:
+        raise Exception("A PAX page doesn't have a physical page per column")
+
+    """
+    # Every physical page of a PAX page holds every column
+    """
+    def scan_locations(self, columns: list) -> list:
+        return [page.physical_page_location for page in self.pages]
+
+    def columns_from_scan(self, pages: list, columns: list) -> list:
+        R = self.records_per_physical_page
+        return [
+            np.concatenate([page[column * R:(column + 1) * R] for page in pages])[:self.capacity]
+            for column in columns
+        ]
+
+    """
+    # Pins every physical page of this page; each of them holds every column
+    """
+    def pinned(self, columns: list = None):
+        return self.bufferpool_.pinned(self.scan_locations(columns))
+
+    def read_record(self, offset: int, columns: list = None) -> list:
+        if columns is None:
+            columns = range(self.num_columns)
+        page, offset_within_block = self._find(offset)
+        R = self.records_per_physical_page
+        return self.bufferpool_.read_offsets(page.physical_page_location, [column * R + offset_within_block for column in columns])
+
+    def read_columns(self, columns: list, offsets: list) -> list:
+        R = self.records_per_physical_page
+        values = [[None] * len(offsets) for _ in columns]
+        # Read the records that share a physical page together
+        by_block = {}
+        for i, offset in enumerate(offsets):
+            by_block.setdefault(offset // R, []).append(i)
+        for block, indices in by_block.items():
+            offsets_within_block = [offsets[i] % R for i in indices]
+            read = self.bufferpool_.read_offsets(
+                self.pages[block].physical_page_location,
+                [column * R + offset_within_block for column in columns for offset_within_block in offsets_within_block]
+            )
+            for j in range(len(columns)):
+                for k, i in enumerate(indices):
+                    values[j][i] = read[j * len(indices) + k]
+        return values
+
+    def read_column_arrays(self, columns: list) -> list:
+        pages = [self.bufferpool_.read_slice(page.physical_page_location) for page in self.pages]
+        return self.columns_from_scan(pages, columns)
+
+    def write_columns(self, values: list, offset: int, columns: list):
+        page, offset_within_block = self._find(offset)
+        R = self.records_per_physical_page
+        offsets = [column * R + offset_within_block for column in columns]
+        self.bufferpool_.write_offsets(page.physical_page_location, values, offsets)
+
+    """
+    # One pin per physical page the records fall in, writing a slice of
+    # every column's mini page
+    """
+    def write_records(self, columns: list, offset: int):
+        R = self.records_per_physical_page
+        count = len(columns[0])
+        written = 0
+        while written < count:
+            page, offset_within_block = self._find(offset + written)
+            in_block = min(R - offset_within_block, count - written)
+            with self.bufferpool_.pinned([page.physical_page_location]) as (buffered_page,):
+                for column, values in enumerate(columns):
+                    start = column * R + offset_within_block
+                    buffered_page.data[start:start + in_block] = values[written:written + in_block]
+                buffered_page.dirty = True
+            written += in_block
+
+    """
+    # Metadata and data share physical pages here, so there are no metadata
+    # pages to share with a copy: the merged values are written over the
+    # base records in place, and TPS moves last. Until then readers go on
+    # taking the merged columns from the tail records, which hold the same
+    # values.
+    """
+    def merged(self, data_columns: list, TPS: int, __range: int) -> tuple:
+        R = self.records_per_physical_page
+        for block, page in enumerate(self.pages):
+            # One pin per physical page for all of its data columns
+            with self.bufferpool_.pinned([page.physical_page_location]) as (buffered_page,):
+                for column, values in enumerate(data_columns, Config.METADATA_COLUMN_COUNT):
+                    block_values = values[block * R:(block + 1) * R]
+                    buffered_page.data[column * R:column * R + len(block_values)] = block_values
+                buffered_page.dirty = True
+        self.TPS = TPS
+        return self, []
+
+
+# Names accepted by Database.create_table(..., page_layout=...)
+PAGE_LAYOUTS = {
+    "column": LogicalPage,
+    "pax": PaxLogicalPage,
+}
@@ -0,0 +1,113 @@
+from JellyDB.config import Config
+from JellyDB.xs_lock import XSLock
+import threading
+import sys
+
+# Rough size of one entry of Table.record_locks: a one-entry dict holding an XSLock
+_BYTES_PER_RECORD_LOCK = (
+    sys.getsizeof({0: None})
+    + sys.getsizeof(XSLock())
+    + sys.getsizeof(XSLock().__dict__)
+    + sys.getsizeof(threading.Lock())
+    + 8 # pointer to it in the page's list
+)
+# Rough size of what one value of an index points to (beyond the dict's own
+# table): a list holding one RID, plus the value and the RID as ints
+_BYTES_PER_INDEX_VALUE = sys.getsizeof([0]) + 2 * sys.getsizeof(2**62)
+
+# Keeps the bufferpool, the tables' indices and their per-record lock tables
+# within one memory budget. The indices and record locks grow with the data and
+# can't be evicted, so the bufferpool gives up frames to make room for them
+# (down to Config.MIN_FRAMES_PER_BUFFERPOOL_PARTITION per partition) and gets
+# them back, up to the size it was opened with, if they shrink.
+#
+# The sizes of indices and record locks are estimates from entry counts, but
+# adding them up still looks at every page of every table. So allocating pages
+# only checks the budget once every MEMORY_BUDGET_CHECK_INTERVAL_IN_PAGES
+# allocations, and doesn't wait for pinned pages when it shrinks the bufferpool.
+class MemoryBudget:
+    """
+    :param budget_in_bytes: int     # total for bufferpool + indices + record locks
+    :param bufferpool: Bufferpool
+    :param tables: dict             # Database.tables, map from name to Table
+    """
+    def __init__(self, budget_in_bytes: int, bufferpool, tables: dict):
+        self.budget_in_bytes = budget_in_bytes
+        self.bufferpool = bufferpool
+        self.tables = tables
+        # The bufferpool never grows past the size it was opened with
+        self.max_bufferpool_size_in_bytes = bufferpool.size_in_bytes
+        self.min_bufferpool_size_in_bytes = len(bufferpool.partitions) * Config.MIN_FRAMES_PER_BUFFERPOOL_PARTITION * Config.PAGE_SIZE
+        self.lock = threading.Lock()
+        # number of checks where even the smallest bufferpool didn't fit
+        self.times_over_budget = 0
+        # pages allocated since the budget was last checked, see page_allocated
+        self.pages_allocated_since_check = 0
+
+    @staticmethod
+    def index_size_in_bytes(table) -> int:
+        size = 0
+        for column_index in table._indices.data.values():
+            if column_index is None: # dropped
+                continue
+            size += sys.getsizeof(column_index) + len(column_index) * _BYTES_PER_INDEX_VALUE
+        return size
+
+    @staticmethod
+    def record_lock_size_in_bytes(table) -> int:
+        size = sys.getsizeof(table.record_locks)
+        for locks_of_range in table.record_locks.values():
+            for locks_of_page in locks_of_range:
+                size += sys.getsizeof(locks_of_page) + len(locks_of_page) * _BYTES_PER_RECORD_LOCK
+        # Vacuum dropped the locks of the slots waiting to be reused
+        return size - len(table._free_base_RIDs) * (_BYTES_PER_RECORD_LOCK - 8)
+
+    """
+    :returns: dict  # estimated bytes used by each consumer, their total and the budget
+    """
+    def usage(self) -> dict:
+        indices = 0
+        record_locks = 0
+        for table in list(self.tables.values()):
+            if table is None: # dropped
+                continue
+            indices += MemoryBudget.index_size_in_bytes(table)
+            record_locks += MemoryBudget.record_lock_size_in_bytes(table)
+        bufferpool = self.bufferpool.size_in_bytes
+        return {
+            "bufferpool": bufferpool,
+            "indices": indices,
+            "record_locks": record_locks,
+            "total": bufferpool + indices + record_locks,
+            "budget": self.budget_in_bytes,
+        }
+
+    """
+    # Called by the bufferpool every time it allocates a page, often from
+    # inside an insert or update. Checks the budget now and then, and never
+    # raises: if pinned pages keep the bufferpool from shrinking all the way,
+    # the next check tries again.
+    """
+    def page_allocated(self):
+        with self.lock:
+            self.pages_allocated_since_check += 1
+            if self.pages_allocated_since_check < Config.MEMORY_BUDGET_CHECK_INTERVAL_IN_PAGES:
+                return
+            self.pages_allocated_since_check = 0
+        self.enforce(wait=False)
+
+    """
+    # Resizes the bufferpool so that everything fits in the budget
+    :param wait: bool   # whether to wait for pinned pages to be unpinned if shrinking needs their frames
+    """
+    def enforce(self, wait: bool = True):
+        with self.lock:
+            usage = self.usage()
+            room_for_bufferpool = self.budget_in_bytes - usage["indices"] - usage["record_locks"]
+            target = min(room_for_bufferpool, self.max_bufferpool_size_in_bytes)
+            if target < self.min_bufferpool_size_in_bytes:
+                self.times_over_budget += 1
+                target = self.min_bufferpool_size_in_bytes
+            # Don't churn the bufferpool for less than a page per partition
+            if abs(target - self.bufferpool.size_in_bytes) >= len(self.bufferpool.partitions) * Config.PAGE_SIZE:
+                self.bufferpool.resize(target, wait)
@@ -0,0 +1,183 @@
+from JellyDB.config import Config
+import threading
+import traceback
+import time
+
+# Runs the merges of every table of a database on a small pool of worker
+# threads.
+#
+# A table hands over a tail page with submit() when the page fills up. The
+# page waits in the table's merge_queue until the base pages of its page range
+# are full too (Table._base_is_full); the table calls notify() when that
+# happens. Workers sleep on a condition variable until one of these two calls
+# wakes them, so an idle database doesn't use any CPU.
+#
+# The merges of one page range run one at a time, in the order of their tail
+# pages' RIDs: a merge moves the range's TPS past every tail record of its
+# page, so page k+1 must wait for page k even if it filled first (an update
+# still writing to page k holds page k back). Different ranges (and tables)
+# are merged in parallel.
+#
+# So a tail page whose merge fails can't just be dropped: every later page of
+# its range would wait for it forever. It goes back in the queue and is
+# merged again after MERGE_RETRY_DELAY_IN_SECONDS.
+class MergeScheduler:
+    """
+    :param workers: int     # number of threads running merges
+    """
+    def __init__(self, workers: int = Config.MERGE_WORKERS):
+        if workers < 1:
+            raise Exception("A merge scheduler needs at least one worker")
+        self.tables = []
+        # Guards self.tables, every table's merge_queue and the counters below
+        self.condition = threading.Condition()
+        self.stopping = False
+        # (table, page range number) of the merges being run
+        self.running = set()
+        # (table, page range number) -> when the range's failed merge may be tried again
+        self.retry_at = {}
+        # counters reported by statistics()
+        self.merges = 0
+        self.failed_merges = 0
+        self.seconds_merging = 0.0
+        self.max_seconds_merging = 0.0
+        self.seconds_waiting = 0.0
+        self.workers = [
+            threading.Thread(target=self._work, daemon=True, name="merge_worker_{}".format(i))
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    """
+    # Starts scheduling the merges of a table, including the tail pages it
+    # already had queued (e.g. when it was saved)
+    """
+    def add_table(self, table):
+        with self.condition:
+            table._merge_scheduler = self
+            self.tables.append(table)
+            self.condition.notify_all()
+
+    """
+    # Stops scheduling the merges of a table and waits for its running merges
+    """
+    def remove_table(self, table):
+        with self.condition:
+            self.tables.remove(table)
+            table._merge_scheduler = None
+            self.retry_at = {key: retry_at for key, retry_at in self.retry_at.items() if key[0] is not table}
+            while any(running_table is table for running_table, _ in self.running):
+                self.condition.wait()
+
+    """
+    # Queues a full tail page for merging
+    :param table: Table
+    :param tail_page: list  # [page range number, page number within that range, last tail RID], see Table.merge
+    """
+    def submit(self, table, tail_page: list):
+        with self.condition:
+            table.merge_queue.append(tail_page + [time.time()])
+            self.condition.notify()
+
+    """
+    # Wakes a worker to check whether a queued tail page can be merged now
+    """
+    def notify(self):
+        with self.condition:
+            self.condition.notify()
+
+    """
+    # A queued tail page that can be merged now. Caller holds self.condition.
+    :returns: tuple     # (table, queued entry), or None
+    """
+    def _next_merge(self):
+        now = time.time()
+        for table in self.tables:
+            for entry in table.merge_queue:
+                page_range = entry[0]
+                # Only the tail page right after the last one merged may be merged
+                if (table, page_range) not in self.running and table._base_is_full(page_range) \
+                    and table._is_next_tail_page_to_merge(page_range, entry[1]) \
+                    and self.retry_at.get((table, page_range), now) <= now:
+                    return table, entry
+        return None
+
+    """
+    # How long a worker with nothing to merge may sleep: until the next failed
+    # merge may be tried again, or until someone wakes it (None). Caller holds
+    # self.condition.
+    """
+    def _seconds_to_sleep(self):
+        if len(self.retry_at) == 0:
+            return None
+        return max(0.0, min(self.retry_at.values()) - time.time())
+
+    def _work(self):
+        while True:
+            with self.condition:
+                job = self._next_merge()
+                while not self.stopping and job is None:
+                    self.condition.wait(self._seconds_to_sleep())
+                    job = self._next_merge()
+                if self.stopping:
+                    return
+                table, entry = job
+                table.merge_queue.remove(entry)
+                self.running.add((table, entry[0]))
+
+            start = time.time()
+            merged = False
+            try:
+                table.merge(entry[:3])
+                merged = True
+            except Exception:
+                # Keep the worker alive for the other merges
+                traceback.print_exc()
+            finally:
+                finish = time.time()
+                with self.condition:
+                    self.running.discard((table, entry[0]))
+                    if merged:
+                        self.merges += 1
+                        self.seconds_merging += finish - start
+                        self.max_seconds_merging = max(self.max_seconds_merging, finish - start)
+                        self.seconds_waiting += start - entry[3]
+                        self.retry_at.pop((table, entry[0]), None)
+                    else:
+                        # The range's TPS can't move on until this page is merged
+                        self.failed_merges += 1
+                        table.merge_queue.append(entry)
+                        self.retry_at[(table, entry[0])] = finish + Config.MERGE_RETRY_DELAY_IN_SECONDS
+                    # The next tail page of this range may be waiting for this one
+                    self.condition.notify_all()
+
+    """
+    # Lets the running merges finish, then stops the workers. Queued tail
+    # pages stay in their tables' merge queues.
+    """
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    """
+    :returns: dict  # merges run and failed, tail pages waiting, and how long merges took and waited (seconds)
+    """
+    def statistics(self) -> dict:
+        with self.condition:
+            return {
+                "merges": self.merges,
+                # merges that raised; their tail pages are back in the backlog
+                "failed_merges": self.failed_merges,
+                # page ranges whose last merge failed and is waiting to be tried again
+                "failing_ranges": len(self.retry_at),
+                "running": len(self.running),
+                "backlog": sum(len(table.merge_queue) for table in self.tables),
+                "average_merge_seconds": self.seconds_merging / self.merges if self.merges > 0 else 0.0,
+                "max_merge_seconds": self.max_seconds_merging,
+                "average_wait_seconds": self.seconds_waiting / self.merges if self.merges > 0 else 0.0,
+            }
@@ -0,0 +1,84 @@
+"""
+Usage: python -m JellyDB.merge_scheduler_tester
+
+Checks that a merge that raises doesn't stall its page range. The tail pages
+of a range are merged strictly in order, so if the failed page were dropped
+every later one would wait in the backlog forever. With 8 records per page,
+the first merge of the table fails once; its page must go back in the queue,
+be merged again, and the pages behind it after it.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+import traceback
+import tempfile
+import shutil
+import time
+import sys
+
+def select(table, key: int) -> list:
+    location = table.pre_select(key, 0, [1, 1, 1], transaction_id='select')
+    return table.select(key, 0, [1, 1, 1], location)[0].columns
+
+def update(table, key: int, columns: tuple):
+    location = table.pre_update(key, columns, transaction_id='update {} {}'.format(key, columns))
+    table.update(key, columns, location)
+
+"""
+# Makes the table's next merge raise, once
+"""
+def fail_next_merge(table):
+    merge = table.merge
+    def failing_merge(tail_page_to_work_on, verbose=False):
+        table.merge = merge
+        raise Exception("Merge of tail page {} failed on purpose".format(tail_page_to_work_on))
+    table.merge = failing_merge
+
+def failed_merge_is_retried(page_layout: str):
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', 3, 0, page_layout=page_layout, records_per_page=8)
+        query = Query(grades_table)
+        records = {}
+        for key in range(grades_table._base_pages_per_range * 8):
+            records[key] = [key, key, 2]
+            query.insert(*records[key])
+
+        fail_next_merge(grades_table)
+        # Fills four tail pages of the first range
+        for value in range(32):
+            key = value % 8
+            update(grades_table, key, (None, 100 + value, None))
+            records[key][1] = 100 + value
+
+        for _ in range(1000):
+            statistics = db.merge_statistics()
+            if statistics["backlog"] == 0 and statistics["running"] == 0:
+                break
+            time.sleep(.01)
+        assert statistics["failed_merges"] == 1, statistics
+        assert statistics["failing_ranges"] == 0, statistics
+        assert statistics["backlog"] == 0 and statistics["merges"] == 4, statistics
+        # TPS is at the last of the four tail pages
+        page_range = grades_table._page_ranges[0]
+        assert page_range[0].TPS == page_range[grades_table._base_pages_per_range + 3].base_RID
+        for key, columns in records.items():
+            assert select(grades_table, key) == columns, "record {} reads {}".format(key, select(grades_table, key))
+        db.close()
+    finally:
+        shutil.rmtree(path)
+
+tests_failed = 0
+for page_layout in PAGE_LAYOUTS:
+    try:
+        failed_merge_is_retried(page_layout)
+        print("failed merge is retried ({} layout) passed".format(page_layout))
+    except Exception:
+        print("failed merge is retried ({} layout) FAILED".format(page_layout))
+        print(traceback.format_exc())
+        tests_failed += 1
+
+if tests_failed > 0:
+    sys.exit(1)
@@ -0,0 +1,190 @@
+from JellyDB.config import Config
+import bisect
+
+"""
+# Index of one column that keeps its values in order, so Indices.range can
+# find the values within [lo, hi] by binary search instead of probing every
+# integer in between.
+#
+# Point lookups go through a dict from value to list of RIDs, exactly like a
+# hash index. Next to it, the values are kept sorted, cut into chunks of at
+# most ORDERED_INDEX_CHUNK_SIZE values, with the largest value of each chunk
+# in a list of its own. A value seen for the first time is placed by a binary
+# search over those maxima and one within its chunk, so inserting only ever
+# shifts one chunk, never every value (which would make loading n keys cost
+# O(n^2)). A chunk that grows past the limit is split in two. Keys inserted
+# in increasing order, the usual case for a primary key, go at the end of
+# the last chunk.
+#
+# Behaves like the dict it replaces for everything Indices does with an index
+# (get, [], del, len, `in`), so Indices doesn't care which kind it holds.
+"""
+class OrderedIndex:
+    def __init__(self):
+        # value -> list of RIDs
+        self.RIDs = {}
+        # every value in self.RIDs, sorted, cut into sorted lists
+        self.chunks = []
+        # largest value of each chunk
+        self.chunk_maxes = []
+
+    """
+    # Called when unpickled. Indices saved before the chunks kept one sorted
+    # list plus an unsorted overflow.
+    """
+    def __setstate__(self, state):
+        if 'sorted_values' in state:
+            values = sorted(state.pop('sorted_values') + state.pop('overflow'))
+            state['chunks'], state['chunk_maxes'] = [], []
+            self.__dict__.update(state)
+            self._append_sorted(values)
+        else:
+            self.__dict__.update(state)
+
+    def get(self, value: int, default=None):
+        return self.RIDs.get(value, default)
+
+    def __getitem__(self, value: int) -> list:
+        return self.RIDs[value]
+
+    def __setitem__(self, value: int, RIDs: list):
+        if value not in self.RIDs:
+            self._add_value(value)
+        self.RIDs[value] = RIDs
+
+    """
+    # Forgets a value, e.g. once its last RID has been deleted from the index
+    """
+    def __delitem__(self, value: int):
+        del self.RIDs[value]
+        i = bisect.bisect_left(self.chunk_maxes, value)
+        chunk = self.chunks[i]
+        del chunk[bisect.bisect_left(chunk, value)]
+        if len(chunk) == 0:
+            del self.chunks[i]
+            del self.chunk_maxes[i]
+        else:
+            self.chunk_maxes[i] = chunk[-1]
+
+    def __contains__(self, value: int) -> bool:
+        return value in self.RIDs
+
+    def __len__(self) -> int:
+        return len(self.RIDs)
+
+    """
+    # Adds many (value, RID) pairs. If the values seen for the first time are
+    # all larger than every value already here (a load of increasing keys),
+    # they're sorted once and appended chunk by chunk.
+    :param pairs: list  # of (value, RID)
+    """
+    def insert_many(self, pairs: list):
+        new_values = []
+        for value, RID in pairs:
+            RIDs = self.RIDs.get(value)
+            if RIDs is None:
+                self.RIDs[value] = [RID]
+                new_values.append(value)
+            else:
+                RIDs.append(RID)
+        new_values.sort()
+        if len(new_values) > 0 and (len(self.chunk_maxes) == 0 or new_values[0] > self.chunk_maxes[-1]):
+            self._append_sorted(new_values)
+        else:
+            for value in new_values:
+                self._add_value(value)
+
+    """
+    # Puts a value that isn't in the index yet in its place
+    """
+    def _add_value(self, value: int):
+        if len(self.chunks) == 0:
+            self.chunks.append([value])
+            self.chunk_maxes.append(value)
+            return
+        i = bisect.bisect_left(self.chunk_maxes, value)
+        if i == len(self.chunks):
+            # Larger than every value: goes at the end of the last chunk
+            i -= 1
+            self.chunks[i].append(value)
+            self.chunk_maxes[i] = value
+        else:
+            bisect.insort(self.chunks[i], value)
+        if len(self.chunks[i]) > Config.ORDERED_INDEX_CHUNK_SIZE:
+            chunk = self.chunks[i]
+            half = len(chunk) // 2
+            self.chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+            self.chunk_maxes[i:i + 1] = [chunk[half - 1], chunk[-1]]
+
+    """
+    :param values: list     # sorted, all larger than every value already in the chunks
+    """
+    def _append_sorted(self, values: list):
+        # Fill up the last chunk before starting new ones
+        if len(self.chunks) > 0:
+            room = Config.ORDERED_INDEX_CHUNK_SIZE - len(self.chunks[-1])
+            if room > 0 and len(values) > 0:
+                self.chunks[-1].extend(values[:room])
+                self.chunk_maxes[-1] = self.chunks[-1][-1]
+                values = values[room:]
+        for first in range(0, len(values), Config.ORDERED_INDEX_CHUNK_SIZE):
+            chunk = values[first:first + Config.ORDERED_INDEX_CHUNK_SIZE]
+            self.chunks.append(chunk)
+            self.chunk_maxes.append(chunk[-1])
+
+    """
+    # Chunks that may hold values within [lo, hi], with where those values
+    # start and end in each
+    :returns: list  # of (chunk, first position, position after the last)
+    """
+    def _slices(self, lo: int, hi: int) -> list:
+        slices = []
+        if lo > hi:
+            return slices
+        for i in range(bisect.bisect_left(self.chunk_maxes, lo), len(self.chunks)):
+            chunk = self.chunks[i]
+            if chunk[0] > hi:
+                break
+            first = bisect.bisect_left(chunk, lo) if chunk[0] < lo else 0
+            end = bisect.bisect_right(chunk, hi) if chunk[-1] > hi else len(chunk)
+            slices.append((chunk, first, end))
+        return slices
+
+    """
+    # How many values are within [lo, hi], without listing them
+    """
+    def count(self, lo: int, hi: int) -> int:
+        return sum(end - first for _, first, end in self._slices(lo, hi))
+
+    """
+    # Values within [lo, hi], in order. Costs two binary searches plus the
+    # number of values returned.
+    :returns: list  # of (value, RID) pairs
+    """
+    def range(self, lo: int, hi: int) -> list:
+        pairs = []
+        for chunk, first, end in self._slices(lo, hi):
+            for value in chunk[first:end]:
+                for RID in self.RIDs[value]:
+                    pairs.append((value, RID))
+        return pairs
+
+
+"""
+# Range over a hash index (a plain dict): has to look at every value, but
+# still doesn't probe values that aren't in the index.
+:returns: list  # of (value, RID) pairs, in order of value
+"""
+def hash_index_range(index: dict, lo: int, hi: int) -> list:
+    pairs = []
+    for value in sorted(value for value in index if lo <= value <= hi):
+        for RID in index[value]:
+            pairs.append((value, RID))
+    return pairs
+
+
+# Names accepted by Table.create_index(..., index_type=...)
+INDEX_TYPES = {
+    "hash": dict,
+    "ordered": OrderedIndex,
+}
@@ -0,0 +1,111 @@
+"""
+Usage: python -m JellyDB.ordered_index_tester
+
+Checks that an ordered index only counts and lists values some record still
+has: after deletes, and after updates that change an indexed value (which go
+through Table.replace_if_indexed). Compares Indices.count and Indices.range
+with the records themselves, on the primary key and on a second column with
+an ordered index, then checks that churning keys doesn't leave the index with
+more values than records.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from random import randrange, sample, seed
+import traceback
+import tempfile
+import shutil
+import sys
+
+def update(table, key: int, columns: tuple):
+    location = table.pre_update(key, columns, transaction_id='update {} {}'.format(key, columns))
+    table.update(key, columns, location)
+
+"""
+# Compares count and range over a few intervals with the values in `column`
+# of the records
+"""
+def check_index(table, records: dict, column: int):
+    indices = table._indices
+    internal_column = table.internal_id(column)
+    values = [columns[column] for columns in records.values()]
+    for lo, hi in ((0, 10 ** 6), (0, 9), (5, 50), (40, 39)):
+        expected = sorted(value for value in values if lo <= value <= hi)
+        assert indices.count(internal_column, lo, hi) == len(set(expected)), \
+            "column {}: count over [{}, {}] is {}, expected {}".format(column, lo, hi, indices.count(internal_column, lo, hi), len(set(expected)))
+        pairs = list(indices.range(internal_column, lo, hi))
+        assert [value for value, _ in pairs] == expected, "column {}: range over [{}, {}]".format(column, lo, hi)
+
+def delete_then_count(path: str):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', 3, 0)
+    query = Query(grades_table)
+    records = {}
+    for key in range(10):
+        records[key] = [key, key, 0]
+        query.insert(*records[key])
+    for key in (0, 2, 4, 6, 8):
+        query.delete(key)
+        del records[key]
+    check_index(grades_table, records, 0)
+    assert not grades_table._indices.contains(grades_table.internal_id(0), 4)
+    db.close()
+
+def update_then_count(path: str):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', 3, 0)
+    grades_table.create_index(1, index_type="ordered")
+    query = Query(grades_table)
+    records = {}
+    for key in range(200):
+        records[key] = [key, randrange(0, 100), 0]
+        query.insert(*records[key])
+    for _ in range(1000):
+        key = randrange(0, 200)
+        records[key][1] = randrange(0, 100)
+        update(grades_table, key, (None, records[key][1], None))
+    check_index(grades_table, records, 1)
+    for key in sample(list(records), 50):
+        query.delete(key)
+        del records[key]
+    check_index(grades_table, records, 0)
+    check_index(grades_table, records, 1)
+    db.close()
+
+def churn_keys(path: str):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', 3, 0)
+    grades_table.create_index(1, index_type="ordered")
+    query = Query(grades_table)
+    records = {}
+    for key in range(100):
+        records[key] = [key, key, 0]
+        query.insert(*records[key])
+    # Every value of column 1 is only ever held by one record at a time
+    for value in range(100, 20000):
+        key = value % 100
+        update(grades_table, key, (None, value, None))
+        records[key][1] = value
+    check_index(grades_table, records, 1)
+    index = grades_table._indices.data[grades_table.internal_id(1)]
+    assert len(index) == 100 and sum(len(chunk) for chunk in index.chunks) == 100, len(index)
+    db.close()
+
+tests_failed = 0
+seed(3562901)
+for test in (delete_then_count, update_then_count, churn_keys):
+    path = tempfile.mkdtemp()
+    try:
+        test(path)
+        print(test.__name__, "passed")
+    except Exception:
+        print(test.__name__, "FAILED")
+        print(traceback.format_exc())
+        tests_failed += 1
+    finally:
+        shutil.rmtree(path)
+
+if tests_failed > 0:
+    sys.exit(1)
@@ -0,0 +1,127 @@
+from JellyDB.config import Config
+import array
+
+"""
+# Maps a RID to the (page range, page) of the logical page that holds it, in
+# constant time.
+#
+# RIDAllocator hands out RIDs in blocks of MAX_RECORDS_PER_PAGE, one block per
+# logical page: base pages count up from START_RID and tail pages count down
+# from START_TAIL_RID. So the block a RID belongs to, and its offset within
+# the block, are plain arithmetic:
+#
+#     base RID: block (RID - START_RID) // MAX_RECORDS_PER_PAGE
+#     tail RID: block (START_TAIL_RID - RID) // MAX_RECORDS_PER_PAGE
+#
+# Tables with fewer records per page (see Database.create_table(...,
+# records_per_page=...)) still get a whole block per page and leave the end
+# of it unused, so this arithmetic holds for every table.
+#
+# Each direction keeps two arrays of machine integers indexed by block. The
+# RID allocator is shared by every table, so blocks of other tables hold -1.
+#
+# A PageDirectory never changes once built, so readers need no lock: the Table
+# holds a reference to the current one and swaps in a new one when pages are
+# added (see with_pages). The arrays are split into chunks of CHUNK_SIZE
+# blocks and a new directory shares every chunk it didn't change with the old
+# one, so adding a page copies at most one chunk per array, however big the
+# table is.
+"""
+class PageDirectory:
+    NOT_IN_THIS_TABLE = -1
+    CHUNK_SIZE = 1024
+
+    def __init__(self):
+        # tuples of array.array('q') chunks, indexed by block // CHUNK_SIZE
+        self.base_ranges = ()
+        self.base_pages = ()
+        self.tail_ranges = ()
+        self.tail_pages = ()
+
+    """
+    # A new directory holding everything in this one plus the given pages.
+    # This one is left untouched.
+    :param pages: list  # of (first RID, page range, page); first RID is LogicalPage.base_RID
+                        # (the lowest RID of the page, for tail pages too)
+    :returns: PageDirectory
+    """
+    def with_pages(self, pages: list):
+        new_directory = PageDirectory()
+        columns = {
+            "base_ranges": list(self.base_ranges),
+            "base_pages": list(self.base_pages),
+            "tail_ranges": list(self.tail_ranges),
+            "tail_pages": list(self.tail_pages),
+        }
+        # chunks already copied for new_directory, which can be written to
+        copied = set()
+        for first_RID, page_range, page in pages:
+            direction, block = PageDirectory._block_of_first_RID(first_RID)
+            chunk, index = divmod(block, PageDirectory.CHUNK_SIZE)
+            for name, value in ((direction + "_ranges", page_range), (direction + "_pages", page)):
+                chunks = columns[name]
+                while len(chunks) <= chunk:
+                    chunks.append(array.array('q', [PageDirectory.NOT_IN_THIS_TABLE]) * PageDirectory.CHUNK_SIZE)
+                    copied.add((name, len(chunks) - 1))
+                if (name, chunk) not in copied:
+                    chunks[chunk] = array.array('q', chunks[chunk])
+                    copied.add((name, chunk))
+                chunks[chunk][index] = value
+        for name, chunks in columns.items():
+            setattr(new_directory, name, tuple(chunks))
+        return new_directory
+
+    """
+    :returns: tuple     # ("base" or "tail", block number)
+    """
+    @staticmethod
+    def _block_of_first_RID(first_RID: int) -> tuple:
+        # The two directions meet somewhere in the middle (RIDAllocator makes sure they don't cross)
+        if first_RID < Config.START_TAIL_RID // 2:
+            block, offset = divmod(first_RID - Config.START_RID, Config.MAX_RECORDS_PER_PAGE)
+            direction = "base"
+        else:
+            # The lowest RID of a tail page is the last of its block
+            block, offset = divmod(Config.START_TAIL_RID - first_RID, Config.MAX_RECORDS_PER_PAGE)
+            offset = Config.MAX_RECORDS_PER_PAGE - 1 - offset
+            direction = "tail"
+        if offset != 0:
+            raise Exception("RID {} doesn't start a page".format(first_RID))
+        return direction, block
+
+    """
+    :returns: tuple     # (page range, page, offset within page), or None if the RID isn't in this table
+    """
+    def locate(self, RID: int):
+        block, offset = divmod(RID - Config.START_RID, Config.MAX_RECORDS_PER_PAGE)
+        chunk, index = divmod(block, PageDirectory.CHUNK_SIZE)
+        if chunk < len(self.base_ranges):
+            ranges, pages = self.base_ranges, self.base_pages
+        else:
+            # Every base RID handed out is lower than every tail RID
+            block, offset_from_top = divmod(Config.START_TAIL_RID - RID, Config.MAX_RECORDS_PER_PAGE)
+            offset = Config.MAX_RECORDS_PER_PAGE - 1 - offset_from_top
+            chunk, index = divmod(block, PageDirectory.CHUNK_SIZE)
+            if block < 0 or chunk >= len(self.tail_ranges):
+                return None
+            ranges, pages = self.tail_ranges, self.tail_pages
+        page_range = ranges[chunk][index]
+        if page_range == PageDirectory.NOT_IN_THIS_TABLE:
+            return None
+        return page_range, pages[chunk][index], offset
+
+    """
+    # Like dict.items() of the old {first RID: (page range, page)} directory
+    """
+    def items(self):
+        for block, page_range, page in PageDirectory._entries(self.base_ranges, self.base_pages):
+            yield Config.START_RID + block * Config.MAX_RECORDS_PER_PAGE, (page_range, page)
+        for block, page_range, page in PageDirectory._entries(self.tail_ranges, self.tail_pages):
+            yield Config.START_TAIL_RID - (block + 1) * Config.MAX_RECORDS_PER_PAGE + 1, (page_range, page)
+
+    @staticmethod
+    def _entries(ranges: tuple, pages: tuple):
+        for chunk in range(len(ranges)):
+            for index in range(PageDirectory.CHUNK_SIZE):
+                if ranges[chunk][index] != PageDirectory.NOT_IN_THIS_TABLE:
+                    yield chunk * PageDirectory.CHUNK_SIZE + index, ranges[chunk][index], pages[chunk][index]
@@ -0,0 +1,389 @@
+from JellyDB.config import Config
+from JellyDB.physical_page_location import PhysicalPageLocation
+import collections
+import threading
+import mmap
+import os
+
+# Storage backends move the bytes of physical pages between range files and
+# the Bufferpool. A range file is always laid out the same way (page n starts
+# at byte n*PAGE_SIZE), and the number of pages handed out from each file is
+# kept in `pages_in_file`, which the Bufferpool persists with the database. So
+# a database written with one backend can be reopened with the other.
+#
+# Pages given back with free_page go on their file's free list, also
+# persisted by the Bufferpool, and allocate_page hands them out again before
+# growing the file.
+#
+# Space in a range file is reserved Config.EXTENT_SIZE_IN_PAGES pages at a
+# time (posix_fallocate where the OS has it, otherwise a sparse ftruncate).
+# Allocating a page inside an extent that is already reserved is just a
+# counter increment; no file is touched.
+#
+# Methods marked "must be atomic" expect the caller to hold self.lock.
+class PageStorage:
+    EXTENT_SIZE_IN_BYTES = Config.EXTENT_SIZE_IN_PAGES * Config.PAGE_SIZE
+    # False if frames are the file's own bytes, so dirty frames never have to be written back
+    NEEDS_WRITE_BACK = True
+
+    """
+    :param pages_in_file: dict      # map from range filename to how many pages have been allocated in it
+    :param free_pages_in_file: dict # map from range filename to list of indices of its free pages
+    """
+    def __init__(self, pages_in_file: dict, free_pages_in_file: dict):
+        self.pages_in_file = pages_in_file
+        self.free_pages_in_file = free_pages_in_file
+        # map from range filename to how many pages the file has room for (its size in pages)
+        self.pages_reserved_in_file = {}
+        self.lock = threading.RLock()
+
+    def _pages_already_in_file(self, filename: str) -> int: # must be atomic
+        if filename not in self.pages_in_file:
+            # Files written before page counts were tracked: the file size tells us
+            if os.path.exists(filename):
+                self.pages_in_file[filename] = os.path.getsize(filename) // Config.PAGE_SIZE
+            else:
+                self.pages_in_file[filename] = 0
+        return self.pages_in_file[filename]
+
+    def _pages_reserved(self, filename: str) -> int: # must be atomic
+        if filename not in self.pages_reserved_in_file:
+            if os.path.exists(filename):
+                self.pages_reserved_in_file[filename] = os.path.getsize(filename) // Config.PAGE_SIZE
+            else:
+                self.pages_reserved_in_file[filename] = 0
+        return self.pages_reserved_in_file[filename]
+
+    """
+    # Makes sure the file has room for at least `pages` pages, growing it by
+    # whole extents.
+    """
+    def _reserve_pages(self, filename: str, pages: int): # must be atomic
+        old_size = self._pages_reserved(filename) * Config.PAGE_SIZE
+        if old_size >= pages * Config.PAGE_SIZE:
+            return
+        extents = -(-(pages * Config.PAGE_SIZE) // PageStorage.EXTENT_SIZE_IN_BYTES)
+        new_size = extents * PageStorage.EXTENT_SIZE_IN_BYTES
+        self._extend_file(filename, old_size, new_size)
+        self.pages_reserved_in_file[filename] = new_size // Config.PAGE_SIZE
+
+    """
+    # Grows the file from `old_size` to `new_size` bytes of zeros.
+    """
+    def _extend_file(self, filename: str, old_size: int, new_size: int): # must be atomic
+        raise NotImplementedError()
+
+    """
+    # Grows an open file to `new_size` bytes, asking the file system for real
+    # blocks where it can so that later writes can't fail for lack of space.
+    """
+    @staticmethod
+    def _extend_descriptor(fd: int, old_size: int, new_size: int):
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, old_size, new_size - old_size)
+                return
+            except OSError:
+                pass # file system can't preallocate; a sparse file will do
+        os.ftruncate(fd, new_size)
+
+    """
+    # Hands out a free page of a range file, or else the next one, creating
+    # the file if necessary. A new page always reads as zeros.
+    :returns: int   # index of the new page within the file
+    """
+    def allocate_page(self, filename: str) -> int:
+        with self.lock:
+            free_pages = self.free_pages_in_file.get(filename)
+            if free_pages:
+                return free_pages.pop()
+            index = self._pages_already_in_file(filename)
+            # Guarantees there is enough space to store on disk BEFORE we start performing transactions
+            self._reserve_pages(filename, index + 1)
+            self.pages_in_file[filename] = index + 1
+            return index
+
+    """
+    # Zeroes a page no one uses anymore and puts it on its file's free list.
+    # The caller makes sure it isn't in the bufferpool and that no write of
+    # it is still on its way.
+    """
+    def free_page(self, physical_page_location: PhysicalPageLocation):
+        self.write_page(physical_page_location, bytes(Config.PAGE_SIZE))
+        with self.lock:
+            self.free_pages_in_file.setdefault(physical_page_location.filename, []).append(physical_page_location.index_within_file)
+
+    """
+    # Free pages in all range files
+    """
+    def number_of_free_pages(self) -> int:
+        with self.lock:
+            return sum(len(free_pages) for free_pages in self.free_pages_in_file.values())
+
+    """
+    :returns:   # writable buffer of PAGE_SIZE bytes holding the page
+    """
+    def read_page(self, physical_page_location: PhysicalPageLocation):
+        raise NotImplementedError()
+
+    """
+    # Like read_page, but reads into a buffer the caller reuses (see bufferpool_scan.py)
+    :param buffer: bytearray    # PAGE_SIZE bytes
+    :returns:                   # buffer holding the page; not necessarily `buffer`
+    """
+    def read_page_into(self, physical_page_location: PhysicalPageLocation, buffer: bytearray):
+        raise NotImplementedError()
+
+    def write_page(self, physical_page_location: PhysicalPageLocation, data):
+        raise NotImplementedError()
+
+    """
+    # Writes consecutive pages of one file, starting at page `first_index`.
+    :param pages: list  # of PAGE_SIZE buffers
+    """
+    def write_pages(self, filename: str, first_index: int, pages: list):
+        raise NotImplementedError()
+
+    """
+    # Called when the Bufferpool drops a page from memory.
+    """
+    def evict(self, physical_page_location: PhysicalPageLocation):
+        pass
+
+    """
+    # Releases everything held for the files of `table` and forgets how many
+    # pages they had; the caller is about to delete them.
+    """
+    def forget_table(self, table: str):
+        with self.lock:
+            for filename in list(self.pages_in_file):
+                if PhysicalPageLocation.table_from(filename) == table:
+                    self._close_file(filename)
+                    del self.pages_in_file[filename]
+                    self.free_pages_in_file.pop(filename, None)
+                    self.pages_reserved_in_file.pop(filename, None)
+
+    def _close_file(self, filename: str): # must be atomic
+        pass
+
+    def close(self):
+        pass
+
+
+"""
+# Reads and writes pages with positional I/O (os.pread / os.pwrite) on file
+# descriptors that stay open between calls. At most
+# Config.MAX_OPEN_RANGE_FILES descriptors are kept; when more are needed the
+# least recently used idle one is closed.
+"""
+class FilePageStorage(PageStorage):
+    def __init__(self, pages_in_file: dict, free_pages_in_file: dict):
+        super().__init__(pages_in_file, free_pages_in_file)
+        # LRU-ordered map from filename to _OpenRangeFile (most recently used last)
+        self.open_files = collections.OrderedDict()
+
+    """
+    # Gets an open descriptor for the file and marks it busy so it can't be
+    # closed under us. Every call must be matched by a call to _check_in.
+    """
+    def _check_out(self, filename: str):
+        with self.lock:
+            open_file = self.open_files.get(filename)
+            if open_file is None:
+                open_file = _OpenRangeFile(os.open(filename, os.O_RDWR | os.O_CREAT))
+                self.open_files[filename] = open_file
+                self._close_least_recently_used_files()
+            else:
+                self.open_files.move_to_end(filename)
+            open_file.users += 1
+            return open_file
+
+    def _check_in(self, open_file):
+        with self.lock:
+            open_file.users -= 1
+            # The file was forgotten while we were using it
+            if open_file.users == 0 and open_file.closing:
+                os.close(open_file.fd)
+
+    def _close_least_recently_used_files(self): # must be atomic
+        for filename in list(self.open_files):
+            if len(self.open_files) <= Config.MAX_OPEN_RANGE_FILES:
+                return
+            if self.open_files[filename].users == 0:
+                os.close(self.open_files.pop(filename).fd)
+        # Every descriptor is busy; we go over the limit until some are checked in
+
+    def _extend_file(self, filename: str, old_size: int, new_size: int): # must be atomic
+        open_file = self._check_out(filename)
+        try:
+            PageStorage._extend_descriptor(open_file.fd, old_size, new_size)
+        finally:
+            self._check_in(open_file)
+
+    def read_page(self, physical_page_location: PhysicalPageLocation):
+        open_file = self._check_out(physical_page_location.filename)
+        try:
+            byte_offset_of_target_page = Config.PAGE_SIZE*physical_page_location.index_within_file
+            data = bytearray(os.pread(open_file.fd, Config.PAGE_SIZE, byte_offset_of_target_page))
+        finally:
+            self._check_in(open_file)
+        if len(data) < Config.PAGE_SIZE: # page was allocated but the file was never written that far
+            data.extend(bytes(Config.PAGE_SIZE - len(data)))
+        return data
+
+    def read_page_into(self, physical_page_location: PhysicalPageLocation, buffer: bytearray):
+        open_file = self._check_out(physical_page_location.filename)
+        try:
+            byte_offset_of_target_page = Config.PAGE_SIZE*physical_page_location.index_within_file
+            if hasattr(os, "preadv"):
+                bytes_read = os.preadv(open_file.fd, [buffer], byte_offset_of_target_page)
+            else:
+                data = os.pread(open_file.fd, Config.PAGE_SIZE, byte_offset_of_target_page)
+                buffer[:len(data)] = data
+                bytes_read = len(data)
+        finally:
+            self._check_in(open_file)
+        if bytes_read < Config.PAGE_SIZE: # page was allocated but the file was never written that far
+            buffer[bytes_read:] = bytes(Config.PAGE_SIZE - bytes_read)
+        return buffer
+
+    def write_page(self, physical_page_location: PhysicalPageLocation, data):
+        open_file = self._check_out(physical_page_location.filename)
+        try:
+            start_of_page_in_file = physical_page_location.index_within_file * Config.PAGE_SIZE
+            os.pwrite(open_file.fd, data, start_of_page_in_file)
+        finally:
+            self._check_in(open_file)
+
+    """
+    # One pwritev for all the pages, where the OS has it
+    """
+    def write_pages(self, filename: str, first_index: int, pages: list):
+        open_file = self._check_out(filename)
+        try:
+            start_of_first_page_in_file = first_index * Config.PAGE_SIZE
+            if hasattr(os, "pwritev"):
+                os.pwritev(open_file.fd, pages, start_of_first_page_in_file)
+            else:
+                os.pwrite(open_file.fd, b"".join(pages), start_of_first_page_in_file)
+        finally:
+            self._check_in(open_file)
+
+    def _close_file(self, filename: str): # must be atomic
+        open_file = self.open_files.pop(filename, None)
+        if open_file is None:
+            return
+        if open_file.users == 0:
+            os.close(open_file.fd)
+        else:
+            open_file.closing = True # the last user closes it (see _check_in)
+
+    def close(self):
+        with self.lock:
+            for filename in list(self.open_files):
+                self._close_file(filename)
+
+
+"""
+# Only stores data, no methods
+"""
+class _OpenRangeFile:
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.users = 0
+        self.closing = False
+
+
+"""
+# Maps every range file into memory once, one mapping per extent of
+# Config.EXTENT_SIZE_IN_PAGES pages, and hands out frames as zero-copy
+# memoryview slices of the mapping. Files grow a whole extent at a time, so
+# existing mappings never have to be resized.
+#
+# Writes to a frame land directly in the OS page cache; there is nothing to copy
+# when a frame is flushed or evicted.
+"""
+class MmapPageStorage(PageStorage):
+    NEEDS_WRITE_BACK = False
+
+    def __init__(self, pages_in_file: dict, free_pages_in_file: dict):
+        super().__init__(pages_in_file, free_pages_in_file)
+        # map from filename to file descriptor
+        self.file_descriptors = {}
+        # map from filename to {extent number: mmap}
+        self.mappings = {}
+
+    def _open_file(self, filename: str) -> int: # must be atomic
+        if filename not in self.file_descriptors:
+            self.file_descriptors[filename] = os.open(filename, os.O_RDWR | os.O_CREAT)
+            self.mappings[filename] = {}
+        return self.file_descriptors[filename]
+
+    def _extend_file(self, filename: str, old_size: int, new_size: int): # must be atomic
+        PageStorage._extend_descriptor(self._open_file(filename), old_size, new_size)
+
+    def _get_mapping(self, filename: str, extent: int) -> mmap.mmap: # must be atomic
+        self._open_file(filename)
+        mapping = self.mappings[filename].get(extent)
+        if mapping is None:
+            # Files from "file" mode may end in the middle of an extent
+            self._reserve_pages(filename, (extent + 1) * Config.EXTENT_SIZE_IN_PAGES)
+            mapping = mmap.mmap(
+                self.file_descriptors[filename],
+                PageStorage.EXTENT_SIZE_IN_BYTES,
+                offset=extent * PageStorage.EXTENT_SIZE_IN_BYTES
+            )
+            self.mappings[filename][extent] = mapping
+        return mapping
+
+    def read_page(self, physical_page_location: PhysicalPageLocation):
+        extent, page_within_extent = divmod(physical_page_location.index_within_file, Config.EXTENT_SIZE_IN_PAGES)
+        with self.lock:
+            mapping = self._get_mapping(physical_page_location.filename, extent)
+        start = page_within_extent * Config.PAGE_SIZE
+        return memoryview(mapping)[start:start + Config.PAGE_SIZE]
+
+    def read_page_into(self, physical_page_location: PhysicalPageLocation, buffer: bytearray):
+        # Nothing to copy; the mapping already holds the page
+        return self.read_page(physical_page_location)
+
+    def write_page(self, physical_page_location: PhysicalPageLocation, data):
+        # The frame is a view of the mapping, so its bytes are already in the file
+        pass
+
+    def write_pages(self, filename: str, first_index: int, pages: list):
+        pass
+
+    """
+    # Tells the kernel we are done with the page so it can drop it from our
+    # address space. The data stays in the page cache and goes to disk as usual.
+    """
+    def evict(self, physical_page_location: PhysicalPageLocation):
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        extent, page_within_extent = divmod(physical_page_location.index_within_file, Config.EXTENT_SIZE_IN_PAGES)
+        with self.lock:
+            mappings_of_file = self.mappings.get(physical_page_location.filename)
+            mapping = mappings_of_file.get(extent) if mappings_of_file is not None else None
+            if mapping is None:
+                return
+            # madvise works on whole OS pages
+            start = (page_within_extent * Config.PAGE_SIZE) // mmap.PAGESIZE * mmap.PAGESIZE
+            end = -(-((page_within_extent + 1) * Config.PAGE_SIZE) // mmap.PAGESIZE) * mmap.PAGESIZE
+            mapping.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def _close_file(self, filename: str): # must be atomic
+        if filename not in self.file_descriptors:
+            return
+        for mapping in self.mappings.pop(filename).values():
+            mapping.flush()
+            try:
+                mapping.close()
+            except BufferError:
+                pass # someone still holds a frame of this extent; it is unmapped once they let go
+        os.close(self.file_descriptors.pop(filename))
+
+    def close(self):
+        with self.lock:
+            for filename in list(self.file_descriptors):
+                self._close_file(filename)
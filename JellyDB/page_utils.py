@@ -1,32 +1,64 @@
 from JellyDB.config import Config
+import numpy as np
 
-# Assumes each page will be the size listed in Config
+# Assumes each page will be the size listed in Config.
+#
+# Pages are handled as NumPy arrays of Config.RECORD_DTYPE which are zero-copy
+# views over the page's bytes, so reading or writing a record is just array
+# indexing and reading or writing many records is just slicing.
 class PageUtils:
     """
-    :param page: bytearray  # the variable in memory to write to
+    # Wraps the raw bytes of a page without copying them. Writes to the
+    # returned array go straight into `buffer`.
+    :param buffer: bytearray    # (or any writable buffer) holding the bytes of exactly one page
+    :returns: np.ndarray        # one element per record in the page
+    """
+    @staticmethod
+    def view(buffer) -> np.ndarray:
+        return np.frombuffer(buffer, dtype=Config.RECORD_DTYPE)
+
+    """
+    :param page: np.ndarray # the page in memory to write to (see PageUtils.view)
     :param value: int       # a number between 0 and 2**64 - 1 to insert as the next record in this page
     :param index: int       # which index in the page to write to (write permissions will be controlled in logical_page.py)
     """
     @staticmethod
-    def write(page: bytearray, value: int, index: int):
+    def write(page: np.ndarray, value: int, index: int):
         if value < 0 or value > Config.MAX_RECORD_VALUE:
-            raise Exception("value" + value + " out of bounds")
-    
-        value_as_bytes = value.to_bytes(Config.RECORD_SIZE_IN_BYTES, Config.INT_BYTE_ORDER, signed=False)
-        
-        first_byte_in_page_to_write_to = index*Config.RECORD_SIZE_IN_BYTES
-    
-        for i in range(Config.RECORD_SIZE_IN_BYTES):
-            page[first_byte_in_page_to_write_to + i] = value_as_bytes[i]
-    
+            raise Exception("value {} out of bounds".format(value))
+        page[index] = value
+
     """
     # Use this to retrieve a value from a physical page!
-    :param page: bytearray  # the variable in memory to read from
+    :param page: np.ndarray # the page in memory to read from (see PageUtils.view)
     :param n: int   # The index of the record to get
     :returns: int   # The record as an integer
     """
     @staticmethod
-    def get_record(page: bytearray, offset_within_page: int) -> int:
-        first_byte = offset_within_page*Config.RECORD_SIZE_IN_BYTES
-        last_byte = first_byte + Config.RECORD_SIZE_IN_BYTES
-        return int.from_bytes(page[first_byte:last_byte], Config.INT_BYTE_ORDER, signed=False)
\ No newline at end of file
+    def get_record(page: np.ndarray, offset_within_page: int) -> int:
+        return int(page[offset_within_page])
+
+    """
+    # Copies records [start, stop) out of a page.
+    :returns: np.ndarray    # native-endian uint64 array, safe to keep after the page leaves memory
+    """
+    @staticmethod
+    def read_slice(page: np.ndarray, start: int, stop: int) -> np.ndarray:
+        return page[start:stop].astype(np.uint64)
+
+    """
+    # Writes consecutive records starting at `start`.
+    :param values: list or np.ndarray   # each a number between 0 and 2**64 - 1
+    """
+    @staticmethod
+    def write_slice(page: np.ndarray, values, start: int):
+        if not isinstance(values, np.ndarray):
+            try:
+                values = np.array(values, dtype=np.uint64)
+            except OverflowError:
+                raise Exception("values out of bounds")
+        elif values.dtype.kind == 'i' and len(values) > 0 and values.min() < 0:
+            raise Exception("values out of bounds")
+        if start < 0 or start + len(values) > len(page):
+            raise Exception("Slice of {} records at {} does not fit in a page".format(len(values), start))
+        page[start:start + len(values)] = values
@@ -0,0 +1,60 @@
+"""
+Usage: python -m JellyDB.performance_background_writer [number of records]
+
+Inserts records and then updates random ones, with the background writer off
+(Config.BACKGROUND_WRITER_CLEAN_FRACTION = 0) and on. For each run prints how
+many evictions had to write their victim back in the foreground, and how fast
+the background writer wrote pages and how many it wrote per call.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.config import Config
+from time import perf_counter
+from random import randrange, seed
+import tempfile
+import shutil
+import sys
+
+UPDATES = 10000
+
+def run_workload(number_of_records: int, clean_fraction: float):
+    Config.BACKGROUND_WRITER_CLEAN_FRACTION = clean_fraction
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path, storage_mode="file")
+        grades_table = db.create_table('Grades', 5, 0)
+        query = Query(grades_table)
+        seed(3562901)
+        start = perf_counter()
+        for i in range(number_of_records):
+            query.insert(i, 0, 0, 0, 0)
+        for operation in range(UPDATES):
+            columns = (None, randrange(0, 100), None, None, None)
+            key = randrange(0, number_of_records)
+            location = grades_table.pre_update(key, columns, transaction_id=operation)
+            grades_table.update(key, columns, location)
+        elapsed = perf_counter() - start
+        statistics = db.bufferpool.statistics()
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return statistics, elapsed
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+default_clean_fraction = Config.BACKGROUND_WRITER_CLEAN_FRACTION
+
+print("{:<16}{:>11}{:>17}{:>15}{:>15}{:>17}{:>10}".format(
+    "clean fraction", "evictions", "dirty evictions", "bg pages", "pages/write", "bg pages/sec", "seconds"))
+for clean_fraction in [0, default_clean_fraction]:
+    statistics, elapsed = run_workload(number_of_records, clean_fraction)
+    writes = statistics["background_writes"]
+    print("{:<16}{:>11}{:>17}{:>15}{:>15.2f}{:>17.0f}{:>10.2f}".format(
+        clean_fraction,
+        statistics["evictions"],
+        statistics["dirty_evictions"],
+        statistics["background_pages_written"],
+        statistics["background_pages_written"] / writes if writes > 0 else 0,
+        statistics["background_pages_per_second"],
+        elapsed))
@@ -0,0 +1,66 @@
+"""
+Usage: python -m JellyDB.performance_insert_many [number of records]
+
+Loads the same rows into a table with one Query.insert per row, then with
+Query.insert_many in batches of a few sizes, for both page layouts, with
+the primary key index and one more index on the table. Prints rows inserted
+per second, and checks afterwards that every row reads back.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+from time import perf_counter
+from random import randrange, seed
+import tempfile
+import shutil
+import sys
+
+NUMBER_OF_COLUMNS = 5
+BATCH_SIZES = (100, 10000, None) # None: every row in one batch
+
+"""
+:param batch_size: int  # 0 to insert one row at a time, None for one batch of every row
+:returns: float         # seconds the load took
+"""
+def load(page_layout: str, rows: list, batch_size) -> float:
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout)
+        grades_table.create_index(2)
+        query = Query(grades_table)
+
+        start = perf_counter()
+        if batch_size == 0:
+            for row in rows:
+                query.insert(*row)
+        else:
+            batch_size = batch_size or len(rows)
+            for first in range(0, len(rows), batch_size):
+                errors = query.insert_many(rows[first:first + batch_size])
+                if len(errors) > 0:
+                    raise errors[0][1]
+        elapsed = perf_counter() - start
+
+        for row in rows[::97]:
+            location = grades_table.pre_select(row[0], 0, [1] * NUMBER_OF_COLUMNS, transaction_id='check')
+            if grades_table.select(row[0], 0, [1] * NUMBER_OF_COLUMNS, location)[0].columns != list(row):
+                raise Exception("Record {} reads wrong after loading".format(row[0]))
+
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return elapsed
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+seed(3562901)
+rows = [(key,) + tuple(randrange(0, 100) for _ in range(NUMBER_OF_COLUMNS - 1)) for key in range(number_of_records)]
+
+print("{:<8}{:>12}{:>10}{:>16}".format("layout", "batch size", "seconds", "rows/second"))
+for page_layout in PAGE_LAYOUTS:
+    for batch_size in (0,) + BATCH_SIZES:
+        elapsed = load(page_layout, rows, batch_size)
+        label = "one row" if batch_size == 0 else "all rows" if batch_size is None else batch_size
+        print("{:<8}{:>12}{:>10.2f}{:>16.0f}".format(page_layout, label, elapsed, number_of_records / elapsed))
@@ -0,0 +1,75 @@
+"""
+Usage: python -m JellyDB.performance_merge [number of records] [number of updates]
+
+Measures merge throughput. Fills a table, takes it away from the merge
+scheduler so its full tail pages pile up in its merge queue, makes random
+updates of one or two columns, then runs Table.merge on every queued tail
+page in order, on this thread. Prints how many tail pages and tail records
+were merged per second, for tables of a few widths and both page layouts,
+and checks afterwards that the merged table still reads the right values.
+"""
+from JellyDB.db import Database
+from JellyDB.config import Config
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+from time import perf_counter
+from random import randrange, sample, seed
+import tempfile
+import shutil
+import sys
+
+COLUMN_COUNTS = (5, 10, 20)
+
+def run_merges(page_layout: str, number_of_columns: int, number_of_records: int, number_of_updates: int) -> tuple:
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', number_of_columns, 0, page_layout=page_layout)
+        # Merge by hand below
+        db.merge_scheduler.remove_table(grades_table)
+        query = Query(grades_table)
+        seed(3562901)
+
+        records = {}
+        for i in range(number_of_records):
+            records[i] = [i] + [randrange(0, 100) for _ in range(number_of_columns - 1)]
+            query.insert(*records[i])
+        for operation in range(number_of_updates):
+            key = randrange(0, number_of_records)
+            columns = [None] * number_of_columns
+            for column in sample(range(1, number_of_columns), randrange(1, 3)):
+                columns[column] = randrange(0, 100)
+                records[key][column] = columns[column]
+            location = grades_table.pre_update(key, tuple(columns), transaction_id=operation)
+            grades_table.update(key, tuple(columns), location)
+
+        # Only tail pages of ranges whose base pages are full can be merged
+        tail_pages = [entry[:3] for entry in grades_table.merge_queue if grades_table._base_is_full(entry[0])]
+        start = perf_counter()
+        for tail_page in tail_pages:
+            grades_table.merge(tail_page)
+        elapsed = perf_counter() - start
+
+        for key in range(0, number_of_records, 97):
+            location = grades_table.pre_select(key, 0, [1] * number_of_columns, transaction_id='check')
+            if grades_table.select(key, 0, [1] * number_of_columns, location)[0].columns != records[key]:
+                raise Exception("Record {} reads wrong after merging".format(key))
+
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return len(tail_pages), elapsed
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20480
+number_of_updates = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+print("{:<8}{:>8}{:>12}{:>10}{:>14}{:>16}".format("layout", "columns", "tail pages", "seconds", "pages/second", "records/second"))
+for page_layout in PAGE_LAYOUTS:
+    for number_of_columns in COLUMN_COUNTS:
+        tail_pages, elapsed = run_merges(page_layout, number_of_columns, number_of_records, number_of_updates)
+        print("{:<8}{:>8}{:>12}{:>10.2f}{:>14.1f}{:>16.0f}".format(
+            page_layout, number_of_columns, tail_pages, elapsed,
+            tail_pages / elapsed, tail_pages * Config.MAX_RECORDS_PER_PAGE / elapsed
+        ))
@@ -0,0 +1,58 @@
+"""
+Usage: python -m JellyDB.performance_page_allocation [number of records]
+
+Insert throughput with one file reservation per physical page (extents of 1
+page, which is how allocation worked before extents) against the default
+extent size. Every new page range allocates (columns x pages per range)
+physical pages, so bulk inserts lean heavily on allocation.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.config import Config
+from JellyDB.page_storage import PageStorage
+from time import perf_counter
+import tempfile
+import shutil
+import sys
+
+def insert_throughput(number_of_records: int, extent_size_in_pages: int) -> float:
+    Config.EXTENT_SIZE_IN_PAGES = extent_size_in_pages
+    PageStorage.EXTENT_SIZE_IN_BYTES = extent_size_in_pages * Config.PAGE_SIZE
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path, storage_mode="file")
+        query = Query(db.create_table('Grades', 5, 0))
+        start = perf_counter()
+        for i in range(number_of_records):
+            query.insert(92106429 + i, 93, 0, 0, 0)
+        elapsed = perf_counter() - start
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return number_of_records / elapsed
+
+def allocation_throughput(number_of_pages: int, extent_size_in_pages: int) -> float:
+    Config.EXTENT_SIZE_IN_PAGES = extent_size_in_pages
+    PageStorage.EXTENT_SIZE_IN_BYTES = extent_size_in_pages * Config.PAGE_SIZE
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path, storage_mode="file")
+        start = perf_counter()
+        for i in range(number_of_pages):
+            db.bufferpool.allocate_page_id('Grades', i % 16)
+        elapsed = perf_counter() - start
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return number_of_pages / elapsed
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+default_extent_size = Config.EXTENT_SIZE_IN_PAGES
+
+for extent_size in [1, default_extent_size]:
+    print("extent of {:>4} page(s): {:>10.0f} inserts/second, {:>10.0f} page allocations/second".format(
+        extent_size,
+        insert_throughput(number_of_records, extent_size),
+        allocation_throughput(number_of_records, extent_size)))
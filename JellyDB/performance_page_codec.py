@@ -0,0 +1,66 @@
+"""
+Usage: python -m JellyDB.performance_page_codec
+
+Micro-benchmark for the per-value cost of reading and writing records in a page.
+Compares the old byte-by-byte codec with the NumPy-backed PageUtils.
+"""
+from JellyDB.config import Config
+from JellyDB.page_utils import PageUtils
+from time import process_time
+from random import randrange
+
+ROUNDS = 200
+
+# The codec PageUtils used before pages became NumPy views, kept here as the baseline
+def legacy_write(page: bytearray, value: int, index: int):
+    value_as_bytes = value.to_bytes(Config.RECORD_SIZE_IN_BYTES, Config.INT_BYTE_ORDER, signed=False)
+    first_byte_in_page_to_write_to = index*Config.RECORD_SIZE_IN_BYTES
+    for i in range(Config.RECORD_SIZE_IN_BYTES):
+        page[first_byte_in_page_to_write_to + i] = value_as_bytes[i]
+
+def legacy_get_record(page: bytearray, offset_within_page: int) -> int:
+    first_byte = offset_within_page*Config.RECORD_SIZE_IN_BYTES
+    last_byte = first_byte + Config.RECORD_SIZE_IN_BYTES
+    return int.from_bytes(page[first_byte:last_byte], Config.INT_BYTE_ORDER, signed=False)
+
+def time_per_value(function, *args) -> float:
+    start = process_time()
+    for _ in range(ROUNDS):
+        function(*args)
+    return (process_time() - start) / (ROUNDS * Config.MAX_RECORDS_PER_PAGE) * 1e9
+
+values = [randrange(0, Config.MAX_RECORD_VALUE) for _ in range(Config.MAX_RECORDS_PER_PAGE)]
+offsets = range(Config.MAX_RECORDS_PER_PAGE)
+
+legacy_page = bytearray(Config.PAGE_SIZE)
+page = PageUtils.view(bytearray(Config.PAGE_SIZE))
+
+def legacy_write_page():
+    for i in offsets:
+        legacy_write(legacy_page, values[i], i)
+
+def legacy_read_page():
+    for i in offsets:
+        legacy_get_record(legacy_page, i)
+
+def write_page():
+    for i in offsets:
+        PageUtils.write(page, values[i], i)
+
+def read_page():
+    for i in offsets:
+        PageUtils.get_record(page, i)
+
+results = [
+    ("single-value write, byte loop", time_per_value(legacy_write_page)),
+    ("single-value write, NumPy view", time_per_value(write_page)),
+    ("single-value read, int.from_bytes", time_per_value(legacy_read_page)),
+    ("single-value read, NumPy view", time_per_value(read_page)),
+    ("whole-page write_slice", time_per_value(PageUtils.write_slice, page, values, 0)),
+    ("whole-page read_slice", time_per_value(PageUtils.read_slice, page, 0, Config.MAX_RECORDS_PER_PAGE)),
+]
+
+assert legacy_page == bytearray(page.tobytes()), "codecs disagree on the page layout"
+
+for name, nanoseconds in results:
+    print("{:<40}{:>10.1f} ns/value".format(name, nanoseconds))
@@ -0,0 +1,91 @@
+"""
+Usage: python -m JellyDB.performance_page_geometry [number of records] [repetitions]
+
+Sweeps records per page and page range geometries (see
+Database.create_table(..., records_per_page=..., base_pages_per_range=...)).
+For every combination, and
+`repetitions` times each, fills a table, times selecting every record
+("tester 1"), random updates with the merge scheduler running, and selecting
+every record again after closing and reopening the database ("tester 2"),
+like test_on_performance_m2 does for the default geometry.
+
+Prints the median of each timing per combination.
+
+The physical page size is fixed: every page takes a whole Config.PAGE_SIZE
+bufferpool frame and disk page, however few records it holds. So fewer
+records per page here means more pages, more frames and more merges for the
+same records, never less I/O per page. This is not the experiment behind
+Milestone_2_page_sizePlots.R, which changed the page size itself.
+"""
+from JellyDB.db import Database
+from time import perf_counter
+from random import randrange, seed
+from statistics import median
+import tempfile
+import shutil
+import sys
+
+RECORDS_PER_PAGE = (32, 64, 128, 256)
+BASE_PAGES_PER_RANGE = (1, 2, 4, 8)
+NUMBER_OF_COLUMNS = 5
+
+def select_every_record(table, records: dict):
+    for key, columns in records.items():
+        location = table.pre_select(key, 0, [1] * NUMBER_OF_COLUMNS, transaction_id='select')
+        if table.select(key, 0, [1] * NUMBER_OF_COLUMNS, location)[0].columns != columns:
+            raise Exception("Record {} reads wrong".format(key))
+
+"""
+:returns: list  # [update, select_t1, select_t2] in seconds
+"""
+def run(records_per_page: int, base_pages_per_range: int, number_of_records: int) -> list:
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0,
+            records_per_page=records_per_page, base_pages_per_range=base_pages_per_range)
+        seed(3562901)
+
+        records = {}
+        for key in range(number_of_records):
+            records[key] = [key] + [randrange(0, 20) for _ in range(NUMBER_OF_COLUMNS - 1)]
+            grades_table.insert(tuple(records[key]))
+
+        start = perf_counter()
+        select_every_record(grades_table, records)
+        select_t1 = perf_counter() - start
+
+        start = perf_counter()
+        for operation in range(10 * number_of_records):
+            key = randrange(0, number_of_records)
+            columns = [None] * NUMBER_OF_COLUMNS
+            column = randrange(1, NUMBER_OF_COLUMNS)
+            columns[column] = records[key][column] = randrange(0, 20)
+            location = grades_table.pre_update(key, tuple(columns), transaction_id=operation)
+            grades_table.update(key, tuple(columns), location)
+        update = perf_counter() - start
+        db.daemon_slayer()
+        db.close()
+
+        db = Database()
+        db.open(path)
+        grades_table = db.get_table('Grades')
+        start = perf_counter()
+        select_every_record(grades_table, records)
+        select_t2 = perf_counter() - start
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return [update, select_t1, select_t2]
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+print("{:>10}{:>13}{:>10}{:>12}{:>12}".format("records", "base pages", "update", "select t1", "select t2"))
+for records_per_page in RECORDS_PER_PAGE:
+    for base_pages_per_range in BASE_PAGES_PER_RANGE:
+        runs = [run(records_per_page, base_pages_per_range, number_of_records) for _ in range(repetitions)]
+        print("{:>10}{:>13}{:>10.3f}{:>12.3f}{:>12.3f}".format(
+            records_per_page, base_pages_per_range, *(median(timings) for timings in zip(*runs))))
@@ -0,0 +1,73 @@
+"""
+Usage: python -m JellyDB.performance_page_layout [number of records]
+
+Runs the same workload on a table of each page layout (see PAGE_LAYOUTS in
+logical_page.py): inserts, point selects and updates on random keys, then a
+sum over the whole table. Prints the seconds each phase took and how many
+frames the bufferpool had to load for it.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+from time import perf_counter
+from random import randrange, seed
+import tempfile
+import shutil
+import sys
+
+NUMBER_OF_COLUMNS = 5
+OPERATIONS = 10000
+
+def run_workload(page_layout: str, number_of_records: int) -> list:
+    path = tempfile.mkdtemp()
+    results = []
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout)
+        query = Query(grades_table)
+        seed(3562901)
+
+        def phase(name: str, work):
+            misses_before = db.bufferpool.statistics()["misses"]
+            start = perf_counter()
+            work()
+            elapsed = perf_counter() - start
+            results.append((name, elapsed, db.bufferpool.statistics()["misses"] - misses_before))
+
+        def insert():
+            for i in range(number_of_records):
+                query.insert(i, *[randrange(0, 100) for _ in range(NUMBER_OF_COLUMNS - 1)])
+
+        def select():
+            for operation in range(OPERATIONS):
+                key = randrange(0, number_of_records)
+                location = grades_table.pre_select(key, 0, [1] * NUMBER_OF_COLUMNS, transaction_id=operation)
+                grades_table.select(key, 0, [1] * NUMBER_OF_COLUMNS, location)
+
+        def update():
+            for operation in range(OPERATIONS):
+                key = randrange(0, number_of_records)
+                columns = (None, randrange(0, 100), None, None, None)
+                location = grades_table.pre_update(key, columns, transaction_id=OPERATIONS + operation)
+                grades_table.update(key, columns, location)
+
+        def aggregate():
+            query.sum(0, number_of_records - 1, 1)
+
+        phase("insert", insert)
+        phase("select", select)
+        phase("update", update)
+        phase("sum", aggregate)
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return results
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+print("{:<8}{:<8}{:>10}{:>12}".format("layout", "phase", "seconds", "misses"))
+for page_layout in PAGE_LAYOUTS:
+    for name, elapsed, misses in run_workload(page_layout, number_of_records):
+        print("{:<8}{:<8}{:>10.2f}{:>12}".format(page_layout, name, elapsed, misses))
@@ -0,0 +1,66 @@
+"""
+Usage: python -m JellyDB.performance_replacement_policy
+
+Runs the same workload under every bufferpool replacement policy and prints
+the bufferpool's hit/miss/eviction counters for each. The workload is point
+selects and updates on a small hot set of keys, interrupted now and then by a
+sequential pass over a large slice of the table (like a range scan).
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.replacement_policy import REPLACEMENT_POLICIES
+from time import perf_counter
+from random import randrange, seed, random
+import tempfile
+import shutil
+
+NUMBER_OF_RECORDS = 10000
+HOT_KEYS = 500
+OPERATIONS = 20000
+SCAN_EVERY = 2000
+SCAN_LENGTH = 2000
+
+def run_workload(replacement_policy: str):
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path, replacement_policy=replacement_policy)
+        grades_table = db.create_table('Grades', 5, 0)
+        query = Query(grades_table)
+        for i in range(NUMBER_OF_RECORDS):
+            query.insert(i, 0, 0, 0, 0)
+
+        seed(3562901)
+        start_statistics = db.bufferpool.statistics()
+        start = perf_counter()
+        for operation in range(OPERATIONS):
+            if operation % SCAN_EVERY == 0:
+                first = randrange(0, NUMBER_OF_RECORDS - SCAN_LENGTH)
+                for key in range(first, first + SCAN_LENGTH):
+                    location = grades_table.pre_select(key, 0, [1, 1, 1, 1, 1], transaction_id='scan')
+                    grades_table.select(key, 0, [1, 1, 1, 1, 1], location)
+            key = randrange(0, HOT_KEYS)
+            if random() < 0.5:
+                location = grades_table.pre_select(key, 0, [1, 1, 1, 1, 1], transaction_id=operation)
+                grades_table.select(key, 0, [1, 1, 1, 1, 1], location)
+            else:
+                columns = (None, randrange(0, 100), None, None, None)
+                location = grades_table.pre_update(key, columns, transaction_id=operation)
+                grades_table.update(key, columns, location)
+        elapsed = perf_counter() - start
+        statistics = db.bufferpool.statistics()
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+
+    hits = statistics["hits"] - start_statistics["hits"]
+    misses = statistics["misses"] - start_statistics["misses"]
+    evictions = statistics["evictions"] - start_statistics["evictions"]
+    return hits, misses, evictions, elapsed
+
+print("{:<8}{:>12}{:>10}{:>11}{:>11}{:>10}".format("policy", "hits", "misses", "evictions", "hit ratio", "seconds"))
+for replacement_policy in REPLACEMENT_POLICIES:
+    hits, misses, evictions, elapsed = run_workload(replacement_policy)
+    print("{:<8}{:>12}{:>10}{:>11}{:>11.4f}{:>10.2f}".format(
+        replacement_policy, hits, misses, evictions, hits / (hits + misses), elapsed))
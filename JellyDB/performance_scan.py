@@ -0,0 +1,52 @@
+"""
+Usage: python -m JellyDB.performance_scan [number of records]
+
+Times Table.sum over the whole table, which reads every base page through a
+bufferpool scan, and checks how much of a small hot set of records is still in
+the bufferpool afterwards: the hot set is selected once before the sum and
+once after, and the bufferpool misses of the second pass are printed.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from time import perf_counter
+import tempfile
+import shutil
+import sys
+
+HOT_KEYS = 200
+
+def select_hot_set(grades_table):
+    for key in range(HOT_KEYS):
+        location = grades_table.pre_select(key, 0, [1, 1, 1, 1, 1], transaction_id='hot')
+        grades_table.select(key, 0, [1, 1, 1, 1, 1], location)
+
+number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+path = tempfile.mkdtemp()
+try:
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    for i in range(number_of_records):
+        query.insert(i, i % 100, 0, 0, 0)
+
+    select_hot_set(grades_table)
+    before_sum = db.bufferpool.statistics()
+    start = perf_counter()
+    total = query.sum(0, number_of_records - 1, 1)
+    elapsed = perf_counter() - start
+    after_sum = db.bufferpool.statistics()
+    select_hot_set(grades_table)
+    after_hot_set = db.bufferpool.statistics()
+
+    print("sum of {} records = {} in {:.3f} seconds ({:.0f} records/second)".format(
+        number_of_records, total, elapsed, number_of_records / elapsed))
+    print("pages the sum read from storage: {}, copied from frames: {}, bufferpool misses during the sum: {}".format(
+        after_sum["scan_reads"] - before_sum["scan_reads"],
+        after_sum["scan_hits"] - before_sum["scan_hits"],
+        after_sum["misses"] - before_sum["misses"]))
+    print("bufferpool misses selecting the hot set again: {}".format(after_hot_set["misses"] - after_sum["misses"]))
+    db.daemon_slayer()
+    db.close()
+finally:
+    shutil.rmtree(path)
@@ -0,0 +1,73 @@
+"""
+Usage: python -m JellyDB.performance_thread_scaling [number of transactions]
+
+Runs the transaction_tester workload (each transaction selects and increments
+5 records) with 1, 2, 4 and 8 worker threads, against a bufferpool with a
+single latch and one split into Config.BUFFERPOOL_PARTITIONS partitions, and
+prints committed transactions per second for each combination.
+
+CPython only runs one thread at a time, so this measures how much the threads
+get in each other's way inside the bufferpool rather than true parallelism.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.config import Config
+from JellyDB.transaction import Transaction
+from JellyDB.transaction_worker import TransactionWorker
+from time import perf_counter
+from random import randint, seed
+import threading
+import tempfile
+import shutil
+import sys
+
+NUMBER_OF_RECORDS = 10000
+THREAD_COUNTS = [1, 2, 4, 8]
+
+def transactions_per_second(number_of_threads: int, partitions: int, number_of_transactions: int) -> float:
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path, bufferpool_partitions=partitions)
+        grades_table = db.create_table('Grades', 5, 0)
+        keys = []
+        for i in range(NUMBER_OF_RECORDS):
+            keys.append(92106429 + i)
+            Query(grades_table).insert(keys[-1], 0, 0, 0, 0)
+
+        seed(8739878934)
+        transaction_workers = [TransactionWorker([]) for _ in range(number_of_threads)]
+        for i in range(number_of_transactions):
+            k = randint(0, NUMBER_OF_RECORDS // 5 - 1)
+            transaction = Transaction()
+            for j in range(5):
+                key = keys[k * 5 + j]
+                q = Query(grades_table)
+                transaction.add_query(q.select, key, 0, [1, 1, 1, 1, 1])
+                q = Query(grades_table)
+                transaction.add_query(q.increment, key, 1)
+            transaction_workers[i % number_of_threads].add_transaction(transaction)
+
+        threads = [threading.Thread(target=transaction_worker.run) for transaction_worker in transaction_workers]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+        committed = sum(t.result for t in transaction_workers)
+
+        db.daemon_slayer()
+        db.close()
+    finally:
+        shutil.rmtree(path)
+    return committed / elapsed
+
+number_of_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+print("{:<9}{:>22}{:>22}".format("threads", "1 partition (tx/s)", "{} partitions (tx/s)".format(Config.BUFFERPOOL_PARTITIONS)))
+for number_of_threads in THREAD_COUNTS:
+    print("{:<9}{:>22.0f}{:>22.0f}".format(
+        number_of_threads,
+        transactions_per_second(number_of_threads, 1, number_of_transactions),
+        transactions_per_second(number_of_threads, Config.BUFFERPOOL_PARTITIONS, number_of_transactions)))
@@ -21,6 +21,13 @@ class PhysicalPageLocation:
     @staticmethod
     def filename_from(path: str, table: str, __range: int):
         return os.path.join(path,"{}-{}.bin".format(table, str(__range)))
+
+    """
+    # Inverse of filename_from: which table a range file belongs to
+    """
+    @staticmethod
+    def table_from(filename: str) -> str:
+        return os.path.basename(filename).rsplit("-", 1)[0]
     
     """
     :param path: str    # Operating System path to the directory where this database's files are
@@ -33,6 +33,15 @@ class Query:
     def insert(self, *columns):
         self.table.insert(columns)
 
+    """
+    # See also table.py.
+    # Insert many records, one tuple of columns per record
+    # Rows that can't be inserted are skipped; the others are still inserted
+    # Returns a list of (position of the row in `rows`, Exception) for the skipped rows
+    """
+    def insert_many(self, rows: list):
+        return self.table.insert_many(rows)
+
     """
     # See also table.py.
     # Read a record with specified key
@@ -104,6 +113,16 @@ class Query:
     def sum(self, start_range: int, end_range: int, aggregate_column_index: int):
         return self.table.sum(start_range, end_range, aggregate_column_index)
 
+    """
+    # See table.py.
+    # Read every record whose value in `column` is within [start_range, end_range]
+    # Returns a list of Record objects, in order of that value
+
+    :param query_columns: what columns to return. array of 1 or 0 values.
+    """
+    def select_range(self, start_range: int, end_range: int, column: int, query_columns: list):
+        return self.table.select_range(start_range, end_range, column, query_columns)
+
     """
     # Increments one column of the record.
     # Returns True is increment is successful
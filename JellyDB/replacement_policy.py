@@ -0,0 +1,190 @@
+import collections
+
+"""
+# Raised by choose_victim when every frame is pinned
+"""
+class AllFramesPinnedException(Exception):
+    def __init__(self):
+        super().__init__("All frames are pinned")
+
+# Replacement policies decide which bufferpool frame to reuse when the pool is
+# full. The Bufferpool tells its policy about every page it loads into a frame
+# (record_load) and every later access to that frame (record_access), then asks
+# it for a victim. A frame can only be chosen if `can_evict(frame)` is True,
+# i.e. nobody has it pinned.
+#
+# Every policy does O(1) work per access. Choosing a victim is O(1) unless
+# frames at the cold end are pinned and have to be skipped.
+class ReplacementPolicy:
+    """
+    :param capacity: int    # number of frames in the pool this policy manages
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+    """
+    # A page was just loaded into `frame` (the frame may have held another page before)
+    """
+    def record_load(self, frame: int, physical_page_location):
+        raise NotImplementedError()
+
+    """
+    # A page already in `frame` was requested again
+    """
+    def record_access(self, frame: int):
+        raise NotImplementedError()
+
+    """
+    :param can_evict: function  # frame number -> bool
+    :returns: int               # frame whose page should be evicted
+    """
+    def choose_victim(self, can_evict) -> int:
+        raise NotImplementedError()
+
+    """
+    # The pool shrank; `frame` no longer exists
+    """
+    def forget(self, frame: int):
+        raise NotImplementedError()
+
+
+"""
+# Least recently used, kept in an OrderedDict so that each access is a
+# move_to_end instead of a list remove/append.
+"""
+class LRUPolicy(ReplacementPolicy):
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        # frames from least to most recently used
+        self.recency = collections.OrderedDict()
+
+    def record_load(self, frame: int, physical_page_location):
+        self.record_access(frame)
+
+    def record_access(self, frame: int):
+        if frame in self.recency:
+            self.recency.move_to_end(frame)
+        else:
+            self.recency[frame] = None
+
+    def choose_victim(self, can_evict) -> int:
+        for frame in self.recency:
+            if can_evict(frame):
+                return frame
+        raise AllFramesPinnedException()
+
+    def forget(self, frame: int):
+        self.recency.pop(frame, None)
+
+
+"""
+# CLOCK (second chance): every frame has a reference bit that is set on
+# access. The hand sweeps the frames, clearing set bits, and stops at the
+# first unpinned frame whose bit is already clear.
+"""
+class ClockPolicy(ReplacementPolicy):
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        # frame numbers in the order the hand visits them
+        self.ring = []
+        # frame number -> reference bit
+        self.referenced = {}
+        self.hand = 0
+
+    def record_load(self, frame: int, physical_page_location):
+        if frame not in self.referenced:
+            self.ring.append(frame)
+        self.referenced[frame] = True
+
+    def record_access(self, frame: int):
+        self.referenced[frame] = True
+
+    def choose_victim(self, can_evict) -> int:
+        # Two full sweeps clear every bit, so by then any unpinned frame is a victim
+        for _ in range(2 * len(self.ring) + 1):
+            frame = self.ring[self.hand]
+            self.hand = (self.hand + 1) % len(self.ring)
+            if not can_evict(frame):
+                continue
+            if self.referenced[frame]:
+                self.referenced[frame] = False
+                continue
+            return frame
+        raise AllFramesPinnedException()
+
+    def forget(self, frame: int):
+        if frame not in self.referenced:
+            return
+        self.ring.remove(frame)
+        del self.referenced[frame]
+        self.hand = self.hand % len(self.ring) if self.ring else 0
+
+
+"""
+# 2Q (Johnson & Shasha). Pages seen once live in a FIFO queue (A1in); only a
+# page that comes back after being evicted from A1in (remembered in the ghost
+# queue A1out) is promoted to the LRU queue Am. A long scan therefore only
+# churns A1in and never pushes the hot pages in Am out of the pool.
+"""
+class TwoQueuePolicy(ReplacementPolicy):
+    # Share of the frames A1in may hold before it is preferred for eviction
+    A1IN_SHARE = 0.25
+    # How many evicted pages A1out remembers, relative to the number of frames
+    A1OUT_SHARE = 0.5
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        # frame -> None, oldest first
+        self.a1_in = collections.OrderedDict()
+        # frame -> None, least recently used first
+        self.a_m = collections.OrderedDict()
+        # PhysicalPageLocation -> None, oldest first (pages only; they hold no frame)
+        self.a1_out = collections.OrderedDict()
+        # frame -> PhysicalPageLocation it holds, so we can remember it in A1out
+        self.page_in_frame = {}
+
+    def record_load(self, frame: int, physical_page_location):
+        self.a1_in.pop(frame, None)
+        self.a_m.pop(frame, None)
+        self.page_in_frame[frame] = physical_page_location
+        if physical_page_location in self.a1_out:
+            del self.a1_out[physical_page_location]
+            self.a_m[frame] = None
+        else:
+            self.a1_in[frame] = None
+
+    def record_access(self, frame: int):
+        # Re-references while in A1in are treated as correlated and ignored
+        if frame in self.a_m:
+            self.a_m.move_to_end(frame)
+
+    def choose_victim(self, can_evict) -> int:
+        if len(self.a1_in) > max(1, int(self.capacity * TwoQueuePolicy.A1IN_SHARE)):
+            queues = [self.a1_in, self.a_m]
+        else:
+            queues = [self.a_m, self.a1_in]
+        for queue in queues:
+            for frame in queue:
+                if can_evict(frame):
+                    if queue is self.a1_in:
+                        self._remember(self.page_in_frame[frame])
+                    return frame
+        raise AllFramesPinnedException()
+
+    def _remember(self, physical_page_location):
+        self.a1_out[physical_page_location] = None
+        while len(self.a1_out) > max(1, int(self.capacity * TwoQueuePolicy.A1OUT_SHARE)):
+            self.a1_out.popitem(last=False)
+
+    def forget(self, frame: int):
+        self.a1_in.pop(frame, None)
+        self.a_m.pop(frame, None)
+        self.page_in_frame.pop(frame, None)
+
+
+# Names accepted by Database.open(..., replacement_policy=...)
+REPLACEMENT_POLICIES = {
+    "lru": LRUPolicy,
+    "clock": ClockPolicy,
+    "2q": TwoQueuePolicy,
+}
@@ -1,6 +1,6 @@
 from JellyDB.config import Config
 from JellyDB.bufferpool import Bufferpool
-from JellyDB.logical_page import LogicalPage
+from JellyDB.logical_page import LogicalPage, PAGE_LAYOUTS
 import threading
 
 class RIDAllocator:
@@ -24,42 +24,50 @@ class RIDAllocator:
     """
     def __setstate__(self, state):
         self.__dict__.update(state)
-        self.lock = threading.Lock()
+        # Re-entrant, like the one __init__ makes: Table adds pages while already holding it
+        self.lock = threading.RLock()
     
     """
-    :param filename: str    # The filename that this new page range should have - of the form "TableName-index"
-    :param col_count: int   # The number of columns in each page in this range
+    :param filename: str            # The filename that this new page range should have - of the form "TableName-index"
+    :param col_count: int           # The number of columns in each page in this range
+    :param layout: str              # key of PAGE_LAYOUTS
+    :param base_pages: int          # number of base pages in the range
+    :param records_per_page: int    # capacity of each page, at most MAX_RECORDS_PER_PAGE
     """
-    def make_page_range(self, table: str, __range: int, col_count: int) -> list:
+    def make_page_range(self, table: str, __range: int, col_count: int, layout: str = Config.DEFAULT_PAGE_LAYOUT,
+                        base_pages: int = Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE, records_per_page: int = Config.MAX_RECORDS_PER_PAGE) -> list:
         pages = []
-        for _ in range(Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE):
-            pages.append(self.make_base_page(table, __range, col_count))
-        pages.append(self.make_tail_page(table, __range, col_count))
+        for _ in range(base_pages):
+            pages.append(self.make_base_page(table, __range, col_count, layout, records_per_page))
+        pages.append(self.make_tail_page(table, __range, col_count, layout, records_per_page))
 
         return pages
 
     """
-    # Allocates a base page with its own unique RID range
+    # Allocates a base page with its own unique RID range. Every page gets a
+    # block of MAX_RECORDS_PER_PAGE RIDs (see page_directory.py); a page
+    # holding fewer records only uses the first records_per_page of them.
     :returns:   # tuple, (lowest RID allocated, highest RID allocated)
     """
-    def make_base_page(self, table: str, __range: int, col_count: int) -> LogicalPage:
+    def make_base_page(self, table: str, __range: int, col_count: int, layout: str = Config.DEFAULT_PAGE_LAYOUT,
+                       records_per_page: int = Config.MAX_RECORDS_PER_PAGE) -> LogicalPage:
         base = self.nextRIDToAssign
-        bound = base + Config.MAX_RECORDS_PER_PAGE - 1
-        self.nextRIDToAssign = bound + 1
+        bound = base + records_per_page - 1
+        self.nextRIDToAssign = base + Config.MAX_RECORDS_PER_PAGE
         if self.nextRIDToAssign > self.nextTailRIDToAssign:
             raise Exception("Address space full")
-        return LogicalPage(table, __range, col_count, base, bound, self.bufferpool)
+        return PAGE_LAYOUTS[layout](table, __range, col_count, base, bound, self.bufferpool)
     
     """
-    # Allocates a tail page with its own unique RID range
+    # Allocates a tail page with its own unique RID range, out of a block of
+    # MAX_RECORDS_PER_PAGE RIDs like make_base_page
     :returns:   # tuple, (lowest RID allocated, highest RID allocated)
     """
-    def make_tail_page(self, table: str, __range: int, col_count: int) -> LogicalPage:
-        bound = self.nextTailRIDToAssign
-        base = bound - Config.MAX_RECORDS_PER_PAGE + 1
+    def make_tail_page(self, table: str, __range: int, col_count: int, layout: str = Config.DEFAULT_PAGE_LAYOUT,
+                       records_per_page: int = Config.MAX_RECORDS_PER_PAGE) -> LogicalPage:
+        base = self.nextTailRIDToAssign - Config.MAX_RECORDS_PER_PAGE + 1
+        bound = base + records_per_page - 1
         self.nextTailRIDToAssign = base - 1
         if self.nextTailRIDToAssign < self.nextRIDToAssign:
             raise Exception("Address space full")
-        return LogicalPage(table, __range, col_count, base, bound, self.bufferpool)
-
-        
+        return PAGE_LAYOUTS[layout](table, __range, col_count, base, bound, self.bufferpool)
@@ -0,0 +1,216 @@
+"""
+Usage: python -m JellyDB.storage_tester
+
+Checks that records read back right through the parts of the storage that
+change how they are laid out and found: tail records holding only the columns
+an update changed (cumulative or not), merges into new base pages, closing
+and reopening after merges, the PAX page layout, slots reused after vacuum,
+and the errors Query.insert_many reports. Every check runs on small pages so
+that tail pages fill and merge after a few updates. See also vacuum_tester.py
+and transaction_tester.py.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+from random import choice, randrange, sample, seed
+import traceback
+import tempfile
+import shutil
+import time
+import sys
+
+NUMBER_OF_COLUMNS = 6
+RECORDS_PER_PAGE = 8
+
+def select(table, key: int, query_columns: list = None) -> list:
+    query_columns = query_columns or [1] * NUMBER_OF_COLUMNS
+    location = table.pre_select(key, 0, query_columns, transaction_id='select')
+    return table.select(key, 0, query_columns, location)[0].columns
+
+def update(table, key: int, columns: list):
+    location = table.pre_update(key, tuple(columns), transaction_id='update {} {}'.format(key, columns))
+    table.update(key, tuple(columns), location)
+
+"""
+# Waits until no full tail page is waiting for or going through a merge
+"""
+def wait_for_merges(db):
+    for _ in range(1000):
+        statistics = db.merge_statistics()
+        if statistics["backlog"] == 0 and statistics["running"] == 0:
+            return
+        time.sleep(.01)
+    raise Exception("Merges didn't finish: {}".format(db.merge_statistics()))
+
+"""
+# Inserts enough records to fill `page_ranges` page ranges, so every tail page
+# can be merged
+:returns: dict  # map from key to the record's columns
+"""
+def fill(table, page_ranges: int) -> dict:
+    records = {}
+    query = Query(table)
+    for key in range(page_ranges * table._base_pages_per_range * table._records_per_page):
+        records[key] = [key] + [randrange(0, 100) for _ in range(NUMBER_OF_COLUMNS - 1)]
+        query.insert(*records[key])
+    return records
+
+"""
+# Updates one to three random columns of random records
+"""
+def update_randomly(table, records: dict, number_of_updates: int):
+    keys = list(records)
+    for _ in range(number_of_updates):
+        key = choice(keys)
+        columns = [None] * NUMBER_OF_COLUMNS
+        for column in sample(range(1, NUMBER_OF_COLUMNS), choice([1, 1, 2, 3])):
+            columns[column] = records[key][column] = randrange(0, 100)
+        update(table, key, columns)
+
+"""
+# Compares every record, a projection of some of them, and sums over a few
+# key ranges against what they should be
+"""
+def check_records(table, records: dict):
+    for key, columns in records.items():
+        assert select(table, key) == columns, "record {} reads {}, expected {}".format(key, select(table, key), columns)
+    projection = [1, 0, 1, 0, 0, 1]
+    for key in list(records)[::7]:
+        expected = [value if asked else None for value, asked in zip(records[key], projection)]
+        assert select(table, key, projection) == expected, "projection of record {}".format(key)
+    query = Query(table)
+    for start, end in ((0, max(records)), (3, 40), (17, 17)):
+        for column in (1, NUMBER_OF_COLUMNS - 1):
+            expected = sum(records[key][column] for key in records if start <= key <= end)
+            assert query.sum(start, end, column) == expected, "sum of column {} over [{}, {}]".format(column, start, end)
+
+def sparse_tail_records(path: str, page_layout: str, cumulative_updates: bool):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout,
+        cumulative_updates=cumulative_updates, records_per_page=RECORDS_PER_PAGE)
+    records = fill(grades_table, 3)
+
+    # Stop the merges so the reads go through the tail records
+    db.merge_scheduler.remove_table(grades_table)
+    update_randomly(grades_table, records, 400)
+    check_records(grades_table, records)
+
+    # Then merge, and update the merged records some more
+    db.merge_scheduler.add_table(grades_table)
+    wait_for_merges(db)
+    assert db.merge_statistics()["merges"] > 0
+    check_records(grades_table, records)
+    update_randomly(grades_table, records, 100)
+    check_records(grades_table, records)
+    db.close()
+
+def merge_then_reopen(path: str, page_layout: str, cumulative_updates: bool):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout,
+        cumulative_updates=cumulative_updates, records_per_page=RECORDS_PER_PAGE)
+    records = fill(grades_table, 3)
+    update_randomly(grades_table, records, 400)
+    wait_for_merges(db)
+    db.close()
+
+    db = Database()
+    db.open(path)
+    grades_table = db.get_table('Grades')
+    check_records(grades_table, records)
+    update_randomly(grades_table, records, 400)
+    wait_for_merges(db)
+    check_records(grades_table, records)
+    db.close()
+
+    db = Database()
+    db.open(path)
+    check_records(db.get_table('Grades'), records)
+    db.close()
+
+def vacuum_then_insert(path: str, page_layout: str, cumulative_updates: bool):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout,
+        cumulative_updates=cumulative_updates, records_per_page=RECORDS_PER_PAGE)
+    records = fill(grades_table, 3)
+    update_randomly(grades_table, records, 400)
+    query = Query(grades_table)
+    next_key = 10000
+    vacuumed = 0
+    for round in range(2):
+        for key in sample(list(records), len(records) // 8):
+            query.delete(key)
+            del records[key]
+        # Vacuum while the deleted records' last updates may still be waiting
+        # in tail pages (only the slots whose tail records are all merged may
+        # go), then again once updates have filled and merged those pages.
+        # Inserts take the freed slots.
+        for _ in range(2):
+            cleared = grades_table.vacuum()["records"]
+            for key in range(next_key, next_key + cleared):
+                records[key] = [key] + [randrange(0, 100) for _ in range(NUMBER_OF_COLUMNS - 1)]
+                query.insert(*records[key])
+            assert len(grades_table._free_base_RIDs) == 0
+            next_key += cleared
+            vacuumed += cleared
+            update_randomly(grades_table, records, 200)
+            wait_for_merges(db)
+            check_records(grades_table, records)
+    assert vacuumed > 0, "vacuum cleared nothing"
+    db.close()
+
+    db = Database()
+    db.open(path)
+    check_records(db.get_table('Grades'), records)
+    db.close()
+
+def insert_many_errors(path: str, page_layout: str, cumulative_updates: bool):
+    db = Database()
+    db.open(path)
+    grades_table = db.create_table('Grades', NUMBER_OF_COLUMNS, 0, page_layout=page_layout,
+        cumulative_updates=cumulative_updates, records_per_page=RECORDS_PER_PAGE)
+    query = Query(grades_table)
+    records = {key: [key, 1, 2, 3, 4, 5] for key in range(20)}
+    assert query.insert_many(list(records.values())) == []
+
+    rows = [
+        [20, 1, 2, 3, 4, 5],
+        [3, 9, 9, 9, 9, 9],     # 1: key already in the table
+        [21, 1, 2],             # 2: too few columns
+        [22, 1, 2, 3, 4, -1],   # 3: negative value
+        [23, 1, 2, 3, 4, 5],
+        [23, 6, 7, 8, 9, 9],    # 5: key repeated within the batch
+        [24, 1, 2, 3, 4, "5"],  # 6: not an integer
+        [25, 1, 2, 3, 4, 5],
+    ]
+    errors = query.insert_many(rows)
+    assert [row_number for row_number, _ in errors] == [1, 2, 3, 5, 6], errors
+    assert all(isinstance(error, Exception) for _, error in errors)
+    for row_number in (0, 4, 7):
+        records[rows[row_number][0]] = rows[row_number]
+    for key in (21, 22, 24):
+        assert not grades_table._indices.contains(grades_table.internal_id(0), key), "key {} was inserted".format(key)
+    check_records(grades_table, records)
+    db.close()
+
+tests_failed = 0
+seed(3562901)
+for test in (sparse_tail_records, merge_then_reopen, vacuum_then_insert, insert_many_errors):
+    for page_layout in PAGE_LAYOUTS:
+        for cumulative_updates in (True, False):
+            name = "{} ({} layout, {})".format(test.__name__, page_layout, "cumulative" if cumulative_updates else "non-cumulative")
+            path = tempfile.mkdtemp()
+            try:
+                test(path, page_layout, cumulative_updates)
+                print(name, "passed")
+            except Exception:
+                print(name, "FAILED")
+                print(traceback.format_exc())
+                tests_failed += 1
+            finally:
+                shutil.rmtree(path)
+
+if tests_failed > 0:
+    sys.exit(1)
@@ -1,4 +1,7 @@
 from JellyDB.rid_allocator import RIDAllocator
+from JellyDB.logical_page import PAGE_LAYOUTS
+from JellyDB.page_directory import PageDirectory
+from JellyDB.epoch_manager import EpochManager
 from JellyDB.indices import Indices
 from JellyDB.page import Page
 from JellyDB.config import Config
@@ -7,9 +10,9 @@ from JellyDB.xs_lock import XSLock
 from time import time_ns
 import numpy as np
 import threading
-from time import process_time
 import time
 import collections
+import array
 
 """
 # the page directory should map from RIDs to this
@@ -32,15 +35,38 @@ class Record:
 #
 # You must call "open" before you use this class
 class Table:
+    # Tables saved before page layouts existed all use one physical page per column
+    _page_layout = "column"
+    # Tables saved before page geometry was per table all have the default one
+    _records_per_page = Config.MAX_RECORDS_PER_PAGE
+    _base_pages_per_range = Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE
 
     """
     :param name: str                    # Table name
     :param num_content_columns: int     # Number of content columns
     :param key: int                     # Index of which column has primary key
+    :param page_layout: str             # how records are laid out in physical pages, see PAGE_LAYOUTS
+    :param cumulative_updates: bool     # whether tail records carry the columns of earlier updates too, see update
+    :param records_per_page: int        # records in each logical page, at most MAX_RECORDS_PER_PAGE. Only the
+                                        # records: every physical page still takes PAGE_SIZE bytes, in frames and on disk
+    :param base_pages_per_range: int    # base pages in each page range, i.e. how many inserts fill a range before it can be merged
     """
-    def __init__(self, name: str, num_content_columns: int, key: int, RID_allocator: RIDAllocator):
+    def __init__(self, name: str, num_content_columns: int, key: int, RID_allocator: RIDAllocator, page_layout: str = Config.DEFAULT_PAGE_LAYOUT, cumulative_updates: bool = Config.DEFAULT_CUMULATIVE_UPDATES,
+                 records_per_page: int = Config.MAX_RECORDS_PER_PAGE, base_pages_per_range: int = Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE):
+        if page_layout not in PAGE_LAYOUTS:
+            raise Exception("Unknown page layout `{}`; expected one of {}".format(page_layout, list(PAGE_LAYOUTS)))
+        # Pages live in bufferpool frames of PAGE_SIZE bytes, so they can't hold any more
+        if not 0 < records_per_page <= Config.MAX_RECORDS_PER_PAGE:
+            raise Exception("A page holds between 1 and {} records".format(Config.MAX_RECORDS_PER_PAGE))
+        if base_pages_per_range < 1:
+            raise Exception("A page range needs at least one base page")
         self._name = name
         self._key = key
+        self._page_layout = page_layout
+        self._cumulative_updates = cumulative_updates
+        # Page geometry: records in each logical page, and base pages in each page range
+        self._records_per_page = records_per_page
+        self._base_pages_per_range = base_pages_per_range
 
         # Number of columns holding actual content
         self._num_content_columns = num_content_columns
@@ -58,40 +84,44 @@ class Table:
         # List of values, one for each page range
         self._next_tail_RID_to_allocate = []
 
-        self._page_directory_lock = XSLock()
-
         # set to True to see messages every time a method spins on a lock
         self.spin_messages = False
 
+        # self._page_directory maps RIDs to (page range, page no. within range), see page_directory.py
+        self._page_directory = PageDirectory()
+
         # Initialize list of page ranges then create first range
         self._page_ranges = []
         self.record_locks = {}
+        # Zone map of the key column: [smallest, largest] key that any version
+        # of a record in each page range ever had, or None if the range is empty.
+        # Only ever widens, so sum can skip ranges that lie outside its key range.
+        self._key_bounds = []
+        # One per page range: held by merge from reading the base pages to
+        # publishing the merged ones, and by whoever else writes data columns
+        # of a full range's base pages (vacuum, inserts into vacuumed slots),
+        # so that those writes can't be lost in a merged copy
+        self._range_locks = []
         self._add_page_range()
 
-        # self._page_directory is a Dictionary of representative rid --> (page range, page no. within range)
-        self._recreate_page_directory()
-
         # Attributes for merging
         self.current_tail_rid = 0
         self.current_base_rid = 0
         # Ranges with full base pages (can be merged)
         # Holds [page range number, last base RID]
         self.ranges_with_full_base = []
-        # Tail pages that are full (can be merged)
-        # Holds [page range number, page number within that range, last tail RID]
+        # Tail pages that are full, waiting to be merged (see merge_scheduler.py)
+        # Holds [page range number, page number within that range, last tail RID, time it filled]
         self.merge_queue = collections.deque()
-
-        # List that holds TPS for each page range
-        # Index is page range number, value is TPS for that page range
-        self.TPS = [None]
+        # Set by MergeScheduler.add_table
+        self._merge_scheduler = None
+        # Readers of base pages, so merge knows when nobody reads the pages it replaced
+        self._epochs = EpochManager()
+        # Base RIDs of deleted records whose slots vacuum has cleared, for insert to reuse
+        self._free_base_RIDs = []
 
         self._indices = Indices()
-        self._indices.create_index(self.internal_id(self._key))
-
-        # Single daemon merge thread that runs in the background
-        self.daemon_stop = False
-        merge_thread = threading.Thread(target = self.merge_daemon, args=(), daemon=True, name ='merge_daemon')
-        merge_thread.start()
+        self._indices.create_index(self.internal_id(self._key), Config.PRIMARY_KEY_INDEX_TYPE)
 
         self.current_transaction_id = []
         self.locations_tobe_summed = {}
@@ -118,57 +148,92 @@ class Table:
     """
     Add index to a non-primary key column.
     """
-    def create_index(self, column_to_index, verbose=False):
+    def create_index(self, column_to_index, verbose=False, index_type: str = Config.DEFAULT_INDEX_TYPE):
         # Add index to indices class
-        self._indices.create_index(self.internal_id(column_to_index))
+        i = self.internal_id(column_to_index)
+        self._indices.create_index(i, index_type)
         # Now populate index
 
-        # Loop through page ranges
-        for range_no, page_range in enumerate(self._page_ranges):
-
-            # Loop through base pages in page range
-            for logical_base_page in page_range[0:Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE]:
+        # Loop through base pages of every page range
+        columns = [Config.INDIRECTION_COLUMN_INDEX, Config.TIMESTAMP_COLUMN_INDEX, i]
+        for range_no, logical_base_page, TPS, (indirection, timestamp, values) in self._scan_base_pages(columns):
+            # Skip records that are empty or deleted
+            live = self._live_records(indirection, timestamp)
+            base_is_latest = self._base_record_is_latest(TPS, indirection)
 
-                # Loop through records in base page
-                for offset in range(0, Config.MAX_RECORDS_PER_PAGE):
-                    record = logical_base_page.read(offset)
+            for offset in np.flatnonzero(live):
+                # Record has not been updated, or its base page is already merged
+                if base_is_latest[offset]:
+                    value = int(values[offset])
 
-                    # Skip records that are empty
-                    if record == [0] * self._num_columns:
-                        continue
-
-                    current_indirection = record[Config.INDIRECTION_COLUMN_INDEX]
-
-                    # Skip records that are deleted
-                    if current_indirection >= Config.RECORD_DELETION_MASK:
-                        continue
+                # Record has been updated, get the value from its tail records
+                else:
+                    value = self._read_latest_version(self.get_record_location(logical_base_page.base_RID + int(offset)), [i])[0]
+                if verbose: print("Create index says: RID {} has value {}".format(logical_base_page.base_RID + offset, value))
 
-                    # Base page is already merged, no need to look at tail page
-                    if self.TPS[range_no] is not None \
-                        and current_indirection > self.TPS[range_no] \
-                        and current_indirection <= Config.START_TAIL_RID:
-                        record_with_metadata = logical_page_of_target.read(target_loc.offset)
+                # Insert into index
+                RID = logical_base_page.base_RID + int(offset)
+                self._indices.insert(i, value, RID)
 
-                    # Base page is not merged
-                    else:
-                        # Page is unmerged but record has not been updated
-                        if current_indirection == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET:
-                            latest_version_logical_page = logical_base_page
-                            latest_version_offset = offset
 
-                        # Record has been updated, get location of tail record
-                        else:
-                            tail_record_loc = self.get_record_location(current_indirection)
-                            latest_version_logical_page = self._page_ranges[tail_record_loc.range][tail_record_loc.page]
-                            latest_version_offset = tail_record_loc.offset
+    """
+    # Walks the base pages of the given page ranges in order with a
+    # bufferpool scan, which reads ahead and doesn't push other pages out of
+    # the bufferpool.
+    :param columns: list    # column numbers (with metadata) to read
+    :param ranges: list     # page range numbers; all of them if None
+    :param pages: list      # (page range number, base page number) pairs to read instead of whole ranges
+    :returns:               # generator of (page range number, base LogicalPage, its TPS when read,
+                            # list with one np.ndarray of the page's capacity values per column)
+    """
+    def _scan_base_pages(self, columns: list, ranges: list = None, pages: list = None):
+        if pages is None:
+            if ranges is None:
+                ranges = range(len(self._page_ranges))
+            pages = [
+                (range_no, page_no)
+                for range_no in ranges
+                for page_no in range(self._base_pages_per_range)
+            ]
+        # TPS is taken before the page is read, see _read_latest_version
+        base_pages = [
+            (range_no, page_no, self._page_ranges[range_no][page_no], self._page_ranges[range_no][page_no].TPS)
+            for range_no, page_no in pages
+        ]
+        steps = [logical_base_page.scan_locations(columns) for _, _, logical_base_page, _ in base_pages]
+        with self._epochs.protect(), self._RID_allocator.bufferpool.scan(steps) as scan:
+            for (range_no, page_no, logical_base_page, TPS), pages in zip(base_pages, scan):
+                values = logical_base_page.columns_from_scan(pages, columns)
+                # A merge published this page again while the scan was on its way: read the new one
+                while self._page_ranges[range_no][page_no] is not logical_base_page or logical_base_page.TPS != TPS:
+                    logical_base_page = self._page_ranges[range_no][page_no]
+                    TPS = logical_base_page.TPS
+                    values = [
+                        np.array(column_values, dtype=Config.RECORD_DTYPE)
+                        for column_values in logical_base_page.read_columns(columns, range(logical_base_page.capacity))
+                    ]
+                yield range_no, logical_base_page, TPS, values
 
-                        record_with_metadata = latest_version_logical_page.read(latest_version_offset)
-                        if verbose: print("Here is the latest version of the record:", record_with_metadata)
+    """
+    # Offsets of a base page that hold a record which hasn't been deleted.
+    # Written records always have a timestamp.
+    :returns: np.ndarray    # of bool
+    """
+    def _live_records(self, indirection: np.ndarray, timestamp: np.ndarray) -> np.ndarray:
+        return (timestamp != 0) & (indirection < Config.RECORD_DELETION_MASK)
 
-                    # Insert into index
-                    i = self.internal_id(column_to_index)
-                    RID = logical_base_page.base_RID + offset
-                    self._indices.insert(i, record_with_metadata[i], RID)
+    """
+    # Offsets of a base page whose base record is the latest version: it has
+    # not been updated, or its updates have been merged into the base page.
+    :param TPS: int         # of the base page, see LogicalPage.TPS
+    :returns: np.ndarray    # of bool
+    """
+    def _base_record_is_latest(self, TPS: int, indirection: np.ndarray) -> np.ndarray:
+        not_updated = indirection == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET
+        if TPS is None:
+            return not_updated
+        # Same test as _tail_record_is_merged: TPS itself is merged
+        return not_updated | ((indirection >= TPS) & (indirection <= Config.START_TAIL_RID))
 
 
     """
@@ -191,47 +256,12 @@ class Table:
         target_RID = self._indices.locate(self.internal_id(self._key), key)[0]
         target_loc = self.get_record_location(target_RID)
 
-        # Find which logical page record lives on
-        target_loc = self.get_record_location(target_RID)
-        logical_page_of_target = self._page_ranges[target_loc.range][target_loc.page]
+        # Get the latest version of the record
+        record_with_metadata = self._read_latest_version(target_loc)
 
-        # Get the most updated logical page
-        # This will be a base page if no updates have happened yet
-        # Or will be a tail page if it has been updated
-        current_indirection = logical_page_of_target.get(Config.INDIRECTION_COLUMN_INDEX, target_loc.offset)
-        self.assert_not_deleted(current_indirection)
-
-        # Base page is already merged, no need to look at tail page
-        if self.TPS[target_loc.range] is not None \
-            and current_indirection > self.TPS[target_loc.range] \
-            and current_indirection <= Config.START_TAIL_RID:
-            record_with_metadata = logical_page_of_target.read(target_loc.offset)
-
-        # Base page is not merged
-        else:
-            # Record has not been updated, no need to look at tail page
-            if current_indirection == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET:
-                latest_version_logical_page = logical_page_of_target
-                latest_version_offset = target_loc.offset
-
-            # Record has been updated, get location of tail record
-            else:
-                tail_record_loc = self.get_record_location(current_indirection)
-                latest_version_logical_page = self._page_ranges[tail_record_loc.range][tail_record_loc.page]
-                latest_version_offset = tail_record_loc.offset
-
-            # Get record from most updated logical page
-            record_with_metadata = latest_version_logical_page.read(latest_version_offset)
-
-        # bitwise OR
-        indirection_value_with_deletion_flag = \
-            record_with_metadata[Config.INDIRECTION_COLUMN_INDEX] | Config.RECORD_DELETION_MASK
-
-        # flag as deleted
-        self._page_ranges[target_loc.range][target_loc.page] \
-            .update_indirection_column(target_loc.offset, indirection_value_with_deletion_flag)
-
-        # delete all values from the index
+        # delete all values from the index, before the record is flagged as
+        # deleted: from then on vacuum may clear the slot and an insert reuse
+        # its RID, and the new record's index entries have that RID too
 
         if verbose:
             print("Table delete says attempting to delete from index")
@@ -249,6 +279,17 @@ class Table:
             if self._indices.has_index(i):
                 self._indices.delete(i, record_with_metadata[i], target_RID)
 
+        # bitwise OR into the base record's own indirection, i.e. the RID of
+        # its latest tail record: vacuum reads it back to tell whether every
+        # tail record of the deleted record has been merged. The latest
+        # version's indirection would be the tail record before that one.
+        logical_base_page = self._page_ranges[target_loc.range][target_loc.page]
+        indirection_value_with_deletion_flag = \
+            logical_base_page.get(Config.INDIRECTION_COLUMN_INDEX, target_loc.offset) | Config.RECORD_DELETION_MASK
+
+        # flag as deleted
+        logical_base_page.update_indirection_column(target_loc.offset, indirection_value_with_deletion_flag)
+
 
     """
     # Insert a record with specified columns
@@ -262,14 +303,23 @@ class Table:
         # Prepend metadata to columns
         # Since this is a new base record, set indirection to 0
         # Base RID metadatacolumn will be 0
-        record_with_metadata = [0, time_ns(), 0, 0, *columns]
-
-        # Get next base rid, find what page it belongs to, and write the record to that page
-        RID = self._allocate_first_available_base_RID()
+        record_with_metadata = [0, time_ns(), 0, 0, 0, *columns]
+
+        # Get a base RID, find what page it belongs to, and write the record
+        # to that page. Slots cleared by vacuum are filled before new RIDs are
+        # handed out.
+        free_RIDs = self._allocate_free_base_RIDs(1)
+        reused_slot = len(free_RIDs) > 0
+        if reused_slot:
+            RID = free_RIDs[0]
+        else:
+            RID = self._allocate_first_available_base_RID()
         record_location = self.get_record_location(RID)
-        self._page_ranges[record_location.range][record_location.page].write(record_with_metadata, record_location.offset)
-        #Initialize locks per offset
-        self.record_locks[record_location.range][record_location.page].append({record_location.offset:XSLock()})
+        if reused_slot:
+            self._write_reused_slot(record_location, record_with_metadata)
+        else:
+            self._page_ranges[record_location.range][record_location.page].write(record_with_metadata, record_location.offset)
+        self._widen_key_bounds(record_location.range, primary_key_value)
         # Create entry for this record in index(es)
         for i in range(self.internal_id(0), self.internal_id(self._num_content_columns)):
             if self._indices.has_index(i):
@@ -278,33 +328,161 @@ class Table:
             else:
                 if verbose: print("table says column {} does not have index; not inserting into index".format(i))
 
+        if reused_slot:
+            return
+
         # Track current base RID
         self.current_base_rid = RID
 
         # If base page is full, add to list of base pages ready to merge
-        # Also, since a new page was created, add another value to TPS list
-        if (self.current_base_rid % Config.TOTAL_RECORDS_FULL) == 0:
-            if verbose: print("Table insert says: Base page full")
-            self.ranges_with_full_base.append([record_location.range, self.current_base_rid])
-            self.TPS.append(None)
-            if verbose: print("Table insert says: Here is self.ranges_with_full_base:", self.ranges_with_full_base)
+        if record_location.page == self._base_pages_per_range - 1 \
+            and RID == self._page_ranges[record_location.range][record_location.page].bound_RID:
+            self._base_is_now_full(record_location.range, RID, verbose)
+
+    """
+    # Inserts many records at once. Whole runs of RIDs are reserved with one
+    # acquisition of the RID allocator's lock, each run is written to its
+    # base page as one slice per column, and every index takes its lock once
+    # for the whole batch.
+    #
+    # A row that can't be inserted (wrong number of columns, a value that
+    # doesn't fit in a column, a primary key already in use or repeated in
+    # the batch) is skipped and reported; the other rows are inserted.
+    :param rows: list   # of tuples, one value per column, like insert takes
+    :returns: list      # of (position of the row in `rows`, Exception) for the rows not inserted
+    """
+    def insert_many(self, rows: list, verbose=False) -> list:
+        errors = []
+        key_column = self.internal_id(self._key)
+
+        # Rows that can be stored, keeping the first of each primary key
+        accepted = []
+        keys_in_batch = set()
+        for row_number, columns in enumerate(rows):
+            columns = tuple(columns)
+            if len(columns) != self._num_content_columns:
+                errors.append((row_number, Exception("Expected {} columns, got {}".format(self._num_content_columns, len(columns)))))
+                continue
+            if not all(isinstance(value, (int, np.integer)) and 0 <= value <= Config.MAX_RECORD_VALUE for value in columns):
+                errors.append((row_number, Exception("Values must be integers between 0 and {}".format(Config.MAX_RECORD_VALUE))))
+                continue
+            if columns[self._key] in keys_in_batch:
+                errors.append((row_number, Exception("Error: The primary key {} is already in use".format(str(columns[self._key])))))
+                continue
+            keys_in_batch.add(columns[self._key])
+            accepted.append((row_number, columns))
+
+        # Primary keys already in the table, looked up with one lock acquisition
+        in_use = self._indices.contains_many(key_column, [columns[self._key] for _, columns in accepted])
+        for (row_number, columns), key_in_use in zip(accepted, in_use):
+            if key_in_use:
+                errors.append((row_number, Exception("Error: The primary key {} is already in use".format(str(columns[self._key])))))
+        rows_to_insert = [columns for (_, columns), key_in_use in zip(accepted, in_use) if not key_in_use]
+        errors.sort(key=lambda error: error[0])
+        if len(rows_to_insert) == 0:
+            return errors
+
+        # Like insert, fill slots cleared by vacuum first, one record at a time
+        # since they are scattered; the rest go in runs of consecutive slots
+        timestamp = time_ns()
+        free_RIDs = self._allocate_free_base_RIDs(len(rows_to_insert))
+        RIDs = list(free_RIDs)
+        for RID, columns in zip(free_RIDs, rows_to_insert):
+            record_location = self.get_record_location(RID)
+            self._write_reused_slot(record_location, [0, timestamp, 0, 0, 0, *columns])
+            self._widen_key_bounds(record_location.range, columns[self._key])
+
+        first_row = len(free_RIDs)
+        for range_no, page_no, offset, count in self._allocate_base_RID_runs(len(rows_to_insert) - first_row):
+            logical_base_page = self._page_ranges[range_no][page_no]
+            data = np.array(rows_to_insert[first_row:first_row + count], dtype=np.uint64).reshape(count, self._num_content_columns)
+            # New base records: no indirection, base RID, uRID or schema encoding
+            metadata = [np.zeros(count, dtype=np.uint64) for _ in range(Config.METADATA_COLUMN_COUNT)]
+            metadata[Config.TIMESTAMP_COLUMN_INDEX][:] = timestamp
+            logical_base_page.write_records(metadata + list(data.T), offset)
+            keys = data[:, self._key]
+            self._widen_key_bounds(range_no, int(keys.min()))
+            self._widen_key_bounds(range_no, int(keys.max()))
+            RIDs.extend(range(logical_base_page.base_RID + offset, logical_base_page.base_RID + offset + count))
+            first_row += count
+            if verbose: print("Table insert_many says: wrote {} records to page {} of page range {}".format(count, page_no, range_no))
+
+            self.current_base_rid = RIDs[-1]
+            if page_no == self._base_pages_per_range - 1 and RIDs[-1] == logical_base_page.bound_RID:
+                self._base_is_now_full(range_no, RIDs[-1], verbose)
+
+        # Once the records are written, make them findable, one lock acquisition per index
+        for i in range(self.internal_id(0), self.internal_id(self._num_content_columns)):
+            if self._indices.has_index(i):
+                self._indices.insert_many(i, [(columns[self.external_id(i)], RID) for columns, RID in zip(rows_to_insert, RIDs)])
 
+        return errors
 
+    """
+    # Makes the tail pages of a page range mergeable once its last base
+    # record is written
+    :param last_base_RID: int   # RID of that record
+    """
+    def _base_is_now_full(self, page_range: int, last_base_RID: int, verbose=False):
+        if verbose: print("Table insert says: Base page full")
+        self.ranges_with_full_base.append([page_range, last_base_RID])
+        # Tail pages of this range may have been waiting for it
+        if self._merge_scheduler is not None:
+            self._merge_scheduler.notify()
+        if verbose: print("Table insert says: Here is self.ranges_with_full_base:", self.ranges_with_full_base)
 
-    def _allocate_first_available_base_RID(self):
-        # Add new page range if necessary
+    """
+    # Writes a record to a slot vacuum cleared, and gives it a fresh record lock
+    """
+    def _write_reused_slot(self, record_location, record_with_metadata: list):
+        # The range is full, so it may be being merged (see _range_locks)
+        with self._range_locks[record_location.range]:
+            self._page_ranges[record_location.range][record_location.page].write(record_with_metadata, record_location.offset)
+        self.record_locks[record_location.range][record_location.page][record_location.offset] = {record_location.offset:XSLock()}
+
+    """
+    :returns: list  # up to `count` base RIDs whose slots vacuum cleared
+    """
+    def _allocate_free_base_RIDs(self, count: int) -> list:
         with self._RID_allocator.lock:
-            if not self._page_ranges[-1][Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE - 1].has_capacity():
-                self._add_page_range()
-            destination_page_range = self._page_ranges[-1]
+            RIDs = self._free_base_RIDs[-count:]
+            del self._free_base_RIDs[len(self._free_base_RIDs) - len(RIDs):]
+            return RIDs
 
-            for i in range(Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE):
-                first_available_RID_in_this_page = destination_page_range[i].first_available_RID()
-                if first_available_RID_in_this_page != 0: # page not full
-                    destination_page_range[i].record_count += 1 # reserve space for one record in this page.
-                    return first_available_RID_in_this_page
+    def _allocate_first_available_base_RID(self):
+        range_no, page_no, offset, _ = self._allocate_base_RID_runs(1)[0]
+        return self._page_ranges[range_no][page_no].base_RID + offset
 
-            raise Exception("Something went wrong; failed to allocate enough space")
+    """
+    # Reserves `count` new base RIDs at once, filling the base pages of the
+    # last page range in order and adding page ranges as needed. The record
+    # locks of the reserved slots are made here too, under the RID
+    # allocator's lock, so that each page's list of them stays in offset
+    # order however inserts interleave.
+    :returns: list  # of (page range, base page, first offset, number of records), one per base page written to
+    """
+    def _allocate_base_RID_runs(self, count: int) -> list:
+        runs = []
+        with self._RID_allocator.lock:
+            while count > 0:
+                # Add new page range if necessary
+                if not self._page_ranges[-1][self._base_pages_per_range - 1].has_capacity():
+                    self._add_page_range()
+                range_no = len(self._page_ranges) - 1
+                for page_no in range(self._base_pages_per_range):
+                    logical_base_page = self._page_ranges[range_no][page_no]
+                    reserved = min(count, logical_base_page.capacity - logical_base_page.record_count)
+                    if reserved == 0: # page full
+                        continue
+                    offset = logical_base_page.record_count
+                    logical_base_page.record_count += reserved # reserve space for these records in this page.
+                    #Initialize locks per offset
+                    self.record_locks[range_no][page_no].extend({i:XSLock()} for i in range(offset, offset + reserved))
+                    runs.append((range_no, page_no, offset, reserved))
+                    count -= reserved
+                    if count == 0:
+                        break
+        return runs
 
 
 
@@ -331,8 +509,6 @@ class Table:
                 return False
             else:
                 #print('I get urid',target_RIDs,threading.current_thread().name,key)
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count -= 1
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].acquire_S()
                 return target_loc
 
         else:#some one already read this record, no need to require lock again
@@ -344,8 +520,6 @@ class Table:
                 if self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].acquire_S_bool() == False:
                     return False
                 else:
-                    self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count -= 1
-                    self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].acquire_S()
                     return target_loc
 
 
@@ -356,67 +530,142 @@ class Table:
             print("Select function says: attempting to locate keyword {} in column {}".format(keyword, column))
             print("Select function says: query_columns = ", query_columns)
 
-        # For columns not asked by user
-        not_asked_columns = list(np.where(np.array(query_columns) == 0)[0])
-
         # Check index on column user requested
         # Get list of base RIDs for records with keyword in that column
         results = []
         target_loc = loc
-        # Find what logical page it lives on
-        logical_page_of_target = self._page_ranges[target_loc.range][target_loc.page]
-
-        # Get the most updated logical page
-        # This will be a base page if no updates have happened yet
-        # Or will be a tail page if it has been updated
-        current_indirection = logical_page_of_target.get(Config.INDIRECTION_COLUMN_INDEX, target_loc.offset)
-        self.assert_not_deleted(current_indirection)
-
-        # Base page is already merged, no need to look at tail page
-        if self.TPS[target_loc.range] is not None \
-            and current_indirection > self.TPS[target_loc.range] \
-            and current_indirection <= Config.START_TAIL_RID:
-            record_with_metadata = logical_page_of_target.read(target_loc.offset)
-
-        # Base page is not merged
-        else:
-            # Record has not been updated, no need to look at tail page
-            if current_indirection == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET:
-                latest_version_logical_page = logical_page_of_target
-                latest_version_offset = target_loc.offset
-
-            # Record has been updated, get location of tail record
-            else:
-                tail_record_loc = self.get_record_location(current_indirection)
-                latest_version_logical_page = self._page_ranges[tail_record_loc.range][tail_record_loc.page]
-                latest_version_offset = tail_record_loc.offset
-
-            # Get record from most updated logical page
-            record_with_metadata = latest_version_logical_page.read(latest_version_offset)
+        record = self._read_projection(target_loc, query_columns)
 
         if select_in_same_transac_called:
             pass
         else:
-            if self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count >0:
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count -= 1
+            self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].release_S_bool()
 
-        record = record_with_metadata[self.internal_id(0):]
         if verbose: print("Select function says: here's the record I found:", record)
 
-        if len(not_asked_columns) > 0:
-            if verbose:
-                print("Select says not asked columns=", not_asked_columns)
-                print("Select says record=", record)
-
-            for m in not_asked_columns:
-                record[m] = None
-
         fancy_record = Record(record)
         results.append(fancy_record)
 
         return results
 
 
+    """
+    # Reads the asked columns of the latest version of a base record. Only the
+    # physical pages of those columns (and the base record's indirection) are
+    # touched.
+    :param query_columns: list  # List of integers, one per column. 1 means read the column, 0 means ignore (return None)
+    :returns: list              # one value per content column, None for the ones not asked
+    """
+    def _read_projection(self, target_loc, query_columns: list) -> list:
+        asked_columns = [m for m, asked in enumerate(query_columns) if asked != 0]
+        record = [None] * self._num_content_columns
+        values = self._read_latest_version(target_loc, [self.internal_id(m) for m in asked_columns])
+        for m, value in zip(asked_columns, values):
+            record[m] = value
+        return record
+
+    """
+    # Reads the latest version of a base record. A tail record only holds the
+    # columns its schema encoding says (see update), so this walks the tail
+    # records from the latest, taking each column from the first one that
+    # holds it, and the rest from the base record. Columns that were never
+    # updated, according to the base record's schema encoding, only come from
+    # the base record. Metadata comes from the latest version.
+    #
+    # Never waits for a merge. The base page's TPS is taken before the base
+    # record is read, so a merge that moves it meanwhile only makes this read
+    # tail records whose values are in the base page already. If a merge
+    # publishes a new base page meanwhile (see merge), the read starts over
+    # on the new one: updates made since then may leave out columns that are
+    # only merged into the new page.
+    :param target_loc: RecordLocation   # of the base record
+    :param columns: list                # column numbers (with metadata) to read; all of them by default
+    :returns: list                      # one value per column read
+    """
+    def _read_latest_version(self, target_loc, columns: list = None):
+        if columns is None:
+            columns = range(self._num_columns)
+        with self._epochs.protect():
+            while True:
+                logical_page_of_target = self._page_ranges[target_loc.range][target_loc.page]
+                # Taken before the base record is read
+                TPS = logical_page_of_target.TPS
+                values = self._read_latest_version_from(logical_page_of_target, TPS, target_loc, columns)
+                if self._page_ranges[target_loc.range][target_loc.page] is logical_page_of_target:
+                    return values
+
+    """
+    # _read_latest_version, on the given base page and TPS
+    """
+    def _read_latest_version_from(self, logical_page_of_target, TPS: int, target_loc, columns: list) -> list:
+        # Read the base record along with its indirection and schema
+        # encoding: most records have no tail records to look at
+        current_indirection, base_schema_encoding, *base_values = logical_page_of_target.read_record(
+            target_loc.offset, [Config.INDIRECTION_COLUMN_INDEX, Config.SCHEMA_ENCODING_COLUMN_INDEX, *columns])
+        self.assert_not_deleted(current_indirection)
+
+        values = {}
+        columns_in_tails = [column for column in columns if self._holds_column(base_schema_encoding, column)]
+        tail_RID = current_indirection
+        # Stop at the base record, or at a tail record whose values are already merged into it
+        while len(columns_in_tails) > 0 \
+            and tail_RID != Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET \
+            and not self._tail_record_is_merged(TPS, tail_RID):
+            tail_record_loc = self.get_record_location(tail_RID)
+            tail_page = self._page_ranges[tail_record_loc.range][tail_record_loc.page]
+            # Read the columns we're after in one go; the ones the tail record doesn't hold are thrown away
+            previous_tail_RID, schema_encoding, *tail_values = tail_page.read_record(
+                tail_record_loc.offset, [Config.INDIRECTION_COLUMN_INDEX, Config.SCHEMA_ENCODING_COLUMN_INDEX, *columns_in_tails])
+            for column, value in zip(columns_in_tails, tail_values):
+                if self._holds_column(schema_encoding, column):
+                    values[column] = value
+            columns_in_tails = [column for column in columns_in_tails if column not in values]
+            # The latest cumulative tail record holds every column updated since the last merge
+            if self._cumulative_updates:
+                break
+            tail_RID = previous_tail_RID
+
+        return [values[column] if column in values else base_value for column, base_value in zip(columns, base_values)]
+
+    """
+    :param columns: list    # data column numbers (with metadata)
+    :returns: int           # schema encoding with the bits of the given columns set
+    """
+    def _schema_encoding(self, columns: list) -> int:
+        schema_encoding = 0
+        for column in columns:
+            schema_encoding |= 1 << (column - Config.METADATA_COLUMN_COUNT)
+        return schema_encoding
+
+    """
+    # Whether a record with the given schema encoding holds a column. Every
+    # record holds its metadata columns.
+    """
+    def _holds_column(self, schema_encoding: int, column: int) -> bool:
+        return column < Config.METADATA_COLUMN_COUNT or (schema_encoding >> (column - Config.METADATA_COLUMN_COUNT)) & 1 == 1
+
+    """
+    # Whether merge has already written the values of a tail record into its base record
+    :param TPS: int     # of the base page, see LogicalPage.TPS
+    """
+    def _tail_record_is_merged(self, TPS: int, tail_RID: int) -> bool:
+        return TPS is not None and TPS <= tail_RID <= Config.START_TAIL_RID
+
+    """
+    # Reads every record whose value in `column` is within [start_range,
+    # end_range], in order of that value. Uses the column's index, so with an
+    # ordered index (see ordered_index.py) this costs about as much as the
+    # number of matching records, however wide the range. Like sum, takes no
+    # record locks.
+    :param query_columns: list      # List of integers, one per column. 1 means read the column, 0 means ignore (return None)
+    :returns: list                  # of Record
+    """
+    def select_range(self, start_range: int, end_range: int, column: int, query_columns: list) -> list:
+        results = []
+        for _, RID in self._indices.range(self.internal_id(column), start_range, end_range):
+            results.append(Record(self._read_projection(self.get_record_location(RID), query_columns)))
+        return results
+
     def assert_not_deleted(self, value_of_indirection_column: int):
         if value_of_indirection_column >= Config.RECORD_DELETION_MASK:
             raise Exception("You can't update a deleted record")
@@ -447,13 +696,12 @@ class Table:
             if self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].acquire_X_bool() == False:
                 return False
             else:
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._exclusive_count -= 1
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].acquire_X()
                 return target_loc
         else:
             #print('check share count',self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count)
-            if self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset]._share_count == 1:
-                self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].upgrade()
+            # Check for other readers and upgrade in one step, under the
+            # lock's latch; otherwise another reader can slip in between
+            if self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset].upgrade_bool():
                 return target_loc
             else:
                 return False
@@ -464,63 +712,55 @@ class Table:
         target_loc = target_location
         target_RID = self.get_rid((target_loc.range,target_loc.page), target_loc.offset)
         target_base_RID = target_RID
-        loc = self.get_record_location(target_RID)
         logical_page_of_target = self._page_ranges[target_loc.range][target_loc.page]
 
         current_uRID = logical_page_of_target.get(Config.URID_INDEX, target_loc.offset)
-
-        # Get the most updated logical page
-        # This will be a base page if no updates have happened yet
-        # Or will be a tail page if it has been updated
-        current_indirection = logical_page_of_target.get(Config.INDIRECTION_COLUMN_INDEX, target_loc.offset)
+        current_indirection, base_schema_encoding = logical_page_of_target.read_record(
+            target_loc.offset, [Config.INDIRECTION_COLUMN_INDEX, Config.SCHEMA_ENCODING_COLUMN_INDEX])
         self.assert_not_deleted(current_indirection)
 
-        # Base page is already merged, no need to look at tail page
-        if self.TPS[target_loc.range] is not None \
-            and current_indirection > self.TPS[target_loc.range] \
-            and current_indirection <= Config.START_TAIL_RID:
-            record_with_metadata = logical_page_of_target.read(target_loc.offset)
-
-        # Base page is not merged
-        else:
-            # Record has not been updated, no need to look at tail page
-            if current_indirection == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET:
-                latest_version_logical_page = logical_page_of_target
-                latest_version_offset = target_loc.offset
-
-            # Record has been updated, get location of tail record
-            else:
-                tail_record_loc = self.get_record_location(current_indirection)
-                latest_version_logical_page = self._page_ranges[tail_record_loc.range][tail_record_loc.page]
-                latest_version_offset = tail_record_loc.offset
-
-            # Get record from most updated logical page
-            record_with_metadata = latest_version_logical_page.read(latest_version_offset)
+        # The tail record only stores the columns this update changes. A
+        # cumulative one also carries the columns changed by the record's
+        # tail records that haven't been merged yet, so that reads never have
+        # to look past the latest tail record.
+        updated_columns = [self.internal_id(i) for i, value in enumerate(columns) if value is not None]
+        schema_encoding = self._schema_encoding(updated_columns)
+        if self._cumulative_updates \
+            and current_indirection != Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET:
+            # Merged tail pages get freed, so check against the current base page (see _publish_merged_pages)
+            with self._epochs.protect():
+                if not self._tail_record_is_merged(self._page_ranges[target_loc.range][target_loc.page].TPS, current_indirection):
+                    tail_record_loc = self.get_record_location(current_indirection)
+                    schema_encoding |= self._page_ranges[tail_record_loc.range][tail_record_loc.page].get(Config.SCHEMA_ENCODING_COLUMN_INDEX, tail_record_loc.offset)
+        stored_columns = [i for i in range(self.internal_id(0), self._num_columns) if self._holds_column(schema_encoding, i)]
+
+        # Read the current values of the stored columns this update doesn't
+        # change, and of the changed columns that are indexed
+        indexed_columns = [i for i in updated_columns if self._indices.has_index(i)]
+        carried_columns = [i for i in stored_columns if columns[self.external_id(i)] is None]
+        columns_to_read = carried_columns + indexed_columns
+        current_values = {}
+        if len(columns_to_read) > 0:
+            current_values = dict(zip(columns_to_read, self._read_latest_version(target_loc, columns_to_read)))
+
+        for i in updated_columns:
+            # we have a new value, update it in the index
+            if i in indexed_columns:
+                self.replace_if_indexed(i, target_RID, current_values[i], columns[self.external_id(i)])
+            if self.external_id(i) == self._key:
+                self._widen_key_bounds(target_loc.range, columns[self.external_id(i)])
 
         # Assign this tail record a RID
         tail_RID_of_current_update = self._allocate_next_available_tail_RID(target_loc.range)
 
-        # only time we edit the base page: updating indirection column
-        logical_page_of_target.update_indirection_column(target_loc.offset, tail_RID_of_current_update)
-
-        # Build tail record one column at a time
-        # Indirection, timestamp, and columns passed
-        current_update = []
-        for i in range(self._num_columns):
-            if i == Config.INDIRECTION_COLUMN_INDEX:
-                # old indirection pointer of the base record, which points to the latest update before this one
-                current_update.append(current_indirection)
-            elif i == Config.TIMESTAMP_COLUMN_INDEX:
-                current_update.append(time_ns())
-            elif i == Config.BASE_RID_FOR_TAIL_PAGE_INDEX:
-                current_update.append(target_base_RID)
+        # Build tail record: metadata, then the stored columns
+        # The indirection column holds the old indirection pointer of the base record, which points to the latest update before this one
+        current_update = [current_indirection, time_ns(), target_base_RID, current_uRID, schema_encoding]
+        for i in stored_columns:
+            if columns[self.external_id(i)] is not None:
+                current_update.append(columns[self.external_id(i)])
             else:
-                if columns[self.external_id(i)] is not None:
-                    # we have a new value, update it in the index
-                    self.replace_if_indexed(i, target_RID, record_with_metadata[i], columns[self.external_id(i)])
-                    current_update.append(columns[self.external_id(i)])
-                else:
-                    current_update.append(record_with_metadata[i])
+                current_update.append(current_values[i])
 
         current_update_loc = self.get_record_location(tail_RID_of_current_update)
 
@@ -529,10 +769,19 @@ class Table:
 
         # Write update to tail page
         try:
-            self._page_ranges[current_update_loc.range][current_update_loc.page].write(current_update, current_update_loc.offset)
+            self._page_ranges[current_update_loc.range][current_update_loc.page].write_columns(
+                current_update, current_update_loc.offset, list(range(Config.METADATA_COLUMN_COUNT)) + stored_columns)
         except KeyError:
             raise KeyError("If you are reading this, bufferpool is throwing a KeyError at table.update!")
 
+        # only time we edit the base page: updating indirection column, and
+        # marking the columns that have ever been updated. Done once the tail
+        # record is written, so that readers never follow the indirection to
+        # an empty tail record.
+        logical_page_of_target.write_columns(
+            [tail_RID_of_current_update, base_schema_encoding | schema_encoding], target_loc.offset,
+            [Config.INDIRECTION_COLUMN_INDEX, Config.SCHEMA_ENCODING_COLUMN_INDEX])
+
         #release write lock
         #print('release update lock')
         #resetting to release
@@ -540,9 +789,20 @@ class Table:
         self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset] = XSLock()
         self.locations_tobe_summed[key] = target_loc
 
-        # Add tail page to merge queue if full
-        if ((Config.START_TAIL_RID-self.current_tail_rid) % Config.MAX_RECORDS_PER_PAGE) == 0:
-            self.merge_queue.appendleft([current_update_loc.range, current_update_loc.page, self.current_tail_rid])
+        # Add tail page to merge queue once every record of it is written.
+        # Updates may finish in another order than they took their tail RIDs,
+        # so the one that wrote the last RID of the page may not be the last
+        # to finish, and merging then would miss the records still being written.
+        tail_logical_page = self._page_ranges[current_update_loc.range][current_update_loc.page]
+        with self._RID_allocator.lock:
+            tail_logical_page.record_count += 1
+            tail_page_is_full = tail_logical_page.record_count == tail_logical_page.capacity
+        if tail_page_is_full:
+            tail_page = [current_update_loc.range, current_update_loc.page, tail_logical_page.bound_RID]
+            if self._merge_scheduler is not None:
+                self._merge_scheduler.submit(self, tail_page)
+            else:
+                self.merge_queue.append(tail_page + [time.time()])
 
 
     """
@@ -556,6 +816,28 @@ class Table:
         self._indices.insert(internal_col, new_value, RID)
 
 
+    """
+    # Makes sure the zone map of a page range covers a key written to it
+    """
+    def _widen_key_bounds(self, page_range: int, key: int):
+        with self._RID_allocator.lock:
+            bounds = self._key_bounds[page_range]
+            if bounds is None:
+                self._key_bounds[page_range] = [key, key]
+            elif key < bounds[0]:
+                bounds[0] = key
+            elif key > bounds[1]:
+                bounds[1] = key
+
+    """
+    # Page ranges that may hold a record whose key is within [start_range, end_range]
+    """
+    def _ranges_overlapping_keys(self, start_range: int, end_range: int) -> list:
+        return [
+            range_no for range_no, bounds in enumerate(self._key_bounds)
+            if bounds is not None and bounds[0] <= end_range and bounds[1] >= start_range
+        ]
+
     """
     # Gets the tail RID that a new updated version of a record should be
     # written into, creating a new tail page if necessary. Must be atomic!
@@ -578,82 +860,124 @@ class Table:
     :param aggregate_column_index: int   # Index of desired column to aggregate
     """
     def sum(self, start_range: int, end_range: int, aggregate_column_index: int, verbose=False):
-        # List of values to sum
-        summation = []
-
-        # Setup boolean array for which columns to request with select
-        # Premade boolean array with 1 for primary key column and 0 for all others
-        columns_for_sum = self._key_column_boolean_array.copy()
-        # Also set column we want to sum as 1
-        columns_for_sum[aggregate_column_index] = 1
-
-        for ids in range(start_range, end_range+1):
-            # Find start record first
-            try:
-                # Select is returning list of record objects
-                # Subscript 0 gets first item out
-                # And then .columns gets items out of Record object
-                # ONLY SUPPORTS SELECTING ON PRIMARY KEY
-
-                summation.append(self.select(ids, self._key, columns_for_sum,loc = self.locations_tobe_summed[ids], select_in_same_transac_called = True)[0].columns[aggregate_column_index])
-            # Indices.py will throw KeyError if not all RIDs in range had actual records
-            # Indices.py will return empty list for values that now have no associated RIDs after update or delete,
-            #   resulting in select returning None and a NoneType error
-            # Here we skip anytime we catch either of these errors
-            except (KeyError, TypeError) as exc:
-                if verbose: print("Update says caught {}, skipping".format(type(exc).__name__))
-                continue
-
-        return sum(summation)
+        # The tail records found by the scan must not be freed before they are read
+        with self._epochs.protect():
+            return self._sum(start_range, end_range, aggregate_column_index, verbose)
+
+    def _sum(self, start_range: int, end_range: int, aggregate_column_index: int, verbose=False):
+        key_column = self.internal_id(self._key)
+        aggregate_column = self.internal_id(aggregate_column_index)
+        # Aggregate column values of the matching records, one np.ndarray per base page
+        values_to_sum = []
+        # (base RID, tail RID of the latest version, base key, base value) of updated records that haven't been merged
+        updated_records = []
+
+        # Read the key and aggregate columns of the base pages that can hold matching keys with one scan
+        columns = [Config.INDIRECTION_COLUMN_INDEX, Config.TIMESTAMP_COLUMN_INDEX, key_column, aggregate_column]
+        for range_no, logical_base_page, TPS, (indirection, timestamp, keys, values) in self._scan_base_pages(columns, pages=self._base_pages_to_sum(start_range, end_range)):
+            live = self._live_records(indirection, timestamp)
+            base_is_latest = live & self._base_record_is_latest(TPS, indirection)
+
+            # Records whose base record is the latest version: sum straight from the page
+            in_range = (keys >= start_range) & (keys <= end_range)
+            values_to_sum.append(values[base_is_latest & in_range])
+
+            # Updated records: the latest key and value are in the tail record
+            for offset in np.flatnonzero(live & ~base_is_latest):
+                updated_records.append((logical_base_page.base_RID + int(offset), int(indirection[offset]), int(keys[offset]), int(values[offset])))
+            if verbose: print("Sum says: read page range {}, {} updated records so far".format(range_no, len(updated_records)))
+
+        values_to_sum.append(self._sum_latest_tail_records(updated_records, start_range, end_range, key_column, aggregate_column))
+        return Table._exact_sum(np.concatenate(values_to_sum))
 
+    """
+    # Base pages that hold every record whose key is within [start_range, end_range]:
+    # every page of the ranges whose zone map overlaps the keys or, if the key
+    # index is ordered and there are few matching keys, just their pages.
+    :returns: list  # of (page range number, base page number), in order
+    """
+    def _base_pages_to_sum(self, start_range: int, end_range: int) -> list:
+        key_column = self.internal_id(self._key)
+        pages = [
+            (range_no, page_no)
+            for range_no in self._ranges_overlapping_keys(start_range, end_range)
+            for page_no in range(self._base_pages_per_range)
+        ]
+        # Scanning a page costs about as much as looking up this many records one by one
+        if not self._indices.is_ordered(key_column) \
+            or self._indices.count(key_column, start_range, end_range) > len(pages) * self._records_per_page // 4:
+            return pages
+        pages = set()
+        for _, RID in self._indices.range(key_column, start_range, end_range):
+            record_location = self.get_record_location(RID)
+            pages.add((record_location.range, record_location.page))
+        return sorted(pages)
 
     """
-    # Background function that calls merge as needed.
-    # Continues looping until program exits.
+    # Latest values of the aggregate column of the given updated records, for
+    # the ones whose latest key is in range. Reads each tail page once,
+    # however many of the records it holds.
+    :param updated_records: list    # of (base RID, tail RID of the latest version, base key, base value)
+    :returns: np.ndarray
     """
-    def merge_daemon(self, verbose=False):
-        while True:
-            if self.daemon_stop:
-                if verbose: print("Merge daemon says bye!")
-                time.sleep(1)
-                continue
-            if len(self.merge_queue) == 0:
-                if verbose: print("Well, looks like the merge queue is empty.")
-                time.sleep(.01)
-                continue
+    def _sum_latest_tail_records(self, updated_records: list, start_range: int, end_range: int, key_column: int, aggregate_column: int) -> np.ndarray:
+        records_by_page = collections.defaultdict(list)
+        for updated_record in updated_records:
+            tail_record_loc = self.get_record_location(updated_record[1])
+            records_by_page[(tail_record_loc.range, tail_record_loc.page)].append((tail_record_loc.offset, updated_record))
+
+        keys = []
+        values = []
+        for (range_no, page_no), records in records_by_page.items():
+            schema_encodings, tail_keys, tail_values = self._page_ranges[range_no][page_no].read_columns(
+                [Config.SCHEMA_ENCODING_COLUMN_INDEX, key_column, aggregate_column], [offset for offset, _ in records])
+            for (_, (base_RID, _, base_key, base_value)), schema_encoding, key, value in zip(records, schema_encodings, tail_keys, tail_values):
+                has_key = self._holds_column(schema_encoding, key_column)
+                has_value = self._holds_column(schema_encoding, aggregate_column)
+                if not (has_key and has_value):
+                    if self._cumulative_updates:
+                        # Columns a cumulative tail record doesn't hold haven't changed since the last merge
+                        key = key if has_key else base_key
+                        value = value if has_value else base_value
+                    else:
+                        key, value = self._read_latest_version(self.get_record_location(base_RID), [key_column, aggregate_column])
+                keys.append(key)
+                values.append(value)
 
-            # If there are tail pages to be merged
-            else:
-                # Match tail page to be merged with base page & verify base page is full
-                for i in range(len(self.merge_queue)):
-                    found = False
-                    try:
-                        # Check to see if last range in merge queue has an entry in ranges_with_full_base
-                        # self.merge_queue[-1][0] is page range number of last item in merge queue
-                        # self.ranges_with_full_base[self.merge_queue[-1][0]][0] is page range number in corresponding entry of ranges_with_full_base
-                        if self.merge_queue[-1][0] == self.ranges_with_full_base[self.merge_queue[-1][0]][0]:
-                            found = True
-                            break
-
-                    # If tail page is full but base page is not, pop tail page and reinsert at beginning of queue.
-                    # That way if base page gets full after more inserts happen, we remember the tail page can be merged.
-                    except IndexError:
-                        self.merge_queue.appendleft(self.merge_queue.pop())
-                        continue
+        keys = np.array(keys, dtype=np.uint64)
+        values = np.array(values, dtype=np.uint64)
+        return values[(keys >= start_range) & (keys <= end_range)]
 
-                # Call merge
-                if found == True:
-                    if verbose: print("Cool let me merge that for you!")
-                    self.merge(self.merge_queue.pop())
+    """
+    # Sum of unsigned 64-bit integers as a Python int, without overflowing:
+    # sums the low and high 32 bits of every value separately, which can't
+    # overflow a uint64 for fewer than 2^32 values.
+    """
+    @staticmethod
+    def _exact_sum(values: np.ndarray) -> int:
+        values = values.astype(np.uint64, copy=False)
+        low = int(np.sum(values & np.uint64(0xFFFFFFFF), dtype=np.uint64))
+        high = int(np.sum(values >> np.uint64(32), dtype=np.uint64))
+        return (high << 32) + low
 
-                else:
-                    if verbose: print("I couldn't match any of these tail pages to a full base!")
-                    # This sleep call keeps the merge daemon from chugging CPU
-                    # when there's nothing available to merge and slowing down the main thread
-                    time.sleep(0.5)
-                    pass
 
+    """
+    # Whether every base page of a page range is full, which merge needs
+    """
+    def _base_is_full(self, page_range: int) -> bool:
+        return any(full_range == page_range for full_range, _ in self.ranges_with_full_base)
 
+    """
+    # Whether a tail page is the one to merge next in its page range: tail
+    # pages are merged in the order of their RIDs, and TPS is the lowest RID
+    # of the last tail page merged.
+    :param page: int    # page number of the tail page within the range
+    """
+    def _is_next_tail_page_to_merge(self, page_range: int, page: int) -> bool:
+        TPS = self._page_ranges[page_range][0].TPS
+        if page == self._base_pages_per_range:
+            return TPS is None
+        return TPS == self._page_ranges[page_range][page - 1].base_RID
 
     """
     :param tail_page_to_work_on: RecordLocation      # Location of last tail record in page range to merge
@@ -661,150 +985,226 @@ class Table:
     def merge(self, tail_page_to_work_on, verbose=False):
         _range = tail_page_to_work_on[0]
         _page = tail_page_to_work_on[1]
-        _last_tail_rid = tail_page_to_work_on[2]
-
-        base_records_to_replace = []
-        replacement_records = {}
-        merged_records = []
 
-        # Loop backwards through tail records in range
-        for rid in range(_last_tail_rid, _last_tail_rid-Config.MAX_RECORDS_PER_PAGE,-1):
-            # Get tail record values and corresponding base rid
-            tail_record_location = self.get_record_location(rid)
-
-            current_tail_page = self._page_ranges[tail_record_location.range][tail_record_location.page]
-            corresponding_base_rid = current_tail_page.get(Config.BASE_RID_FOR_TAIL_PAGE_INDEX, tail_record_location.offset)
-
-            # Save base rid to be changed to list
-            # Add tail record values to replacement records dictionary
-            if corresponding_base_rid not in base_records_to_replace:
-                base_records_to_replace.append(corresponding_base_rid)
-                replacement_records[corresponding_base_rid]=current_tail_page.read(tail_record_location.offset)[self.internal_id(0):]
+        # Read the whole tail page as one array per column
+        data_columns = list(range(self.internal_id(0), self._num_columns))
+        base_RIDs, schema_encodings, *tail_columns = self._page_ranges[_range][_page].read_column_arrays(
+            [Config.BASE_RID_FOR_TAIL_PAGE_INDEX, Config.SCHEMA_ENCODING_COLUMN_INDEX, *data_columns])
+
+        # For each data column, the latest value the tail page holds for each
+        # base record: tail RIDs are handed out upwards within a tail page, so
+        # that's the last tail record holding the column. np.unique keeps the
+        # first occurrence, so look at the tail records from the last one.
+        # Holds (base RIDs, their latest values) per data column
+        latest_values = []
+        for i, values in zip(data_columns, tail_columns):
+            holding = np.flatnonzero((schema_encodings >> np.uint64(self.external_id(i))) & np.uint64(1))[::-1]
+            RIDs, latest = np.unique(base_RIDs[holding], return_index=True)
+            latest_values.append((RIDs, values[holding[latest]]))
 
         if verbose:
             print("i'm in process to merge",threading.current_thread().name)
 
-        # Loop forwards through base records in range
-        first_base_rid = self._page_ranges[_range][0].base_RID
-        last_base_rid = self._page_ranges[_range][Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE-1].bound_RID
-        for baseid in range(first_base_rid, last_base_rid + 1):
-            # Get current base record values
-            base_record_location = self.get_record_location(baseid)
-            base_logical_page = self._page_ranges[base_record_location.range][base_record_location.page]
-            try:
-                current_base_record = base_logical_page.read(base_record_location.offset)[self.internal_id(0):]
-            except KeyError:
-                raise KeyError("If you are reading this, bufferpool is throwing a KeyError at table.merge!")
-
-            # Add replacement values to merged_records dict
-            # Or add original values for base records that don't need to be changed
-            if baseid in base_records_to_replace:
-                merged_records.append(replacement_records[baseid])
-            else:
-                merged_records.append(current_base_record)
-
-        self._page_directory_reallocation(merged_records,_range,_last_tail_rid)
+        # Vacuum and inserts into vacuumed slots write data columns of these
+        # base pages, and must not do it between the scan and the swap
+        with self._range_locks[_range]:
+            # Build the merged data columns of every base page of the range off
+            # to the side, reading the base pages with one scan
+            merged_pages = []
+            for page_no, (_, base_logical_page, _, pages) in enumerate(self._scan_base_pages(data_columns, [_range])):
+                # Copies: the scan reuses its buffers
+                merged_columns = [np.array(page[:base_logical_page.capacity], dtype=Config.RECORD_DTYPE) for page in pages]
+                for merged_column, (RIDs, values) in zip(merged_columns, latest_values):
+                    in_page = (RIDs >= base_logical_page.base_RID) & (RIDs <= base_logical_page.bound_RID)
+                    merged_column[RIDs[in_page] - np.uint64(base_logical_page.base_RID)] = values[in_page]
+                merged_pages.append((page_no, base_logical_page, merged_columns))
+
+            self._publish_merged_pages(_range, merged_pages, self._page_ranges[_range][_page].base_RID,
+                self._page_ranges[_range][_page].scan_locations(range(self._num_columns)))
 
+    """
+    # Swaps the merged base pages of a range in, one list item assignment
+    # each: a reader finds either the old page with its old TPS or the new
+    # page with the new one, and never waits (see _read_latest_version).
+    #
+    # Readers that find the new pages never read the merged tail page, nor
+    # the physical pages the old base pages don't share with the new ones. So
+    # those go back to the bufferpool's free pages once the readers that may
+    # still hold the old base pages are done.
+    :param merged_pages: list       # of (base page number, base LogicalPage, np.ndarray per data column)
+    :param TPS: int                 # lowest RID of the tail page merged
+    :param merged_tail_page: list   # PhysicalPageLocations of the tail page merged
+    """
+    def _publish_merged_pages(self, page_range: int, merged_pages: list, TPS: int, merged_tail_page: list):
+        replaced_locations = list(merged_tail_page)
+        for page_no, base_logical_page, merged_columns in merged_pages:
+            merged_page, no_longer_used = base_logical_page.merged(merged_columns, TPS, page_range)
+            self._page_ranges[page_range][page_no] = merged_page
+            replaced_locations.extend(no_longer_used)
+        bufferpool = self._RID_allocator.bufferpool
+        self._epochs.retire(lambda: bufferpool.free_pages(replaced_locations))
 
-    def _page_directory_reallocation(self, records, __range,__tail__rid, verbose=False):
-        if verbose:
-            print("Page directory reallocation says: wait for me to finish",process_time())
-
-        lock = threading.Lock() # TODO i doubt this lock does anything. it is created within a function, so I think any thread calling this function will create its own lock. - Ben
-        with lock:
-            for n in range(0, Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE):#number of basepage
-                self.merge_count = 0
-                #base pages will always remain as first several pages in the logical page range
-                if verbose: print(len(self._page_ranges[__range][n].pages), threading.current_thread().name)
-                self._page_ranges[__range][n].merge_write(self._page_ranges[__range][n].pages,self.num_columns, __range)
-                if verbose: print(len(self._page_ranges[__range][n].pages))
-                for record in records[n*Config.MAX_RECORDS_PER_PAGE:(n+1)*Config.MAX_RECORDS_PER_PAGE]:
-                    for k in range(len(record)):
-                        self._page_ranges[__range][n].pages[k+Config.METADATA_COLUMN_COUNT].write(record[k], self.merge_count)
-                    self.merge_count+=1
-                #reading at logical pages always return first serveral columns, metadata + userdefined columns
-                #so merged columns inserted will be directly detected.
-            self.TPS[__range] = __tail__rid-Config.MAX_RECORDS_PER_PAGE+1
-            self._recreate_page_directory()
+    """
+    # Clears the slots of deleted base records so insert can reuse their
+    # RIDs, and drops their record locks. Online: takes each page range's
+    # lock only while clearing its slots.
+    #
+    # A deleted record is only cleared once its tail records are all merged:
+    # merging one later would write the deleted record's values over the
+    # record that reused the slot. Tail records stop taking up space when
+    # their tail page is merged (see _publish_merged_pages).
+    :returns: dict  # slots cleared, bytes of base pages they held, and free RIDs waiting for an insert
+    """
+    def vacuum(self, verbose=False) -> dict:
+        # Deleted records whose slots can be cleared, by page range
+        dead_RIDs = collections.defaultdict(list)
+        columns = [Config.INDIRECTION_COLUMN_INDEX, Config.TIMESTAMP_COLUMN_INDEX]
+        for range_no, logical_base_page, TPS, (indirection, timestamp) in self._scan_base_pages(columns):
+            for offset in np.flatnonzero((timestamp != 0) & (indirection >= Config.RECORD_DELETION_MASK)):
+                latest_tail_RID = int(indirection[offset]) - Config.RECORD_DELETION_MASK
+                if latest_tail_RID == Config.INDIRECTION_COLUMN_VALUE_WHICH_MEANS_RECORD_HAS_NO_UPDATES_YET \
+                    or self._tail_record_is_merged(TPS, latest_tail_RID):
+                    dead_RIDs[range_no].append(logical_base_page.base_RID + int(offset))
+
+        empty_record = [0] * self._num_columns
+        cleared = 0
+        for range_no, RIDs in dead_RIDs.items():
+            cleared_RIDs = []
+            with self._range_locks[range_no]:
+                for RID in RIDs:
+                    record_location = self.get_record_location(RID)
+                    logical_base_page = self._page_ranges[range_no][record_location.page]
+                    # Another vacuum may have cleared it (and an insert reused it) since the scan
+                    indirection, timestamp = logical_base_page.read_record(
+                        record_location.offset, [Config.INDIRECTION_COLUMN_INDEX, Config.TIMESTAMP_COLUMN_INDEX])
+                    if timestamp == 0 or indirection < Config.RECORD_DELETION_MASK:
+                        continue
+                    # A zero timestamp makes scans skip the slot, like one that was never written
+                    logical_base_page.write_record(empty_record, record_location.offset)
+                    self.record_locks[range_no][record_location.page][record_location.offset] = None
+                    cleared_RIDs.append(RID)
+            with self._RID_allocator.lock:
+                self._free_base_RIDs.extend(cleared_RIDs)
+            cleared += len(cleared_RIDs)
+            if verbose: print("Vacuum says: cleared {} slots of page range {}".format(len(cleared_RIDs), range_no))
+
+        return {
+            "records": cleared,
+            "bytes": cleared * self._num_columns * Config.RECORD_SIZE_IN_BYTES,
+            "free_RIDs": len(self._free_base_RIDs),
+        }
 
-        if verbose: print('Table page directory reallocation says: I finished updating, you can go', process_time())
-        #print(records)
-        #self.lock = None
     def _add_page_range(self):
         with self._RID_allocator.lock:
             self._page_ranges.append(
-                self._RID_allocator.make_page_range(self._name, len(self._page_ranges), self._num_columns)
+                self._RID_allocator.make_page_range(self._name, len(self._page_ranges), self._num_columns, self._page_layout,
+                    self._base_pages_per_range, self._records_per_page)
             )
             # keep track of the first tail RID in this new page range
             self._next_tail_RID_to_allocate.append(self._page_ranges[-1][-1].base_RID)
+            page_range = len(self._page_ranges) - 1
+            self._add_to_page_directory([
+                (logical_page.base_RID, page_range, page) for page, logical_page in enumerate(self._page_ranges[-1])
+            ])
+            self._key_bounds.append(None)
+            self._range_locks.append(threading.Lock())
 
         # Create subsets of locks per page range
         # len(self._page_ranges) - 1 will represent the id of corresponding page range
         # When a new page range is created, Initialize a place holder per base page
-        self.record_locks[len(self._page_ranges)-1] =[[] for _ in range(Config.NUMBER_OF_BASE_PAGES_IN_PAGE_RANGE)]
-
-        self._recreate_page_directory()
+        self.record_locks[len(self._page_ranges)-1] =[[] for _ in range(self._base_pages_per_range)]
 
 
     """
     :param page_range: int  # page range to add the tail page to.
     """
     def _add_tail_page(self, page_range: int):
-        self._page_ranges[page_range].append(
-            self._RID_allocator.make_tail_page(self._name, page_range, self._num_columns)
-        )
-        self._recreate_page_directory()
+        with self._RID_allocator.lock:
+            self._page_ranges[page_range].append(
+                self._RID_allocator.make_tail_page(self._name, page_range, self._num_columns, self._page_layout, self._records_per_page)
+            )
+            self._add_to_page_directory([
+                (self._page_ranges[page_range][-1].base_RID, page_range, len(self._page_ranges[page_range]) - 1)
+            ])
 
 
     """
-    # There are 4096 RIDs that might be the base RID for the page this RID is
-    # from. We try all of them rather than doing an O(logn) tree search
-    #
-    # Why so naive? With time limitations, this is nasty but still O(1).
+    # Constant time: see page_directory.py. Readers never take a lock or
+    # retry; they use whichever directory snapshot is current.
     :param RID: int             # can be a tail or base RID
     :returns: RecordLocation    # position of the record with given RID
     """
     def get_record_location(self, RID: int):
-        lowest_RID_that_might_be_the_base_for_this_RIDs_page = \
-            RID - (Config.MAX_RECORDS_PER_PAGE - 1)
-        while True:
-            try:
-                with self._page_directory_lock.acquire_S():
-                    for i in range(lowest_RID_that_might_be_the_base_for_this_RIDs_page, RID + 1):
-                        page_rng_and_page_index = self._page_directory.get(i)
-                        if page_rng_and_page_index is not None:
-                            page_rng_index = page_rng_and_page_index[0]
-                            page_index = page_rng_and_page_index[1]
-                            offset = RID - i
-                            return RecordLocation(page_rng_index, page_index, offset)
-                break
-            except:
-                if self.spin_messages: print("get_record_location spinning on SHARED page directory lock")
-                continue
+        located = self._page_directory.locate(RID)
+        if located is None:
+            raise Exception("Record does not exist in this table")
+        return RecordLocation(*located)
 
-        raise Exception("Record does not exist in this table")
+    """
+    # Publishes new pages to readers by swapping in a new directory snapshot
+    # (cheap; see PageDirectory.with_pages). Must hold the RID allocator's
+    # lock, which keeps writers from losing each other's pages.
+    :param pages: list  # of (first RID of the page, page range, page no. within range)
+    """
+    def _add_to_page_directory(self, pages: list):
+        self._page_directory = self._page_directory.with_pages(pages)
 
     """
-    # This stores tuples of (page_range, page). get_record_location() figures
-    # out the offset.
-    #
-    # TODO improvement: the page directory does not need to be recreated, just appended into
+    # Builds the page directory from scratch out of self._page_ranges
     """
     def _recreate_page_directory(self):
-        # if a number is within <Records-in-page> of a record's rids, that's the page for it!
-        while True:
-            try:
-                with self._page_directory_lock.acquire_X():
-                    self._page_directory = {}
-                    for i in range(len(self._page_ranges)):
-                        page_rng = self._page_ranges[i]
-                        for j in range(len(page_rng)):
-                            page = page_rng[j]
-                            self._page_directory[page.base_RID] = (i,j)
-                break
-            except:
-                if self.spin_messages: print("_recreate_page_directory spinning on EXCLUSIVE page directory lock")
-                continue
+        with self._RID_allocator.lock:
+            pages = []
+            for i in range(len(self._page_ranges)):
+                for j in range(len(self._page_ranges[i])):
+                    pages.append((self._page_ranges[i][j].base_RID, i, j))
+            self._page_directory = PageDirectory().with_pages(pages)
+
+    """
+    # Called when pickled: the merge scheduler belongs to the open database,
+    # and nobody is reading a closed table
+    """
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_merge_scheduler'] = None
+        del state['_epochs']
+        del state['_range_locks']
+        return state
+
+    """
+    # Called when unpickled
+    """
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not isinstance(self._page_directory, PageDirectory) or isinstance(self._page_directory.base_ranges, array.array):
+            # saved with an older kind of directory
+            self._recreate_page_directory()
+        if '_key_bounds' not in state:
+            # saved without zone maps: any range could hold any key
+            self._key_bounds = [[0, 2 ** 64 - 1] for _ in self._page_ranges]
+        if 'TPS' in state:
+            # saved with one TPS per page range in the table: base pages keep their own now
+            for page_range, TPS in zip(self._page_ranges, self.TPS):
+                for logical_base_page in page_range[:self._base_pages_per_range]:
+                    logical_base_page.TPS = TPS
+            del self.TPS
+        self._epochs = EpochManager()
+        if '_free_base_RIDs' not in state:
+            # saved before vacuum existed
+            self._free_base_RIDs = []
+        if '_page_size' in state:
+            # saved while the option was a page size in bytes
+            del self._page_size
+        if '_records_per_page' not in state:
+            # saved before tail pages counted the records written to them:
+            # every RID handed out of the last tail page of a range was written
+            for page_range, next_tail_RID in zip(self._page_ranges, self._next_tail_RID_to_allocate):
+                tail_logical_page = page_range[-1]
+                if next_tail_RID == 0:
+                    tail_logical_page.record_count = tail_logical_page.capacity
+                else:
+                    tail_logical_page.record_count = next_tail_RID - tail_logical_page.base_RID
+        self._range_locks = [threading.Lock() for _ in self._page_ranges]
 
     def delete_all_files_owned_in(self, path_to_db_files: str):
         PhysicalPageLocation.delete_table_files(path_to_db_files, self._name, len(self._page_ranges))
@@ -818,11 +1218,12 @@ class Table:
         #delete all locks
         self.record_locks[target_loc.range][target_loc.page][target_loc.offset][target_loc.offset] = XSLock()
 
+    """
+    # Inverse of get_record_location, in constant time: a logical page knows
+    # the first RID it holds, and RIDs within a page are consecutive.
+    :param pageidentity: tuple  # (page range, page no. within range)
+    :param offset: int          # offset within the page
+    """
     def get_rid(self,pageidentity:tuple,offset):
-        listOfKeys = None
-        listOfItems = self._page_directory.items()
-        for item in listOfItems:
-            #print(item)
-            if item[1] == pageidentity:
-                listOfKeys = item[0]
-        return listOfKeys+offset
+        page_range, page = pageidentity
+        return self._page_ranges[page_range][page].base_RID + offset
@@ -4,6 +4,8 @@ from JellyDB.query import Query
 from random import choice, randint, sample, seed
 import os,sys
 from time import process_time
+import tempfile
+import shutil
 #size_to_test = int(sys.argv[2])
 #os.sys('rm ~/ECS165/*')
 def performance_m2(size_to_test):
@@ -119,3 +121,48 @@ def performance_m2(size_to_test):
     print("Aggregate finished")
     db.close()
     return ['8192',time_update_f-time_update_s,time_select_1_f-time_select_1_s,time_select_2_f-time_select_2_s]
+
+"""
+# Updates a record and commits the update, like a one-query Transaction would
+"""
+def commit_update(query, key, columns, transaction_id):
+    location = query.update(key, *columns, transac_id_=transaction_id, loc_=None)
+    if location is False:
+        raise Exception("Could not lock the record with key {}".format(key))
+    query.update(key, *columns, transac_id_=transaction_id, loc_=location, commit_=True)
+
+"""
+# Times the same number of updates on tables of growing size. An update should
+# cost the same however big the table is, so updates/second should stay flat.
+:returns: list  # of [table size, updates per second]
+"""
+def update_throughput_by_table_size(sizes=(1000, 4000, 16000, 64000), number_of_updates=5000):
+    results = []
+    for size_to_test in sizes:
+        path = tempfile.mkdtemp()
+        try:
+            db = Database()
+            db.open(path)
+            grades_table = db.create_table('Grades', 5, 0)
+            query = Query(grades_table)
+            seed(3562901)
+            for i in range(0, size_to_test):
+                query.insert(92106429 + i, randint(0, 20), randint(0, 20), randint(0, 20), randint(0, 20))
+
+            time_update_s = process_time()
+            for i in range(number_of_updates):
+                key = 92106429 + randint(0, size_to_test - 1)
+                commit_update(query, key, [None, randint(0, 20), None, randint(0, 20), None], 'u' + str(i))
+            time_update_f = process_time()
+
+            results.append([size_to_test, number_of_updates / (time_update_f - time_update_s)])
+            db.daemon_slayer()
+            db.close()
+        finally:
+            shutil.rmtree(path)
+    return results
+
+if __name__ == "__main__":
+    print("{:>12}{:>20}".format("records", "updates/second"))
+    for size_to_test, updates_per_second in update_throughput_by_table_size():
+        print("{:>12}{:>20.0f}".format(size_to_test, updates_per_second))
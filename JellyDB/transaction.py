@@ -72,9 +72,9 @@ class Transaction:
                 for items in self.committed_select_record_location[transac]:
                     query(*args,transac_id_ = None, loc_ = items, abort = True)
                 #print('abort status check',self.committed_select_record_location)
-                del self.committed_select_record_location[transac]
-                del self.committed_update_record_location[transac]
-                del self.queries[transac]
+                self.committed_select_record_location.pop(transac, None)
+                self.committed_update_record_location.pop(transac, None)
+                self.queries.pop(transac, None)
                 return False
             else:
                 return False
@@ -85,9 +85,9 @@ class Transaction:
                 for items in self.committed_update_record_location[transac]:
                     query(*args,transac_id = None,loc = items, abort = True)
                 #print('abort status check', query.__name__,self.committed_select_record_location)
-                del self.committed_update_record_location[transac]
-                del self.committed_select_record_location[transac]
-                del self.queries[transac]
+                self.committed_update_record_location.pop(transac, None)
+                self.committed_select_record_location.pop(transac, None)
+                self.queries.pop(transac, None)
                 return False
             else:
         #del self.queries[self.transac_id]
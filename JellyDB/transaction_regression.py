@@ -0,0 +1,54 @@
+"""
+Usage: python -m JellyDB.transaction_regression [number of runs]
+
+Runs m3_tester and transaction_tester `number of runs` times each (5 by
+default), every run in its own process with a fresh ~/ECS165. A run fails if
+it exits with an error, if any thread dies with an exception, or, for
+transaction_tester, if it doesn't print "Pass.". Races between transactions
+only show up now and then, so one clean run doesn't prove much.
+"""
+import subprocess
+import tempfile
+import shutil
+import sys
+import os
+
+TESTERS = ("JellyDB.m3_tester", "JellyDB.transaction_tester")
+
+"""
+:returns: str   # why the run failed, or None if it passed
+"""
+def run(tester: str):
+    home = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(home, "ECS165"))
+        environment = dict(os.environ, HOME=home)
+        completed = subprocess.run([sys.executable, "-m", tester], env=environment,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    finally:
+        shutil.rmtree(home)
+
+    output = completed.stdout
+    if completed.returncode != 0:
+        return "exited with {}".format(completed.returncode)
+    if "Traceback" in output:
+        # Exceptions in worker threads don't change the exit code
+        return output[output.index("Traceback"):].split("\n\n")[0]
+    if tester == "JellyDB.transaction_tester" and "Pass." not in output:
+        return output.strip().split("\n")[-1]
+    return None
+
+number_of_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+failures = 0
+for tester in TESTERS:
+    for i in range(number_of_runs):
+        failure = run(tester)
+        if failure is None:
+            print(tester, "run", i, "passed")
+        else:
+            print(tester, "run", i, "FAILED:", failure)
+            failures += 1
+
+print(failures, "of", len(TESTERS) * number_of_runs, "runs failed")
+if failures > 0:
+    sys.exit(1)
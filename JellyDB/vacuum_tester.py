@@ -0,0 +1,119 @@
+"""
+Usage: python -m JellyDB.vacuum_tester
+
+Checks that Table.vacuum never hands out the slot of a deleted record while
+one of its tail records is still waiting to be merged, or while delete is
+still removing it from the indices, for both page layouts.
+With 8 records per page: update a record once, delete it, vacuum, insert a
+new record, then fill the tail page so it merges. The new record must not
+pick up the deleted record's update, and the slot is only freed once the
+tail page has been merged.
+"""
+from JellyDB.db import Database
+from JellyDB.query import Query
+from JellyDB.logical_page import PAGE_LAYOUTS
+import traceback
+import tempfile
+import shutil
+import time
+import sys
+
+def select(table, key: int) -> list:
+    location = table.pre_select(key, 0, [1, 1, 1], transaction_id='select')
+    return table.select(key, 0, [1, 1, 1], location)[0].columns
+
+def update(table, key: int, columns: tuple):
+    location = table.pre_update(key, columns, transaction_id='update {} {}'.format(key, columns))
+    table.update(key, columns, location)
+
+"""
+# Waits until the merge scheduler has merged a tail page into the first base page
+"""
+def wait_for_merge(table):
+    for _ in range(500):
+        if table._page_ranges[0][0].TPS is not None:
+            return
+        time.sleep(.01)
+    raise Exception("The tail page was never merged")
+
+def vacuum_then_insert(page_layout: str):
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', 3, 0, page_layout=page_layout, records_per_page=8)
+        query = Query(grades_table)
+        for key in range(16):
+            query.insert(key, key, 2)
+
+        update(grades_table, 3, (None, 999, None))
+        query.delete(3)
+        # The update of 3 is in a tail page that isn't full, so it isn't merged yet
+        assert grades_table.vacuum()["records"] == 0
+
+        query.insert(50, 50, 2)
+        for value in range(7):
+            update(grades_table, 10, (None, 100 + value, None))
+        wait_for_merge(grades_table)
+        assert select(grades_table, 50) == [50, 50, 2], select(grades_table, 50)
+        assert select(grades_table, 10) == [10, 106, 2], select(grades_table, 10)
+
+        # Now the slot can go, and the next insert reuses it
+        assert grades_table.vacuum()["records"] == 1
+        query.insert(51, 51, 2)
+        assert select(grades_table, 51) == [51, 51, 2], select(grades_table, 51)
+        assert select(grades_table, 50) == [50, 50, 2], select(grades_table, 50)
+
+        db.close()
+    finally:
+        shutil.rmtree(path)
+
+"""
+# A vacuum and an insert run while delete is still removing the record from
+# the indices. Neither may touch the slot until delete is done with it.
+"""
+def vacuum_during_delete(page_layout: str):
+    path = tempfile.mkdtemp()
+    try:
+        db = Database()
+        db.open(path)
+        grades_table = db.create_table('Grades', 3, 0, page_layout=page_layout, records_per_page=8)
+        grades_table.create_index(1)
+        query = Query(grades_table)
+        for key in range(16):
+            query.insert(key, 7, 2)
+
+        indices = grades_table._indices
+        delete_from_index = indices.delete
+        def vacuum_and_insert_first(column, value, RID, verbose=False):
+            indices.delete = delete_from_index
+            grades_table.vacuum()
+            query.insert(50, 7, 2)
+            delete_from_index(column, value, RID, verbose)
+        indices.delete = vacuum_and_insert_first
+        query.delete(3)
+
+        assert select(grades_table, 50) == [50, 7, 2], select(grades_table, 50)
+        RID_of_50 = indices.locate(grades_table.internal_id(0), 50)[0]
+        assert RID_of_50 in indices.locate(grades_table.internal_id(1), 7), "record 50 is missing from the index on column 1"
+        assert len(indices.locate(grades_table.internal_id(1), 7)) == 16
+        # The slot goes once delete is done
+        assert grades_table.vacuum()["records"] == 1
+        db.close()
+    finally:
+        shutil.rmtree(path)
+
+tests_failed = 0
+for test in (vacuum_then_insert, vacuum_during_delete):
+    for page_layout in PAGE_LAYOUTS:
+        name = "{} ({} layout)".format(test.__name__.replace("_", " "), page_layout)
+        try:
+            test(page_layout)
+            print(name, "passed")
+        except Exception:
+            print(name, "FAILED")
+            print(traceback.format_exc())
+            tests_failed += 1
+
+if tests_failed > 0:
+    sys.exit(1)
@@ -69,11 +69,26 @@ class XSLock:
             else:
                 raise Exception("There are no S or X locks to release")
 
+    # Releases one shared lock if any is held. Returns whether one was.
+    def release_S_bool(self) -> bool:
+        with self._lock:
+            if self._share_count == 0:
+                return False
+            self._share_count -= 1
+            return True
+
     def upgrade(self) -> XSLock:
+        if self.upgrade_bool() == False:
+            raise Exception("Cannot upgrade lock; there are {} sharers and {} exclusive holders of this lock".format(self._share_count, self._exclusive_count))
+        return self
+
+    # Returns success of upgrading the only shared lock to an exclusive lock.
+    # Checking for other sharers and upgrading happen under the same latch, so
+    # no one can take a shared lock in between.
+    def upgrade_bool(self) -> bool:
         with self._lock:
             if self._share_count != 1 or self._exclusive_count != 0:
-                raise Exception("Cannot upgrade lock; there are {} sharers and {} exclusive holders of this lock".format(self._share_count, self._exclusive_count))
                 return False
             self._share_count = 0
             self._exclusive_count = 1
-            return self
+            return True